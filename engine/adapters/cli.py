@@ -15,11 +15,13 @@ from engine.config import (
 from engine.exceptions import DatamapNotCSVException
 from engine.repository.datamap import InMemorySingleDatamapRepository
 from engine.repository.master import MasterOutputRepository, ValidationOnlyRepository
+from engine.repository.sqlite import SQLiteOutputRepository, convert_masters_to_sqlite
 from engine.repository.templates import (
     InMemoryPopulatedTemplatesRepository,
     InMemoryPopulatedTemplatesZip,
     MultipleTemplatesWriteRepo,
 )
+from engine.repository.xml_templates import XMLTemplatesWriteRepo
 from engine.use_cases.output import WriteMasterToTemplates
 from engine.use_cases.parsing import (
     CreateMasterUseCase,
@@ -87,13 +89,47 @@ def report_data_validations_in_file(file: Path) -> List[str]:
 
 
 def write_master_to_templates(
-    blank_template: Path, datamap: Path, master: Path
+    blank_template: Path, datamap: Path, master: Path, workers=None, writer=None
 ) -> None:
-    output_repo = MultipleTemplatesWriteRepo(blank_template)
+    if workers:
+        Config.EXPORT_WORKERS = workers
+    if writer:
+        Config.TEMPLATE_WRITER = writer
+    if Config.TEMPLATE_WRITER not in Config.TEMPLATE_WRITERS:
+        raise ValueError(
+            f"Unknown template writer {Config.TEMPLATE_WRITER}. "
+            f"Use one of {Config.TEMPLATE_WRITERS}."
+        )
+    output_repo: MultipleTemplatesWriteRepo
+    if Config.TEMPLATE_WRITER == "xml":
+        output_repo = XMLTemplatesWriteRepo(blank_template)
+    else:
+        output_repo = MultipleTemplatesWriteRepo(blank_template)
     uc = WriteMasterToTemplates(output_repo, datamap, master, blank_template)
     uc.execute()
 
 
+def masters_to_sqlite(
+    masters: List[Path], db_path: Path, workers=None, failures=None
+) -> List[Path]:
+    """Load existing master spreadsheets into the SQLite database at db_path.
+
+    masters may include directories, in which case every .xlsx file in them is
+    loaded. Masters loaded previously are skipped, as are masters that cannot
+    be read; those are recorded in failures, if it is given. Returns the
+    masters loaded.
+    """
+    if workers:
+        Config.IMPORT_WORKERS = workers
+    paths: List[Path] = []
+    for master in map(Path, masters):
+        if master.is_dir():
+            paths.extend(sorted(master.glob("*.xlsx")))
+        else:
+            paths.append(master)
+    return convert_masters_to_sqlite(paths, db_path, failures)
+
+
 def import_and_create_master(echo_funcs, datamap=None, **kwargs):
     """Import all spreadsheet files from input directory and process with datamap.
 
@@ -113,6 +149,26 @@ def import_and_create_master(echo_funcs, datamap=None, **kwargs):
     master_fn = Config.config_parser["DEFAULT"]["master file name"]
     if kwargs.get("rowlimit"):
         Config.TEMPLATE_ROW_LIMIT = kwargs.get("rowlimit")
+    if kwargs.get("reader"):
+        Config.TEMPLATE_READER = kwargs.get("reader")
+    if kwargs.get("targeted"):
+        Config.TEMPLATE_TARGETED_EXTRACTION = kwargs.get("targeted")
+    if kwargs.get("cache"):
+        Config.TEMPLATE_CACHE = kwargs.get("cache")
+    if kwargs.get("workers"):
+        Config.IMPORT_WORKERS = kwargs.get("workers")
+    if kwargs.get("startmethod"):
+        Config.IMPORT_START_METHOD = kwargs.get("startmethod")
+    if kwargs.get("chunksize"):
+        Config.IMPORT_CHUNKSIZE = kwargs.get("chunksize")
+    if kwargs.get("serialthreshold") is not None:
+        Config.IMPORT_SERIAL_THRESHOLD = kwargs.get("serialthreshold")
+    if kwargs.get("onfailure"):
+        Config.IMPORT_FAILURE_POLICY = kwargs.get("onfailure")
+    if kwargs.get("masterwriter"):
+        Config.MASTER_WRITER = kwargs.get("masterwriter")
+    if kwargs.get("compression") is not None:
+        Config.MASTER_COMPRESSION_LEVEL = kwargs.get("compression")
 
     if kwargs.get("inputdir"):
         inputdir = kwargs.get("inputdir")
@@ -121,6 +177,8 @@ def import_and_create_master(echo_funcs, datamap=None, **kwargs):
     if kwargs.get("validationonly"):
         output_repo = ValidationOnlyRepository
         master_fn = ""
+    elif kwargs.get("sqlite"):
+        output_repo = SQLiteOutputRepository
     else:
         output_repo = MasterOutputRepository
 
@@ -157,6 +215,11 @@ def import_and_create_master(echo_funcs, datamap=None, **kwargs):
         raise FileNotFoundError(e)
     except DatamapNotCSVException:
         raise
+    for failure in tmpl_repo.failures:
+        echo_funcs["click_echo_red"](
+            f"{failure.filename} could not be imported and is not in the output "
+            f"({failure.error_type}: {failure.msg})\n"
+        )
 
 
 def delete_config(config) -> None:
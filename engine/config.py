@@ -5,7 +5,7 @@ import platform
 import textwrap
 from configparser import ConfigParser
 from pathlib import Path
-from typing import Tuple
+from typing import Optional, Tuple
 
 from appdirs import user_config_dir, user_data_dir
 
@@ -46,6 +46,50 @@ class Config:
     FULL_PATH_OUTPUT = Path(PLATFORM_DOCS_DIR) / "output"
     ACCEPTABLE_VALIDATION_TYPES = ["TEXT", "NUMBER", "DATE"]
     TEMPLATE_ROW_LIMIT = 500
+    # "streaming" reads templates read-only, a row at a time; "dom" loads
+    # each workbook fully into memory; "native" parses the sheet xml itself
+    # without openpyxl
+    TEMPLATE_READERS = ("streaming", "dom", "native")
+    TEMPLATE_READER = "streaming"
+    # Only extract the sheet/cellref coordinates named in the datamap
+    TEMPLATE_TARGETED_EXTRACTION = False
+    # Keep extracted template data in DATAMAPS_LIBRARY_DATA_DIR/extraction_cache
+    # so that templates unchanged since the last import are not parsed again
+    TEMPLATE_CACHE = False
+    TEMPLATE_CACHE_MAX_BYTES = 256 * 1024 * 1024
+    # Templates are extracted in a pool of IMPORT_WORKERS processes (None means
+    # one per cpu), started with IMPORT_START_METHOD ("fork", "spawn",
+    # "forkserver" or None for the platform default) and handed out
+    # IMPORT_CHUNKSIZE files at a time. Imports of IMPORT_SERIAL_THRESHOLD
+    # files or fewer are extracted in the calling process without a pool.
+    IMPORT_WORKERS = None
+    IMPORT_START_METHOD = None
+    IMPORT_CHUNKSIZE = 1
+    IMPORT_SERIAL_THRESHOLD = 3
+    # What to do when a template cannot be extracted: "fail" once the rest
+    # have been extracted, "abort" the import straight away, or "skip" it and
+    # leave it out of the master
+    IMPORT_FAILURE_POLICIES = ("skip", "fail", "abort")
+    IMPORT_FAILURE_POLICY = "fail"
+    # "streaming" writes the master a row at a time with a write-only
+    # workbook; "standard" builds the whole sheet in memory before saving it
+    MASTER_WRITERS = ("streaming", "standard")
+    MASTER_WRITER = "streaming"
+    # zlib level (0-9) used to compress the master; None uses the default
+    MASTER_COMPRESSION_LEVEL: Optional[int] = None
+    # Templates are written from a master in a pool of EXPORT_WORKERS
+    # processes (None means one per cpu), started with IMPORT_START_METHOD.
+    # Masters of EXPORT_SERIAL_THRESHOLD files or fewer are written in the
+    # calling process without a pool.
+    EXPORT_WORKERS = None
+    EXPORT_SERIAL_THRESHOLD = 3
+    # "openpyxl" loads the blank template into openpyxl and saves each file
+    # from it; "xml" copies the blank's zip and patches the written cells
+    # into its sheet xml (see engine.repository.xml_templates)
+    TEMPLATE_WRITERS = ("openpyxl", "xml")
+    TEMPLATE_WRITER = "openpyxl"
+    # Rows per executemany call when loading values into a SQLite database
+    SQLITE_BATCH_SIZE = 10000
     config_parser = ConfigParser()
     base_config = textwrap.dedent(
         """\
@@ -0,0 +1,219 @@
+"The domain object representing a master: the value of each datamap key in each template"
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from .datamap import DatamapLineValueType
+
+try:
+    import numpy as np
+except ImportError:  # numpy is an optional dependency, needed by MasterMatrix
+    np = None  # type: ignore
+
+
+class Master:
+    """A grid of the values of each datamap key (row) in each populated template (column).
+
+    The grid is allocated in full up front and filled a column at a time.
+    values[col][row] is the value of keys[row] in file_names[col], or "" if
+    the template had no value there, and type_codes[col][row] is its
+    DatamapLineValueType int value (0 where there is no value). sheets and
+    cellrefs give where each key was read from, and checksums the checksum of
+    each file.
+    """
+
+    def __init__(
+        self,
+        keys: List[str],
+        file_names: List[str],
+        sheets: Optional[List[str]] = None,
+        cellrefs: Optional[List[str]] = None,
+        checksums: Optional[List[str]] = None,
+    ) -> None:
+        self.keys = list(keys)
+        self.file_names = list(file_names)
+        self.sheets = list(sheets) if sheets is not None else [""] * len(self.keys)
+        self.cellrefs = (
+            list(cellrefs) if cellrefs is not None else [""] * len(self.keys)
+        )
+        self.checksums = (
+            list(checksums) if checksums is not None else [""] * len(self.file_names)
+        )
+        self.values: List[List[Any]] = [[""] * len(self.keys) for _ in self.file_names]
+        self.type_codes: List[List[int]] = [
+            [0] * len(self.keys) for _ in self.file_names
+        ]
+        self._file_index = {name: col for col, name in enumerate(self.file_names)}
+        self._key_index: Dict[str, int] = {}
+        for row, key in enumerate(self.keys):
+            self._key_index.setdefault(key, row)
+
+    @property
+    def shape(self) -> Tuple[int, int]:
+        "The number of keys and the number of files."
+        return len(self.keys), len(self.file_names)
+
+    def file_index(self, file_name: str) -> int:
+        "Return the column of file_name. Raises KeyError if it is not in the master."
+        return self._file_index[file_name]
+
+    def key_index(self, key: str) -> int:
+        """Return the row of key. Raises KeyError if it is not in the master.
+
+        Where the datamap has the key on more than one line, this is the first.
+        """
+        return self._key_index[key]
+
+    def column(self, file_name: str) -> List[Any]:
+        "Return the values for every key in file_name."
+        return self.values[self._file_index[file_name]]
+
+    def value(self, key: str, file_name: str) -> Any:
+        "Return the value of key in file_name."
+        return self.values[self._file_index[file_name]][self._key_index[key]]
+
+    def rows(self) -> Iterator[Tuple[str, List[Any]]]:
+        "Yield each key with its value in each file, in master row order."
+        columns = self.values
+        for row, key in enumerate(self.keys):
+            yield key, [column[row] for column in columns]
+
+    def to_data_for_master(self) -> List[Dict[str, List[Tuple[str, Any]]]]:
+        "Return the master as a list of {file name: [(key, value), ...]}, one per file."
+        return [
+            {file_name: list(zip(self.keys, column))}
+            for file_name, column in zip(self.file_names, self.values)
+        ]
+
+    @classmethod
+    def from_data_for_master(
+        cls, data: List[Dict[str, List[Tuple[str, Any]]]]
+    ) -> "Master":
+        "Create a Master from a list of {file name: [(key, value), ...]}, one per file."
+        file_names = [list(file_data.keys())[0] for file_data in data]
+        columns = [list(file_data.values())[0] for file_data in data]
+        keys = [tup[0] for tup in columns[0]] if columns else []
+        master = cls(keys, file_names)
+        for col, column in enumerate(columns):
+            master.values[col] = [tup[1] for tup in column]
+        return master
+
+
+class MasterMatrix:
+    """A Master held in NumPy arrays, for vectorised access to a whole return set.
+
+    values is an object array and type_codes an int8 array, both of shape
+    (keys, files), laid out as in the master spreadsheet. Where there is no
+    value, values holds "" and type_codes 0. numbers gives the values of
+    NUMBER cells as floats, with NaN everywhere else.
+
+    Requires numpy (pip install bcompiler-engine[numpy]).
+    """
+
+    def __init__(
+        self,
+        keys: List[str],
+        file_names: List[str],
+        values,
+        type_codes,
+        sheets: Optional[List[str]] = None,
+        cellrefs: Optional[List[str]] = None,
+        checksums: Optional[List[str]] = None,
+    ) -> None:
+        if np is None:
+            raise ImportError(
+                "MasterMatrix requires numpy. Install it with pip install numpy."
+            )
+        self.keys = list(keys)
+        self.file_names = list(file_names)
+        self.values = np.asarray(values, dtype=object)
+        self.type_codes = np.asarray(type_codes, dtype=np.int8)
+        if self.values.shape != (len(self.keys), len(self.file_names)):
+            raise ValueError(
+                f"values has shape {self.values.shape}; expected "
+                f"{(len(self.keys), len(self.file_names))}"
+            )
+        self.sheets = list(sheets) if sheets is not None else [""] * len(self.keys)
+        self.cellrefs = (
+            list(cellrefs) if cellrefs is not None else [""] * len(self.keys)
+        )
+        self.checksums = (
+            list(checksums) if checksums is not None else [""] * len(self.file_names)
+        )
+        self._file_index = {name: col for col, name in enumerate(self.file_names)}
+        self._key_index: Dict[str, int] = {}
+        for row, key in enumerate(self.keys):
+            self._key_index.setdefault(key, row)
+        self._numbers = None
+
+    @classmethod
+    def from_master(cls, master: Master) -> "MasterMatrix":
+        "Create a MasterMatrix from the columns of master."
+        if np is None:
+            raise ImportError(
+                "MasterMatrix requires numpy. Install it with pip install numpy."
+            )
+        shape = master.shape
+        values = np.empty(shape, dtype=object)
+        type_codes = np.zeros(shape, dtype=np.int8)
+        for col, (column, codes) in enumerate(zip(master.values, master.type_codes)):
+            values[:, col] = column
+            type_codes[:, col] = codes
+        return cls(
+            master.keys,
+            master.file_names,
+            values,
+            type_codes,
+            sheets=master.sheets,
+            cellrefs=master.cellrefs,
+            checksums=master.checksums,
+        )
+
+    def to_master(self) -> Master:
+        "Return the data as a Master."
+        master = Master(
+            self.keys,
+            self.file_names,
+            sheets=self.sheets,
+            cellrefs=self.cellrefs,
+            checksums=self.checksums,
+        )
+        master.values = self.values.T.tolist()
+        master.type_codes = self.type_codes.T.tolist()
+        return master
+
+    @property
+    def shape(self) -> Tuple[int, int]:
+        "The number of keys and the number of files."
+        return self.values.shape
+
+    def file_index(self, file_name: str) -> int:
+        "Return the column of file_name. Raises KeyError if it is not in the master."
+        return self._file_index[file_name]
+
+    def key_index(self, key: str) -> int:
+        """Return the row of key. Raises KeyError if it is not in the master.
+
+        Where the datamap has the key on more than one line, this is the first.
+        """
+        return self._key_index[key]
+
+    @property
+    def numbers(self):
+        "A float array of the values of NUMBER cells, with NaN in place of anything else."
+        if self._numbers is None:
+            numbers = np.full(self.values.shape, np.nan)
+            mask = self.type_codes == DatamapLineValueType.NUMBER.value
+            numbers[mask] = self.values[mask].astype(float)
+            self._numbers = numbers
+        return self._numbers
+
+    def number_row(self, key: str):
+        "Return the value of key in each file as floats, with NaN where it is not a NUMBER."
+        return self.numbers[self._key_index[key]]
+
+    def column(self, file_name: str):
+        "Return the values for every key in file_name."
+        return self.values[:, self._file_index[file_name]]
+
+    def value(self, key: str, file_name: str) -> Any:
+        "Return the value of key in file_name."
+        return self.values[self._key_index[key], self._file_index[file_name]]
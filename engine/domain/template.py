@@ -1,12 +1,19 @@
 "The domain object representing a populated template"
-from typing import Dict
+from typing import Any, Dict, List, NamedTuple
 
 from .datamap import DatamapLineValueType  # noqa
 
 
+# DatamapLineValueType names by their int values, as used by Cell and CompactSheet
+TYPE_NAMES = {t.value: t.name for t in DatamapLineValueType}
+TYPE_CODES = {t.name: t.value for t in DatamapLineValueType}
+
+
 class TemplateCell:
     "Used for collecting data from a populated spreadsheet."
 
+    __slots__ = ("file_name", "sheet_name", "cellref", "value", "data_type")
+
     def __init__(
         self,
         file_name: str,
@@ -30,3 +37,86 @@ class TemplateCell:
             "value": self.value,
             "data_type": self.data_type.name,
         }
+
+
+class Cell:
+    """A single value extracted from a populated template.
+
+    A smaller stand-in for the dict returned by TemplateCell.to_dict(): the
+    type is held as a DatamapLineValueType int value and file_name is shared
+    by every Cell from the same file. Cells can be read like those dicts, so
+    cell["data_type"] gives the type name.
+    """
+
+    __slots__ = ("file_name", "sheet_name", "cellref", "value", "type_code")
+
+    def __init__(
+        self, file_name: str, sheet_name: str, cellref: str, value: Any, type_code: int
+    ) -> None:
+        self.file_name = file_name
+        self.sheet_name = sheet_name
+        self.cellref = cellref
+        self.value = value
+        self.type_code = type_code
+
+    @property
+    def data_type(self) -> str:
+        return TYPE_NAMES[self.type_code]
+
+    def __getitem__(self, key: str) -> Any:
+        if key == "data_type":
+            return TYPE_NAMES[self.type_code]
+        if key in Cell.__slots__:
+            return getattr(self, key)
+        raise KeyError(key)
+
+    def __eq__(self, other: object) -> bool:
+        if not isinstance(other, Cell):
+            return NotImplemented
+        return (
+            self.file_name == other.file_name
+            and self.sheet_name == other.sheet_name
+            and self.cellref == other.cellref
+            and self.value == other.value
+            and self.type_code == other.type_code
+        )
+
+    def __repr__(self) -> str:
+        return (
+            f"Cell({self.file_name!r}, {self.sheet_name!r}, {self.cellref!r}, "
+            f"{self.value!r}, {self.type_code!r})"
+        )
+
+    def to_dict(self) -> Dict[str, Any]:
+        "Return attributes of object as a dictionary, in the form of TemplateCell.to_dict()."
+        return {
+            "file_name": self.file_name,
+            "sheet_name": self.sheet_name,
+            "cellref": self.cellref,
+            "value": self.value,
+            "data_type": TYPE_NAMES[self.type_code],
+        }
+
+
+class CompactSheet(NamedTuple):
+    """The cells extracted from a single sheet, held in parallel lists.
+
+    types holds the DatamapLineValueType value (an int) of each cell.
+    """
+
+    cellrefs: List[str]
+    types: List[int]
+    values: List[Any]
+
+
+class CompactTemplate(NamedTuple):
+    """The data extracted from a populated template in a compact form.
+
+    The file name and checksum are stored once rather than with every cell,
+    which makes this much cheaper to pass between processes than the nested
+    dict of cell dicts it stands for (see engine.utils.extraction.expand_template).
+    """
+
+    file_name: str
+    checksum: str
+    sheets: Dict[str, CompactSheet]
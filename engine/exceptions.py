@@ -36,3 +36,14 @@ class DatamapFileEncodingError(Exception):
 
 class MissingLineError(Exception):
     pass
+
+
+class TemplateExtractionError(Exception):
+    """Raised when templates could not be extracted.
+
+    failures holds an ExtractionFailure for each of them.
+    """
+
+    def __init__(self, msg, failures=None):
+        super().__init__(msg)
+        self.failures = list(failures) if failures is not None else []
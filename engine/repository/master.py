@@ -1,10 +1,15 @@
 # repository/master.py
+import datetime
 import logging
 from pathlib import Path
+from typing import List, Optional
+from zipfile import ZIP_DEFLATED, ZipFile
 
 from openpyxl import Workbook
+from openpyxl.writer.excel import ExcelWriter
 
 from engine.config import Config
+from engine.domain.master import Master, MasterMatrix
 
 logging.basicConfig(
     level=logging.INFO,
@@ -25,31 +30,89 @@ class ValidationOnlyRepository:
 
 class MasterOutputRepository:
     def __init__(self, data, output_file_name):
+        """data is a Master or MasterMatrix, or a list of {file name: [(key, value), ...]}, one per file."""
+        if isinstance(data, MasterMatrix):
+            data = data.to_master()
+        elif not isinstance(data, Master):
+            data = Master.from_data_for_master(data)
         self.data = data
         self.output_filename = output_file_name
 
     def save(self) -> None:
+        """Write the master to the output directory.
+
+        With Config.MASTER_WRITER set to "streaming", rows are written in order
+        by a write-only workbook, which keeps memory use flat however big the
+        master is; "standard" builds the whole sheet in memory first.
+        Config.MASTER_COMPRESSION_LEVEL sets the zip compression level of the
+        file (0-9, or None for the default).
+        """
+        if Config.MASTER_WRITER not in Config.MASTER_WRITERS:
+            raise ValueError(
+                f"Unknown master writer {Config.MASTER_WRITER}. "
+                f"Use one of {Config.MASTER_WRITERS}."
+            )
+        output_path = Path(Config.PLATFORM_DOCS_DIR) / "output"
+        if Config.MASTER_WRITER == "streaming":
+            wb = self._streamed_workbook()
+        else:
+            wb = self._workbook()
+        _save_workbook(
+            wb, output_path / self.output_filename, Config.MASTER_COMPRESSION_LEVEL
+        )
+        logger.info(
+            "{} successfully created in {}\n".format(self.output_filename, output_path)
+        )
+
+    def _header(self) -> List[str]:
         _master_return_reference = Config.config_parser["DEFAULT"][
             "return reference name"
         ]
-        output_path = Path(Config.PLATFORM_DOCS_DIR) / "output"
+        return [_master_return_reference] + [
+            file_name.split(".")[0] for file_name in self.data.file_names
+        ]
+
+    def _workbook(self) -> Workbook:
         wb = Workbook()
         ws = wb.active
         ws.title = "Master"
-        ws["A1"].value = _master_return_reference
-        _keys = [x[0] for x in list(self.data[0].values())[0]]
+        for counter, value in enumerate(self._header(), start=1):
+            ws.cell(column=counter, row=1, value=value)
         # col A
-        for i, k in enumerate(_keys, start=2):
+        for i, k in enumerate(self.data.keys, start=2):
             ws.cell(column=1, row=i, value=k)
         # other cols
-        for counter, file_data in enumerate(self.data, start=2):
-            ws.cell(
-                column=counter, row=1, value=list(file_data.keys())[0].split(".")[0]
-            )
-            _key_value_lst = list(file_data.values())[0]
-            for idx, tup in enumerate(_key_value_lst, start=2):
-                ws.cell(column=counter, row=idx, value=tup[1])
-        wb.save(output_path / self.output_filename)
-        logger.info(
-            "{} successfully created in {}\n".format(self.output_filename, output_path)
-        )
+        for counter, column in enumerate(self.data.values, start=2):
+            for idx, value in enumerate(column, start=2):
+                ws.cell(column=counter, row=idx, value=value)
+        return wb
+
+    def _streamed_workbook(self) -> Workbook:
+        wb = Workbook(write_only=True)
+        ws = wb.create_sheet("Master")
+        ws.append(self._header())
+        for key, values in self.data.rows():
+            ws.append([key] + values)
+        return wb
+
+
+def _save_workbook(
+    wb: Workbook, filename: Path, compression_level: Optional[int] = None
+) -> None:
+    "Save wb to filename, deflating it at compression_level if one is given."
+    if compression_level is None:
+        wb.save(filename)
+        return
+    if wb.write_only and not wb.worksheets:
+        wb.create_sheet()
+    archive = ZipFile(
+        filename,
+        "w",
+        ZIP_DEFLATED,
+        allowZip64=True,
+        compresslevel=int(compression_level),
+    )
+    wb.properties.modified = datetime.datetime.now(tz=datetime.timezone.utc).replace(
+        tzinfo=None
+    )
+    ExcelWriter(wb, archive).save()
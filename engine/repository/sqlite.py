@@ -0,0 +1,461 @@
+# repository/sqlite.py
+"""
+Extracted datamap values stored in a SQLite database.
+
+The schema is normalised into one row per file and one row per value:
+
+    files(id, file_name, checksum, source_id, imported)
+    cell_values(file_id, key, sheet, cellref, value, type)
+
+Each file is known by its return name, the file name without its extension,
+as in the header row of a master, so a return imported from its template
+and one loaded from a master have the same name.
+
+cell_values is indexed on key and on file_id, so a single key can be pulled
+out of every return without reading the rest of the data; see
+SQLiteQueryRepository. Files loaded from
+a master spreadsheet (see convert_masters_to_sqlite()) refer to a row in
+
+    sources(id, path, checksum, loaded)
+
+which is how a master that has already been loaded is recognised.
+"""
+import datetime
+import hashlib
+import io
+import logging
+import multiprocessing
+import os
+import sqlite3
+from concurrent import futures
+from itertools import islice
+from pathlib import Path
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple, Union
+
+from engine.config import Config
+from engine.domain.master import Master, MasterMatrix
+from engine.domain.template import TYPE_NAMES
+from engine.utils.extraction import (
+    ExtractionFailure,
+    _cell_value_and_type,
+    extraction_failure,
+    master_reader,
+)
+
+logging.basicConfig(
+    level=logging.INFO,
+    format="%(asctime)s: %(levelname)s - %(message)s",
+    datefmt="%d-%b-%y %H:%M:%S",
+)
+logger = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS sources (
+    id INTEGER PRIMARY KEY,
+    path TEXT NOT NULL,
+    checksum TEXT NOT NULL UNIQUE,
+    loaded TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS files (
+    id INTEGER PRIMARY KEY,
+    file_name TEXT NOT NULL,
+    checksum TEXT NOT NULL DEFAULT '',
+    source_id INTEGER REFERENCES sources(id) ON DELETE CASCADE,
+    imported TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS cell_values (
+    file_id INTEGER NOT NULL REFERENCES files(id) ON DELETE CASCADE,
+    key TEXT NOT NULL,
+    sheet TEXT,
+    cellref TEXT,
+    value,
+    type TEXT
+);
+CREATE INDEX IF NOT EXISTS cell_values_key ON cell_values(key);
+CREATE INDEX IF NOT EXISTS cell_values_file ON cell_values(file_id);
+CREATE INDEX IF NOT EXISTS files_file_name ON files(file_name);
+"""
+
+VALUE_ROW = Tuple[int, str, str, str, object, str]
+
+# restricts a query on files f to the copy of each file loaded last
+_LATEST_FILES = (
+    "JOIN (SELECT MAX(id) AS id FROM files GROUP BY file_name) latest "
+    "ON latest.id = f.id"
+)
+
+
+def connect(db_path: Union[Path, str]) -> sqlite3.Connection:
+    """Open the database at db_path, creating it and its tables if need be.
+
+    The database is put in WAL mode so that it can be read while it is being
+    loaded.
+    """
+    conn = sqlite3.connect(str(db_path))
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA foreign_keys=ON")
+    conn.executescript(SCHEMA)
+    return conn
+
+
+def _batches(rows: Iterable[VALUE_ROW], size: int) -> Iterator[List[VALUE_ROW]]:
+    rows = iter(rows)
+    while True:
+        batch = list(islice(rows, size))
+        if not batch:
+            return
+        yield batch
+
+
+def return_name(file_name: str) -> str:
+    "Return the name file_name is known by in the database and in a master."
+    return file_name.split(".")[0]
+
+
+def _now() -> str:
+    return datetime.datetime.now().isoformat(timespec="seconds")
+
+
+def insert_file(
+    conn: sqlite3.Connection,
+    file_name: str,
+    checksum: str,
+    rows: Iterable[Tuple],
+    source_id: Optional[int] = None,
+) -> int:
+    """Add file_name and its values to the database, replacing any earlier copy.
+
+    The file is stored under its return_name(). Any copy of it already stored
+    with the same source_id is replaced, unless it has the same checksum, in
+    which case the file has not changed and is left as it is. rows are (key,
+    sheet, cellref, value, type) tuples. They are inserted with
+    executemany in batches of Config.SQLITE_BATCH_SIZE. source_id is the
+    sources row of the master the file was read from, if it was. The caller
+    is responsible for the transaction. Returns the id of the file.
+    """
+    file_name = return_name(file_name)
+    if checksum:
+        unchanged = conn.execute(
+            "SELECT id FROM files WHERE file_name = ? AND source_id IS ? "
+            "AND checksum = ?",
+            (file_name, source_id, checksum),
+        ).fetchone()
+        if unchanged is not None:
+            return int(unchanged[0])
+    conn.execute(
+        "DELETE FROM files WHERE file_name = ? AND source_id IS ?",
+        (file_name, source_id),
+    )
+    file_id = conn.execute(
+        "INSERT INTO files (file_name, checksum, source_id, imported) "
+        "VALUES (?, ?, ?, ?)",
+        (file_name, checksum, source_id, _now()),
+    ).lastrowid
+    assert file_id is not None
+    for batch in _batches(
+        ((file_id,) + tuple(row) for row in rows), int(Config.SQLITE_BATCH_SIZE)
+    ):
+        conn.executemany(
+            "INSERT INTO cell_values (file_id, key, sheet, cellref, value, type) "
+            "VALUES (?, ?, ?, ?, ?, ?)",
+            batch,
+        )
+    return file_id
+
+
+def read_master(master_path: Union[Path, str]) -> Tuple[str, Master]:
+    """Read a master spreadsheet, as written by MasterOutputRepository, into a Master.
+
+    Returns the md5 checksum of the file with the Master. See
+    _master_from_bytes().
+    """
+    with open(master_path, "rb") as f:
+        content = f.read()
+    checksum = _checksum(content)
+    return checksum, _master_from_bytes(content, checksum)
+
+
+def _checksum(content: bytes) -> str:
+    return hashlib.md5(content).digest().hex()
+
+
+def _master_from_bytes(content: bytes, checksum: str) -> Master:
+    """Read the content of a master spreadsheet, with checksum, into a Master.
+
+    The master is streamed by master_reader(). As when writing a master back
+    to templates, it is taken to end at the first blank key in column A and
+    at the first blank file name in row 1.
+    """
+    data = master_reader(io.BytesIO(content))
+    n_keys = next(
+        (row for row, key in enumerate(data.keys) if key is None), len(data.keys)
+    )
+    n_files = next(
+        (col for col, name in enumerate(data.file_names) if name is None),
+        len(data.file_names),
+    )
+    master = Master(
+        [str(key) for key in data.keys[:n_keys]],
+        [str(name) for name in data.file_names[:n_files]],
+        checksums=[checksum] * n_files,
+    )
+    for col, column in enumerate(data.columns[:n_files]):
+        for row, value in enumerate(column[:n_keys]):
+            if value is not None:
+                value, c_type = _cell_value_and_type(value)
+                master.values[col][row] = value
+                master.type_codes[col][row] = c_type.value
+    return master
+
+
+def _master_rows(master: Master, col: int) -> Iterator[Tuple]:
+    "Yield (key, sheet, cellref, value, type) for each value in column col of master."
+    for row, (value, type_code) in enumerate(
+        zip(master.values[col], master.type_codes[col])
+    ):
+        if type_code == 0 and value == "":
+            # nothing was extracted from this cell
+            continue
+        yield (
+            master.keys[row],
+            master.sheets[row] or None,
+            master.cellrefs[row] or None,
+            value,
+            TYPE_NAMES.get(type_code),
+        )
+
+
+def convert_masters_to_sqlite(
+    master_paths: Iterable[Union[Path, str]],
+    db_path: Union[Path, str],
+    failures: Optional[List[ExtractionFailure]] = None,
+) -> List[Path]:
+    """Load master spreadsheets into the SQLite database at db_path.
+
+    Each master is read from disk once. Masters whose checksum is already in
+    the database are skipped. The rest are parsed in a process pool,
+    configured as for template imports by Config.IMPORT_WORKERS,
+    Config.IMPORT_START_METHOD and Config.IMPORT_SERIAL_THRESHOLD, and each
+    is loaded in a transaction of its own as soon as it has been parsed. No
+    more than two masters per worker are read ahead of the pool, so memory
+    use does not grow with the number of masters.
+
+    A master that cannot be read is logged and left out, and the rest are
+    still loaded. If failures is given, an ExtractionFailure for each such
+    master is appended to it. Returns the paths of the masters loaded.
+    """
+    paths = [Path(path) for path in master_paths]
+    failed = failures if failures is not None else []
+    conn = connect(db_path)
+    try:
+        loaded_checksums = {
+            row[0] for row in conn.execute("SELECT checksum FROM sources")
+        }
+        loaded: List[Path] = []
+
+        def _failed(path: Path, error: Exception) -> None:
+            failure = extraction_failure(path, error)
+            logger.warning(
+                f"{failure.filename} skipped as it could not be read: "
+                f"{failure.error_type}: {failure.msg}"
+            )
+            failed.append(failure)
+
+        def _to_load() -> Iterator[Tuple[Path, str, bytes]]:
+            "Yield the path, checksum and content of each master not yet loaded."
+            for path in paths:
+                try:
+                    with open(path, "rb") as f:
+                        content = f.read()
+                except OSError as e:
+                    _failed(path, e)
+                    continue
+                checksum = _checksum(content)
+                if checksum in loaded_checksums:
+                    logger.info(f"{path.name} already loaded into {db_path}. Skipping.")
+                    continue
+                loaded_checksums.add(checksum)
+                yield path, checksum, content
+
+        def _load(path: Path, checksum: str, master: Master) -> None:
+            with conn:
+                source_id = conn.execute(
+                    "INSERT INTO sources (path, checksum, loaded) VALUES (?, ?, ?)",
+                    (str(path), checksum, _now()),
+                ).lastrowid
+                for col, file_name in enumerate(master.file_names):
+                    insert_file(
+                        conn,
+                        file_name,
+                        checksum,
+                        _master_rows(master, col),
+                        source_id=source_id,
+                    )
+            logger.info(f"Loaded {path.name} into {db_path}.")
+            loaded.append(path)
+
+        workers = min(Config.IMPORT_WORKERS or os.cpu_count() or 1, len(paths))
+        if workers <= 1 or len(paths) <= Config.IMPORT_SERIAL_THRESHOLD:
+            for path, checksum, content in _to_load():
+                try:
+                    master = _master_from_bytes(content, checksum)
+                except Exception as e:
+                    _failed(path, e)
+                    continue
+                _load(path, checksum, master)
+        else:
+            mp_context = (
+                multiprocessing.get_context(Config.IMPORT_START_METHOD)
+                if Config.IMPORT_START_METHOD
+                else None
+            )
+            with futures.ProcessPoolExecutor(
+                max_workers=workers, mp_context=mp_context
+            ) as pool:
+                pending: Dict[futures.Future, Tuple[Path, str]] = {}
+
+                def _collect(done: Iterable[futures.Future]) -> None:
+                    for future in done:
+                        path, checksum = pending.pop(future)
+                        try:
+                            master = future.result()
+                        except Exception as e:
+                            _failed(path, e)
+                            continue
+                        _load(path, checksum, master)
+
+                for path, checksum, content in _to_load():
+                    if len(pending) >= 2 * workers:
+                        done, _ = futures.wait(
+                            pending, return_when=futures.FIRST_COMPLETED
+                        )
+                        _collect(done)
+                    future = pool.submit(_master_from_bytes, content, checksum)
+                    pending[future] = (path, checksum)
+                _collect(futures.as_completed(list(pending)))
+    finally:
+        conn.close()
+    return loaded
+
+
+class SQLiteOutputRepository:
+    """Write extracted datamap values to a SQLite database rather than a master.
+
+    The database takes its name from output_file_name, with a .db suffix, and
+    is written to the output directory. Importing a template again replaces
+    the values stored for it, unless it has not changed since.
+    """
+
+    def __init__(self, data, output_file_name):
+        if isinstance(data, MasterMatrix):
+            data = data.to_master()
+        elif not isinstance(data, Master):
+            data = Master.from_data_for_master(data)
+        self.data = data
+        self.output_filename = Path(output_file_name).with_suffix(".db").name
+
+    def save(self) -> None:
+        output_path = Path(Config.PLATFORM_DOCS_DIR) / "output"
+        conn = connect(output_path / self.output_filename)
+        try:
+            # a single transaction for the whole load
+            with conn:
+                for col, (file_name, checksum) in enumerate(
+                    zip(self.data.file_names, self.data.checksums)
+                ):
+                    insert_file(conn, file_name, checksum, _master_rows(self.data, col))
+        finally:
+            conn.close()
+        logger.info(
+            "{} successfully created in {}\n".format(self.output_filename, output_path)
+        )
+
+
+class SQLiteQueryRepository:
+    """Look up extracted values in a database without reading any spreadsheets.
+
+    The database is one written by SQLiteOutputRepository or
+    convert_masters_to_sqlite(). Lookups by key use the index on cell_values.key and lookups by file the
+    index on cell_values.file_id, so neither scans the whole table. The
+    connection is opened read-only; use close() or a with block to release it.
+
+    Where a file has been loaded more than once, for example from the masters
+    of different quarters, every lookup uses the copy loaded last.
+    """
+
+    def __init__(self, db_path: Union[Path, str]) -> None:
+        self.db_path = Path(db_path)
+        if not self.db_path.exists():
+            raise FileNotFoundError(f"Cannot find database {self.db_path}")
+        self.conn = sqlite3.connect(f"{self.db_path.as_uri()}?mode=ro", uri=True)
+
+    def __enter__(self) -> "SQLiteQueryRepository":
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.close()
+
+    def close(self) -> None:
+        self.conn.close()
+
+    def file_names(self) -> List[str]:
+        "Return the name of each file in the database, in the order they were loaded."
+        return [
+            row[0]
+            for row in self.conn.execute(
+                f"SELECT f.file_name FROM files f {_LATEST_FILES} ORDER BY f.id"
+            )
+        ]
+
+    def values_for_key(
+        self, key: str, sheet: Optional[str] = None
+    ) -> List[Tuple[str, Any]]:
+        """Return (file name, value) for key in every file that has a value for it.
+
+        Files are in the order they were loaded. If sheet is given, only values
+        read from that sheet are returned.
+        """
+        query = (
+            "SELECT f.file_name, v.value FROM cell_values v "
+            f"JOIN files f ON f.id = v.file_id {_LATEST_FILES} WHERE v.key = ?"
+        )
+        params: Tuple = (key,)
+        if sheet is not None:
+            query += " AND v.sheet = ?"
+            params += (sheet,)
+        return self.conn.execute(query + " ORDER BY f.id", params).fetchall()
+
+    def keys_for_file(self, file_name: str) -> Dict[str, Any]:
+        """Return the value of every key in file_name.
+
+        file_name may be given with or without its extension. Raises KeyError
+        if there is no such file.
+        """
+        row = self.conn.execute(
+            "SELECT MAX(id) FROM files WHERE file_name = ?", (return_name(file_name),)
+        ).fetchone()
+        if row[0] is None:
+            raise KeyError(file_name)
+        return dict(
+            self.conn.execute(
+                "SELECT key, value FROM cell_values WHERE file_id = ? ORDER BY rowid",
+                (row[0],),
+            )
+        )
+
+    def keys_matching(self, pattern: str) -> List[str]:
+        """Return the distinct keys matching pattern, in alphabetical order.
+
+        pattern uses Unix shell wildcards, as in SQLite GLOB: "*" matches any
+        text, "?" any single character and "[...]" a set of characters.
+        Matching is case sensitive.
+        """
+        return [
+            row[0]
+            for row in self.conn.execute(
+                "SELECT DISTINCT v.key FROM cell_values v "
+                f"JOIN files f ON f.id = v.file_id {_LATEST_FILES} "
+                "WHERE v.key GLOB ? ORDER BY v.key",
+                (pattern,),
+            )
+        ]
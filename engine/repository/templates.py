@@ -1,18 +1,24 @@
 import json
 import logging
+import multiprocessing
 import os
 import shutil
 import sys
+from concurrent import futures
 from pathlib import Path
-from typing import List, Tuple
+from typing import Dict, List, Optional, Set, Tuple
 
 from engine.exceptions import NestedZipError
-from engine.use_cases.parsing import extract_from_multiple_xlsx_files as extract
+from engine.domain.template import CompactTemplate
+from engine.use_cases.parsing import extract_compact_from_multiple_xlsx_files as extract
 from engine.use_cases.typing import MASTER_COL_DATA, MASTER_DATA_FOR_FILE
 from engine.utils.extraction import (
     ALL_IMPORT_DATA,
+    ExtractionFailure,
     extract_zip_file_to_tmpdir,
     get_xlsx_files,
+    template_cells,
+    templates_to_json,
 )
 from openpyxl import Workbook, load_workbook
 
@@ -39,7 +45,6 @@ class MultipleTemplatesWriteRepo:
         """directory_path is the directory in which to write the files."""
         self.output_path = Config.PLATFORM_DOCS_DIR / "output"
         self.blank_template = blank_template
-        self.unsaved_workbooks: List[Tuple[str, Workbook]] = []
 
     def _populate_workbook(
         self, workbook: Workbook, file_data: MASTER_COL_DATA
@@ -67,42 +72,138 @@ class MultipleTemplatesWriteRepo:
                 )
         return workbook
 
+    def _load_blank_template(self) -> Path:
+        """Return the blank template as _write_file() takes it.
+
+        Here that is just its path, as openpyxl has to open the blank again
+        for each file. XMLTemplatesWriteRepo parses the blank once here
+        instead, and is the faster writer (Config.TEMPLATE_WRITER = "xml").
+        """
+        if not Path(self.blank_template).is_file():
+            raise FileNotFoundError(
+                f"Cannot find file {self.blank_template}. Do you have "
+                "file set correctly in config file, or is file missing?"
+            )
+        return Path(self.blank_template)
+
+    def _write_file(self, blank: Path, file_data: MASTER_COL_DATA) -> str:
+        """Write file_data to a workbook opened from blank, and save it in the output directory.
+
+        Each file gets a workbook of its own: a workbook that has been saved
+        cannot safely be saved again (openpyxl closes the data of its images
+        as it writes them), and writing dates adds styles to it. Returns the
+        name of the file written.
+        """
+        file_name = file_data[0].file_name
+        logger.info("Populating {}".format(file_name))
+        output_file_name: str = ".".join([file_name, "xlsm"])
+        blank_workbook = load_workbook(blank, read_only=False, keep_vba=True)
+        _wb = self._populate_workbook(blank_workbook, file_data)
+        self._save_workbook((output_file_name, _wb))
+        return output_file_name
+
     def write(self, data: MASTER_DATA_FOR_FILE, from_json: bool = False) -> None:
         """Writes data from a single column in a master Excel file to a file.
 
         data: list of ColData tuples, which contains the key, sheet and value
         file_name: file name to be appended to output path
+
+        Each file is populated and saved before the next is opened, so only
+        one workbook is held in memory however many files there are.
+
+        Unless there are Config.EXPORT_SERIAL_THRESHOLD files or fewer, the
+        files are shared out between a pool of Config.EXPORT_WORKERS
+        processes.
+        Files which cannot be written in the pool are logged, and a
+        RuntimeError is raised once the rest have been written.
         """
 
         logger.info(
             "Preparing to populate blank templates - this can take a few minutes depending on size of master."
         )
-        for file_data in data:
-            try:
-                blank_workbook: Workbook = load_workbook(
-                    self.blank_template, read_only=False, keep_vba=True
-                )
-            except FileNotFoundError as e:
-                raise FileNotFoundError(
-                    f"Cannot find file {e.filename}. Do you have "
-                    "file set correctly in config file, or is file missing?"
+        workers = min(Config.EXPORT_WORKERS or os.cpu_count() or 1, len(data))
+        if workers <= 1 or len(data) <= Config.EXPORT_SERIAL_THRESHOLD:
+            blank = self._load_blank_template()
+            for file_data in data:
+                self._write_file(blank, file_data)
+            return
+        if not Path(self.blank_template).is_file():
+            raise FileNotFoundError(
+                f"Cannot find file {self.blank_template}. Do you have "
+                "file set correctly in config file, or is file missing?"
+            )
+        mp_context = (
+            multiprocessing.get_context(Config.IMPORT_START_METHOD)
+            if Config.IMPORT_START_METHOD
+            else None
+        )
+        failed: List[str] = []
+        with futures.ProcessPoolExecutor(
+            max_workers=workers, mp_context=mp_context
+        ) as pool:
+            pending = [
+                pool.submit(
+                    _write_templates,
+                    type(self),
+                    self.blank_template,
+                    self.output_path,
+                    chunk,
                 )
-            file_name = file_data[0].file_name
-            logger.info("Populating {}".format(file_name))
-            _wb = self._populate_workbook(blank_workbook, file_data)
-            output_file_name: str = ".".join([file_name, "xlsm"])
-            self.unsaved_workbooks.append((output_file_name, _wb))
-        self._write_each_workbook()
+                for chunk in self._chunks(data, workers)
+            ]
+            for future in futures.as_completed(pending):
+                for output_file_name, error in future.result():
+                    if error is not None:
+                        logger.critical(f"Cannot write {output_file_name}: {error}")
+                        failed.append(output_file_name)
+        if failed:
+            raise RuntimeError(f"Could not write {', '.join(sorted(failed))}.")
+
+    @staticmethod
+    def _chunks(data: MASTER_DATA_FOR_FILE, n: int) -> List[MASTER_DATA_FOR_FILE]:
+        """Share the columns in data between n chunks, keeping their order.
+
+        Columns for the same file name go in the same chunk, so that they are
+        written one after the other, as they would be without a pool.
+        """
+        chunks: List[MASTER_DATA_FOR_FILE] = [[] for _ in range(n)]
+        slots: Dict[str, int] = {}
+        for file_data in data:
+            slot = slots.setdefault(file_data[0].file_name, len(slots) % n)
+            chunks[slot].append(file_data)
+        return [chunk for chunk in chunks if chunk]
 
     def _save_workbook(self, wb_t: Tuple[str, Workbook]) -> None:
         _wb = wb_t[1]
         _output_file_name = wb_t[0]
         logger.info("Saving {}".format(_output_file_name))
-        _wb.save(filename=Config.PLATFORM_DOCS_DIR / "output" / _output_file_name)
+        _wb.save(filename=Path(self.output_path) / _output_file_name)
+
+
+def _write_templates(
+    repo_class: type,
+    blank_template: Path,
+    output_path: Path,
+    data: MASTER_DATA_FOR_FILE,
+) -> List[Tuple[str, Optional[str]]]:
+    """Write each column in data to a copy of blank_template in output_path.
 
-    def _write_each_workbook(self) -> None:
-        for _ in map(self._save_workbook, self.unsaved_workbooks):
-            pass
+    Run in a worker process by MultipleTemplatesWriteRepo.write, or the
+    write() of a subclass given as repo_class. Returns the name of each file
+    with None if it was written, or a description of the error if not.
+    """
+    repo = repo_class(blank_template)
+    repo.output_path = output_path
+    blank = repo._load_blank_template()
+    statuses: List[Tuple[str, Optional[str]]] = []
+    for file_data in data:
+        try:
+            statuses.append((repo._write_file(blank, file_data), None))
+        except Exception as e:
+            statuses.append(
+                (".".join([file_data[0].file_name, "xlsm"]), f"{type(e).__name__}: {e}")
+            )
+    return statuses
 
 
 class FSPopulatedTemplatesRepo:
@@ -111,8 +212,16 @@ class FSPopulatedTemplatesRepo:
     def __init__(self, directory_path: str):
         self.directory_path = directory_path
 
-    def list_as_json(self) -> str:
-        """Try to open the data file containing populated data as json."""
+    def list_as_json(
+        self,
+        targets: Optional[Dict[str, Set[str]]] = None,
+        sheets: Optional[Set[str]] = None,
+    ) -> str:
+        """Try to open the data file containing populated data as json.
+
+        The data file holds data already extracted, so targets and sheets have
+        no effect here.
+        """
         try:
             with open(
                 os.path.join(Config.DATAMAPS_LIBRARY_DATA_DIR, "extracted_data.dat")
@@ -121,31 +230,104 @@ class FSPopulatedTemplatesRepo:
         except FileNotFoundError:
             raise FileNotFoundError("Cannot find file.")
 
+    def list_as_objs(
+        self,
+        targets: Optional[Dict[str, Set[str]]] = None,
+        sheets: Optional[Set[str]] = None,
+    ) -> ALL_IMPORT_DATA:
+        "Return the data in the data file, with the cells as dicts."
+        data: ALL_IMPORT_DATA = json.loads(
+            self.list_as_json(targets=targets, sheets=sheets)
+        )
+        return data
+
 
 class InMemoryPopulatedTemplatesRepository:
     """A repo that does no data file reading or writing - just parsing from excel files."""
 
     def __init__(self, directory_path: str) -> None:
         self.directory_path = directory_path
-        self.state: ALL_IMPORT_DATA = {}
+        self.state: Dict[str, CompactTemplate] = {}
+        self.failures: List[ExtractionFailure] = []
+
+    def list_as_json(
+        self,
+        targets: Optional[Dict[str, Set[str]]] = None,
+        sheets: Optional[Set[str]] = None,
+    ) -> str:
+        """Return data from a directory of populated templates as json.
+
+        If targets is given, only the sheets and cellrefs it contains are extracted.
+        If sheets is given, only those sheets are read. Files that could not be
+        extracted are recorded in self.failures.
+        """
+        return templates_to_json(self._extract(targets, sheets))
+
+    def list_as_objs(
+        self,
+        targets: Optional[Dict[str, Set[str]]] = None,
+        sheets: Optional[Set[str]] = None,
+    ) -> ALL_IMPORT_DATA:
+        """Return data from a directory of populated templates, with the cells as Cell objects.
+
+        Takes the same arguments as list_as_json().
+        """
+        return {
+            name: template_cells(t)
+            for name, t in self._extract(targets, sheets).items()
+        }  # type: ignore
 
-    def list_as_json(self) -> str:
-        """Return data from a directory of populated templates as json."""
-        excel_files = get_xlsx_files(Path(self.directory_path))
+    def _extract(
+        self,
+        targets: Optional[Dict[str, Set[str]]] = None,
+        sheets: Optional[Set[str]] = None,
+    ) -> Dict[str, CompactTemplate]:
         if not self.state:
-            self.state = extract(excel_files)
-            return json.dumps(self.state)
-        else:
-            return json.dumps(self.state)
+            excel_files = get_xlsx_files(Path(self.directory_path))
+            self.state = extract(
+                excel_files, targets=targets, sheets=sheets, failures=self.failures
+            )
+        return self.state
 
 
 class InMemoryPopulatedTemplatesZip:
     def __init__(self, zip_path: str) -> None:
         self.directory_path = zip_path
-        self.state: ALL_IMPORT_DATA = {}
+        self.state: Dict[str, CompactTemplate] = {}
+        self.failures: List[ExtractionFailure] = []
 
-    def list_as_json(self) -> str:
-        """Return data from a zip file of populated templates as json."""
+    def list_as_json(
+        self,
+        targets: Optional[Dict[str, Set[str]]] = None,
+        sheets: Optional[Set[str]] = None,
+    ) -> str:
+        """Return data from a zip file of populated templates as json.
+
+        If targets is given, only the sheets and cellrefs it contains are extracted.
+        If sheets is given, only those sheets are read. Files that could not be
+        extracted are recorded in self.failures.
+        """
+        return templates_to_json(self._extract(targets, sheets))
+
+    def list_as_objs(
+        self,
+        targets: Optional[Dict[str, Set[str]]] = None,
+        sheets: Optional[Set[str]] = None,
+    ) -> ALL_IMPORT_DATA:
+        """Return data from a zip file of populated templates, with the cells as Cell objects.
+
+        Takes the same arguments as list_as_json().
+        """
+        return {
+            name: template_cells(t)
+            for name, t in self._extract(targets, sheets).items()
+        }  # type: ignore
+
+    def _extract(
+        self,
+        targets: Optional[Dict[str, Set[str]]] = None,
+        sheets: Optional[Set[str]] = None,
+    ) -> Dict[str, CompactTemplate]:
         try:
             d, excel_files = extract_zip_file_to_tmpdir(self.directory_path)
         except NestedZipError as e:
@@ -153,11 +335,12 @@ class InMemoryPopulatedTemplatesZip:
         # WHY WAS THIS A THING??
         # TODO: Watch this in future - I was losing the first file in the zip
         # excel_files = excel_files[1:]
-        if not self.state:
-            self.state = extract(excel_files)
+        try:
+            if not self.state:
+                self.state = extract(
+                    excel_files, targets=targets, sheets=sheets, failures=self.failures
+                )
+        finally:
             logger.info(f"Removing temporary directory {d}.")
             shutil.rmtree(d)
-            return json.dumps(self.state)
-        else:
-            shutil.rmtree(d)
-            return json.dumps(self.state)
+        return self.state
@@ -0,0 +1,663 @@
+"""
+Write master data to templates by patching the blank template's XML.
+
+XMLTemplatesWriteRepo is an alternative to MultipleTemplatesWriteRepo which
+never loads the blank template into openpyxl. The blank is read once into a
+BlankTemplatePackage, which indexes where each row and <c> element sits in
+the XML of each sheet the first time the sheet is written to. Each output
+file is then a copy of the blank's zip, part by part, in which only the <c>
+elements of the cells being written are replaced (or new ones inserted in
+row and column order). Styles, validations, drawings and the VBA project are
+copied byte for byte.
+
+Strings are written inline, so sharedStrings.xml is not touched. Dates and
+times are written as Excel serial numbers in the workbook's date system
+(1900 or 1904); as with openpyxl, a cell without a date format is given
+one, which adds a cell format to styles.xml. The sheet's dimension is
+extended to take in any cell written outside it. As openpyxl does on save,
+calcChain.xml is dropped and the workbook is marked to be recalculated when
+it is opened.
+"""
+import datetime
+import logging
+import posixpath
+import re
+import zipfile
+from bisect import bisect_left, bisect_right
+from collections import defaultdict
+from pathlib import Path
+from typing import Any, Callable, Dict, List, NamedTuple, Optional, Tuple
+from xml.etree import ElementTree
+from xml.sax.saxutils import escape, unescape
+
+from engine.repository.templates import MultipleTemplatesWriteRepo
+from engine.use_cases.typing import MASTER_COL_DATA
+from openpyxl.cell.cell import ILLEGAL_CHARACTERS_RE, TIME_FORMATS
+from openpyxl.styles.numbers import (
+    BUILTIN_FORMATS,
+    BUILTIN_FORMATS_REVERSE,
+    is_date_format,
+)
+from openpyxl.utils.cell import (
+    column_index_from_string,
+    get_column_letter,
+    range_boundaries,
+)
+from openpyxl.utils.datetime import MAC_EPOCH, WINDOWS_EPOCH, to_excel
+from openpyxl.utils.exceptions import IllegalCharacterError
+
+logging.basicConfig(
+    level=logging.INFO,
+    format="%(asctime)s: %(levelname)s - %(message)s",
+    datefmt="%d-%b-%y %H:%M:%S",
+)
+logger = logging.getLogger(__name__)
+
+NS_MAIN = "{http://schemas.openxmlformats.org/spreadsheetml/2006/main}"
+NS_R = "{http://schemas.openxmlformats.org/officeDocument/2006/relationships}"
+NS_PKG_REL = "{http://schemas.openxmlformats.org/package/2006/relationships}"
+CALC_CHAIN = "/calcChain"
+
+_SHEET_DATA_RE = re.compile(rb"<sheetData\b[^>]*?(/?)>")
+_ROW_RE = re.compile(rb"<row\b([^>]*?)(/?)>")
+_SPANS_ATTR_RE = re.compile(rb'\bspans="(\d+):(\d+)"')
+_DIMENSION_RE = re.compile(rb'<dimension\b[^>]*\bref="([^"]*)"')
+_CELL_RE = re.compile(rb"<c\b([^>]*?)(?:/>|>.*?</c>)", re.S)
+_REF_ATTR_RE = re.compile(rb'\br="([A-Z]*)(\d+)"')
+_STYLE_ATTR_RE = re.compile(rb'\bs="(\d+)"')
+_SHARED_FORMULA_RE = re.compile(rb'<f\b[^>]*\bt="shared"[^>]*\bref="')
+_MERGE_CELL_RE = re.compile(rb'<mergeCell\b[^>]*\bref="([^"]+)"')
+_CALC_PR_RE = re.compile(rb"<calcPr\b([^>]*?)(/?)>")
+_WORKBOOK_PR_RE = re.compile(rb"<workbookPr\b([^>]*)>")
+_COORDINATE_RE = re.compile(r"^\$?([A-Za-z]{1,3})\$?(\d+)$")
+_NUM_FMT_RE = re.compile(rb"<numFmt\b[^>]*>")
+_CELL_XFS_RE = re.compile(rb"<cellXfs\b[^>]*>")
+_XF_RE = re.compile(rb"<xf\b[^>]*?(?:/>|>.*?</xf>)", re.S)
+
+
+def _coordinate(cellref: Any) -> Optional[Tuple[str, int, int]]:
+    "Return (coordinate, row, column) for cellref, or None if it is not valid."
+    try:
+        match = _COORDINATE_RE.match(cellref.strip())
+    except AttributeError:
+        return None
+    if match is None or int(match.group(2)) == 0:
+        return None
+    column, row = match.group(1).upper(), int(match.group(2))
+    return f"{column}{row}", row, column_index_from_string(column)
+
+
+def _cell_xml(
+    coordinate: str,
+    style: Optional[bytes],
+    value: Any,
+    epoch: datetime.datetime = WINDOWS_EPOCH,
+) -> bytes:
+    """Return a <c> element holding value, as openpyxl would write it.
+
+    Dates are written as serial numbers counted from epoch, the date system
+    of the workbook.
+    """
+    start = f'<c r="{coordinate}"'.encode()
+    if style is not None:
+        start += b' s="' + style + b'"'
+    if value is None or value == "":
+        return start + b"/>"
+    if isinstance(value, bool):
+        return start + b' t="b"><v>' + (b"1" if value else b"0") + b"</v></c>"
+    if isinstance(value, (int, float)):
+        return start + b"><v>" + repr(value).encode() + b"</v></c>"
+    if isinstance(
+        value, (datetime.datetime, datetime.date, datetime.time, datetime.timedelta)
+    ):
+        return start + b"><v>" + repr(to_excel(value, epoch)).encode() + b"</v></c>"
+    value = str(value)
+    if next(ILLEGAL_CHARACTERS_RE.finditer(value), None):
+        raise IllegalCharacterError(f"{value} cannot be used in worksheets.")
+    if value.startswith("=") and len(value) > 1:
+        return start + b"><f>" + escape(value[1:]).encode() + b"</f></c>"
+    return (
+        start
+        + b' t="inlineStr"><is><t xml:space="preserve">'
+        + escape(value).encode()
+        + b"</t></is></c>"
+    )
+
+
+def _with_spans(attrs: bytes, columns: List[int]) -> bytes:
+    "Return a row's attributes with its spans, if it has any, extended over columns."
+    match = _SPANS_ATTR_RE.search(attrs)
+    if match is None:
+        return attrs
+    first = min([int(match.group(1))] + columns)
+    last = max([int(match.group(2))] + columns)
+    return (
+        attrs[: match.start()]
+        + f'spans="{first}:{last}"'.encode()
+        + attrs[match.end() :]
+    )
+
+
+class _Row(NamedTuple):
+    start: int
+    end: int
+    attrs: bytes
+    tag_end: int
+    inner_end: int
+    self_closing: bool
+    columns: List[int]
+    cell_starts: List[int]
+
+
+class _CellSpan(NamedTuple):
+    start: int
+    end: int
+    style: Optional[bytes]
+    shared_formula: bool
+
+
+class SheetIndex:
+    """Where each row and cell of a worksheet's XML is, so that cells can be patched.
+
+    Raises ValueError if the XML is not laid out as Excel, LibreOffice and
+    openpyxl write it (rows and cells with explicit references, in an
+    unprefixed <sheetData>).
+    """
+
+    def __init__(self, xml: bytes) -> None:
+        self.xml = xml
+        match = _SHEET_DATA_RE.search(xml)
+        if match is None:
+            raise ValueError("Cannot find <sheetData> in the worksheet.")
+        self.data_start = match.start()
+        self.empty = bool(match.group(1))
+        if self.empty:
+            self.data_end = self.data_inner_end = match.end()
+        else:
+            self.data_inner_end = xml.index(b"</sheetData>", match.end())
+            self.data_end = self.data_inner_end + len(b"</sheetData>")
+        self.rows: Dict[int, _Row] = {}
+        self.cells: Dict[bytes, _CellSpan] = {}
+        for row_match in _ROW_RE.finditer(xml, match.end(), self.data_inner_end):
+            row_ref = re.search(rb'\br="(\d+)"', row_match.group(1))
+            if row_ref is None:
+                raise ValueError("Rows without a row number are not supported.")
+            self_closing = bool(row_match.group(2))
+            if self_closing:
+                inner_end = end = row_match.end()
+            else:
+                inner_end = xml.index(b"</row>", row_match.end())
+                end = inner_end + len(b"</row>")
+            columns: List[int] = []
+            cell_starts: List[int] = []
+            for cell in _CELL_RE.finditer(xml, row_match.end(), inner_end):
+                ref = _REF_ATTR_RE.search(cell.group(1))
+                if ref is None:
+                    raise ValueError("Cells without a reference are not supported.")
+                style = _STYLE_ATTR_RE.search(cell.group(1))
+                self.cells[ref.group(1) + ref.group(2)] = _CellSpan(
+                    cell.start(),
+                    cell.end(),
+                    style.group(1) if style else None,
+                    bool(_SHARED_FORMULA_RE.search(xml, cell.start(), cell.end())),
+                )
+                columns.append(column_index_from_string(ref.group(1).decode()))
+                cell_starts.append(cell.start())
+            self.rows[int(row_ref.group(1))] = _Row(
+                row_match.start(),
+                end,
+                row_match.group(1),
+                row_match.end(),
+                inner_end,
+                self_closing,
+                columns,
+                cell_starts,
+            )
+        self.row_numbers = sorted(self.rows)
+        # the used range, which readers such as openpyxl's read-only
+        # worksheets trust; patch() extends it to cover the cells written
+        self.dimension = _DIMENSION_RE.search(xml, 0, self.data_start)
+        # the (first column, last column, top row) of each merged range
+        # covering a row
+        self.merged: Dict[int, List[Tuple[int, int, int]]] = defaultdict(list)
+        for ref in _MERGE_CELL_RE.findall(xml):
+            min_col, min_row, max_col, max_row = range_boundaries(ref.decode())
+            for row in range(min_row, max_row + 1):
+                self.merged[row].append((min_col, max_col, min_row))
+
+    def is_merged(self, row: int, column: int) -> bool:
+        "Whether (row, column) is inside a merged range, other than at its top left."
+        return any(
+            min_col <= column <= max_col and (row, column) != (min_row, min_col)
+            for min_col, max_col, min_row in self.merged.get(row, ())
+        )
+
+    def patch(
+        self,
+        values: Dict[Tuple[str, int, int], Any],
+        cell_style: Optional[
+            Callable[[Optional[bytes], Any], Optional[bytes]]
+        ] = None,
+        epoch: datetime.datetime = WINDOWS_EPOCH,
+    ) -> bytes:
+        """Return the worksheet XML with values written into it.
+
+        values maps (coordinate, row, column) to the value of the cell.
+        cell_style, if given, is called with the style of each cell (None for
+        a new cell) and its new value, and returns the style to give it.
+        Dates are written counting from epoch. The sheet's dimension, and the
+        spans of rows that cells are added to, are extended to take in the
+        cells written.
+        """
+        if cell_style is None:
+            cell_style = lambda style, value: style  # noqa: E731
+        # edits are (position, 0 to insert or 1 to replace, order, end, xml);
+        # insertions at a position go before a replacement starting there
+        edits: List[Tuple[int, int, int, int, bytes]] = []
+        new_rows: Dict[int, List[Tuple[int, bytes]]] = defaultdict(list)
+        for (coordinate, row, column), value in values.items():
+            span = self.cells.get(coordinate.encode())
+            if span is None:
+                new_rows[row].append(
+                    (
+                        column,
+                        _cell_xml(coordinate, cell_style(None, value), value, epoch),
+                    )
+                )
+                continue
+            if span.shared_formula:
+                logger.warning(
+                    f"Writing to {coordinate} replaces a formula shared with "
+                    "other cells."
+                )
+            xml = _cell_xml(coordinate, cell_style(span.style, value), value, epoch)
+            edits.append((span.start, 1, 0, span.end, xml))
+        inserted_rows: List[Tuple[int, bytes]] = []
+        for row, cells in new_rows.items():
+            cells.sort()
+            existing = self.rows.get(row)
+            if existing is None:
+                inserted_rows.append(
+                    (
+                        row,
+                        f'<row r="{row}">'.encode()
+                        + b"".join(xml for _, xml in cells)
+                        + b"</row>",
+                    )
+                )
+            elif existing.self_closing:
+                edits.append(
+                    (
+                        existing.start,
+                        1,
+                        0,
+                        existing.end,
+                        b"<row"
+                        + _with_spans(existing.attrs, [column for column, _ in cells])
+                        + b">"
+                        + b"".join(xml for _, xml in cells)
+                        + b"</row>",
+                    )
+                )
+            else:
+                attrs = _with_spans(existing.attrs, [column for column, _ in cells])
+                if attrs != existing.attrs:
+                    edits.append(
+                        (existing.start, 1, 0, existing.tag_end, b"<row" + attrs + b">")
+                    )
+                for column, xml in cells:
+                    i = bisect_left(existing.columns, column)
+                    pos = (
+                        existing.cell_starts[i]
+                        if i < len(existing.columns)
+                        else existing.inner_end
+                    )
+                    edits.append((pos, 0, column, pos, xml))
+        if self.empty and inserted_rows:
+            edits.append(
+                (
+                    self.data_start,
+                    1,
+                    0,
+                    self.data_end,
+                    b"<sheetData>"
+                    + b"".join(xml for _, xml in sorted(inserted_rows))
+                    + b"</sheetData>",
+                )
+            )
+        else:
+            for row, xml in inserted_rows:
+                i = bisect_right(self.row_numbers, row)
+                pos = (
+                    self.rows[self.row_numbers[i]].start
+                    if i < len(self.row_numbers)
+                    else self.data_inner_end
+                )
+                edits.append((pos, 0, row, pos, xml))
+        if self.dimension is not None and values:
+            dimension = self._dimension_ref(self.dimension.group(1), values)
+            if dimension != self.dimension.group(1):
+                edits.append(
+                    (
+                        self.dimension.start(1),
+                        1,
+                        0,
+                        self.dimension.end(1),
+                        dimension,
+                    )
+                )
+        edits.sort(key=lambda edit: edit[:3])
+        parts: List[bytes] = []
+        last = 0
+        for start, _, _, end, xml in edits:
+            parts.append(self.xml[last:start])
+            parts.append(xml)
+            last = end
+        parts.append(self.xml[last:])
+        return b"".join(parts)
+
+
+    @staticmethod
+    def _dimension_ref(ref: bytes, values: Dict[Tuple[str, int, int], Any]) -> bytes:
+        "Return the dimension ref extended to take in the cells in values."
+        min_col, min_row, max_col, max_row = range_boundaries(ref.decode())
+        for _, row, column in values:
+            min_col, max_col = min(min_col, column), max(max_col, column)
+            min_row, max_row = min(min_row, row), max(max_row, row)
+        first = f"{get_column_letter(min_col)}{min_row}"
+        last = f"{get_column_letter(max_col)}{max_row}"
+        return (first if first == last else f"{first}:{last}").encode()
+
+
+def _attr(tag: bytes, name: bytes) -> Optional[bytes]:
+    match = re.search(rb"\b" + name + rb'="([^"]*)"', tag)
+    return match.group(1) if match else None
+
+
+def _add_num_fmt(xml: bytes, num_fmt_id: int, format_code: str) -> bytes:
+    "Return styles xml with a <numFmt> added."
+    num_fmt = f'<numFmt numFmtId="{num_fmt_id}" formatCode="{escape(format_code)}"/>'
+    match = re.search(rb"<numFmts\b[^>]*?(/?)>", xml)
+    if match is None:
+        # numFmts is the first child of styleSheet
+        style_sheet = re.search(rb"<styleSheet\b[^>]*>", xml)
+        if style_sheet is None:
+            raise ValueError("The styles part has no styleSheet element.")
+        start = style_sheet.end()
+        return xml[:start] + f"<numFmts>{num_fmt}</numFmts>".encode() + xml[start:]
+    if match.group(1):
+        return (
+            xml[: match.start()]
+            + f"<numFmts>{num_fmt}</numFmts>".encode()
+            + xml[match.end() :]
+        )
+    end = xml.index(b"</numFmts>", match.end())
+    return _recount(xml[:end] + num_fmt.encode() + xml[end:], b"numFmts")
+
+
+def _add_cell_xf(xml: bytes, xf: bytes) -> bytes:
+    "Return styles xml with xf added to the end of <cellXfs>."
+    end = xml.index(b"</cellXfs>")
+    return _recount(xml[:end] + xf + xml[end:], b"cellXfs")
+
+
+def _recount(xml: bytes, element: bytes) -> bytes:
+    "Update the count attribute of element to the number of its children."
+    match = re.search(rb"<" + element + rb"\b([^>]*)>", xml)
+    if match is None:
+        return xml
+    old_count = _attr(match.group(1), b"count")
+    if old_count is None:
+        return xml
+    count = int(old_count) + 1
+    attrs = re.sub(rb'\bcount="\d+"', f'count="{count}"'.encode(), match.group(1))
+    return xml[: match.start()] + b"<" + element + attrs + b">" + xml[match.end() :]
+
+
+def _with_num_fmt(xf: bytes, num_fmt_id: int) -> bytes:
+    "Return a copy of the <xf> element xf using number format num_fmt_id."
+    for name, value in ((b"numFmtId", num_fmt_id), (b"applyNumberFormat", 1)):
+        attr = name + f'="{value}"'.encode()
+        if _attr(xf, name) is None:
+            xf = xf[:3] + b" " + attr + xf[3:]
+        else:
+            xf = re.sub(rb"\b" + name + rb'="[^"]*"', attr, xf, count=1)
+    return xf
+
+
+def _part_name(base: str, target: str) -> str:
+    "Return the zip name of a relationship target, relative to base."
+    if target.startswith("/"):
+        return target.lstrip("/")
+    return posixpath.normpath(posixpath.join(posixpath.dirname(base), target))
+
+
+class BlankTemplatePackage:
+    """A blank template held in memory as the parts of its zip package.
+
+    sheet_parts maps each sheet name to the name of its worksheet part, and
+    epoch is the start of the workbook's date system: 1904 if the workbook
+    uses the 1904 date system, otherwise 1900.
+    """
+
+    def __init__(self, blank_template: Path) -> None:
+        with zipfile.ZipFile(blank_template) as z:
+            self.parts: List[Tuple[zipfile.ZipInfo, bytes]] = [
+                (info, z.read(info)) for info in z.infolist()
+            ]
+        contents = {info.filename: data for info, data in self.parts}
+        workbook_part = "xl/workbook.xml"
+        rels_part = "xl/_rels/workbook.xml.rels"
+        rels = ElementTree.fromstring(contents[rels_part])
+        targets = {
+            rel.get("Id"): _part_name(workbook_part, rel.get("Target", ""))
+            for rel in rels.iter(f"{NS_PKG_REL}Relationship")
+        }
+        workbook = ElementTree.fromstring(contents[workbook_part])
+        self.sheet_parts: Dict[str, str] = {
+            sheet.get("name", ""): targets[sheet.get(f"{NS_R}id")]
+            for sheet in workbook.iter(f"{NS_MAIN}sheet")
+            if targets.get(sheet.get(f"{NS_R}id"), "") in contents
+        }
+        workbook_pr = _WORKBOOK_PR_RE.search(contents[workbook_part])
+        self.epoch = (
+            MAC_EPOCH
+            if workbook_pr is not None
+            and _attr(workbook_pr.group(1), b"date1904") in (b"1", b"true")
+            else WINDOWS_EPOCH
+        )
+        self._indexes: Dict[str, SheetIndex] = {}
+        self._drop_calc_chain(rels, contents, workbook_part, rels_part)
+        self._styles_part = next(
+            (
+                part
+                for part in targets.values()
+                if part.endswith("styles.xml") and part in contents
+            ),
+            None,
+        )
+        self._date_styles: Dict[Tuple[Optional[bytes], type], Optional[bytes]] = {}
+        self._num_fmts: Dict[int, str] = {}
+        self._cell_xfs: Optional[List[bytes]] = None
+
+    def _date_style(self, style: Optional[bytes], value: Any) -> Optional[bytes]:
+        """Return the style a cell with style should have to hold value.
+
+        As openpyxl does, a date or time written to a cell that does not
+        already have a date format is given the default format for its type.
+        A copy of the cell's cell format with that number format is added to
+        the styles part the first time it is needed.
+        """
+        kind = type(value)
+        if kind not in TIME_FORMATS or self._styles_part is None:
+            return style
+        try:
+            return self._date_styles[(style, kind)]
+        except KeyError:
+            pass
+        if self._cell_xfs is None:
+            xml = self._part(self._styles_part)
+            self._num_fmts = {
+                int(_attr(tag, b"numFmtId") or 0): unescape(
+                    (_attr(tag, b"formatCode") or b"").decode()
+                )
+                for tag in _NUM_FMT_RE.findall(xml)
+            }
+            cell_xfs = _CELL_XFS_RE.search(xml)
+            if cell_xfs is None:
+                raise ValueError("The styles part has no cellXfs element.")
+            self._cell_xfs = _XF_RE.findall(
+                xml, cell_xfs.end(), xml.index(b"</cellXfs>")
+            )
+        num_fmts, xfs = self._num_fmts, self._cell_xfs
+        xf = xfs[int(style or 0)] if int(style or 0) < len(xfs) else b"<xf/>"
+        num_fmt_id = int(_attr(xf, b"numFmtId") or 0)
+        fmt = num_fmts.get(num_fmt_id, BUILTIN_FORMATS.get(num_fmt_id, "General"))
+        if is_date_format(fmt):
+            new_style = style
+        else:
+            xml = self._part(self._styles_part)
+            new_fmt = TIME_FORMATS[kind]
+            new_id = BUILTIN_FORMATS_REVERSE.get(new_fmt)
+            if new_id is None:
+                new_id = next(
+                    (i for i, code in num_fmts.items() if code == new_fmt), None
+                )
+            if new_id is None:
+                new_id = max([163] + list(num_fmts)) + 1
+                num_fmts[new_id] = new_fmt
+                xml = _add_num_fmt(xml, new_id, new_fmt)
+            new_xf = _with_num_fmt(xf, new_id)
+            xml = _add_cell_xf(xml, new_xf)
+            new_style = str(len(xfs)).encode()
+            xfs.append(new_xf)
+            self._replace_part(self._styles_part, xml)
+        self._date_styles[(style, kind)] = new_style
+        return new_style
+
+    def _part(self, name: str) -> bytes:
+        return next(data for info, data in self.parts if info.filename == name)
+
+    def _replace_part(self, name: str, data: bytes) -> None:
+        self.parts = [
+            (info, data if info.filename == name else old)
+            for info, old in self.parts
+        ]
+
+    def _drop_calc_chain(self, rels, contents, workbook_part, rels_part) -> None:
+        """Remove the calculation chain and have the workbook recalculated on opening.
+
+        Written cells may have held formulas in the chain; Excel rebuilds it.
+        """
+        replaced: Dict[str, bytes] = {}
+        dropped = set()
+        for rel in rels.iter(f"{NS_PKG_REL}Relationship"):
+            if rel.get("Type", "").endswith(CALC_CHAIN):
+                part = _part_name(workbook_part, rel.get("Target", ""))
+                dropped.add(part)
+                replaced[rels_part] = re.sub(
+                    rb"<Relationship\b[^>]*\bId=\""
+                    + re.escape(rel.get("Id").encode())
+                    + rb"\"[^>]*/>",
+                    b"",
+                    contents[rels_part],
+                )
+                replaced["[Content_Types].xml"] = re.sub(
+                    rb'<Override\b[^>]*\bPartName="/'
+                    + re.escape(part.encode())
+                    + rb'"[^>]*/>',
+                    b"",
+                    contents["[Content_Types].xml"],
+                )
+        calc_pr = _CALC_PR_RE.search(contents[workbook_part])
+        if calc_pr is not None and b"fullCalcOnLoad" not in calc_pr.group(1):
+            xml = contents[workbook_part]
+            replaced[workbook_part] = (
+                xml[: calc_pr.start()]
+                + b"<calcPr"
+                + calc_pr.group(1)
+                + b' fullCalcOnLoad="1"'
+                + calc_pr.group(2)
+                + b">"
+                + xml[calc_pr.end() :]
+            )
+        self.parts = [
+            (info, replaced.get(info.filename, data))
+            for info, data in self.parts
+            if info.filename not in dropped
+        ]
+
+    def sheet_index(self, sheet_name: str) -> SheetIndex:
+        "Return the index of sheet_name's XML, building it the first time it is needed."
+        try:
+            return self._indexes[sheet_name]
+        except KeyError:
+            xml = self._part(self.sheet_parts[sheet_name])
+            index = self._indexes[sheet_name] = SheetIndex(xml)
+            return index
+
+    def write(
+        self, path: Path, values: Dict[str, Dict[Tuple[str, int, int], Any]]
+    ) -> None:
+        """Write a copy of the template to path with values written into it.
+
+        values maps each sheet name to the values for its cells, as for
+        SheetIndex.patch().
+        """
+        patched = {
+            self.sheet_parts[sheet]: self.sheet_index(sheet).patch(
+                cells, self._date_style, self.epoch
+            )
+            for sheet, cells in values.items()
+        }
+        with zipfile.ZipFile(path, "w", zipfile.ZIP_DEFLATED) as z:
+            for info, data in self.parts:
+                z.writestr(info, patched.get(info.filename, data))
+
+
+class XMLTemplatesWriteRepo(MultipleTemplatesWriteRepo):
+    """Write data to a blank template by patching its XML rather than through openpyxl.
+
+    Takes the same arguments and is used in the same way as
+    MultipleTemplatesWriteRepo, including writing in a process pool.
+    """
+
+    def _load_blank_template(self) -> BlankTemplatePackage:  # type: ignore
+        try:
+            return BlankTemplatePackage(self.blank_template)
+        except FileNotFoundError as e:
+            raise FileNotFoundError(
+                f"Cannot find file {e.filename}. Do you have "
+                "file set correctly in config file, or is file missing?"
+            )
+
+    def _write_file(  # type: ignore
+        self, blank_template: BlankTemplatePackage, file_data: MASTER_COL_DATA
+    ) -> str:
+        """Write file_data to a copy of blank_template in the output directory.
+
+        Returns the name of the file written.
+        """
+        _output_tml = "Key: {} missing a 'sheet' value in datamap. Check your datamap. Data MAY not export."
+        file_name = file_data[0].file_name
+        logger.info("Populating {}".format(file_name))
+        values: Dict[str, Dict[Tuple[str, int, int], Any]] = {}
+        for cell in file_data:
+            if cell.sheet not in blank_template.sheet_parts:
+                logger.warning(_output_tml.format(cell.key))
+                continue
+            coordinate = _coordinate(cell.cellref)
+            if coordinate is None:
+                logger.warning(
+                    f"No cellref in datamap for key: {cell.key}. Cannot export this cell."
+                )
+                continue
+            if blank_template.sheet_index(cell.sheet).is_merged(*coordinate[1:]):
+                raise AttributeError(
+                    "PROBLEM: Object->{} Cannot write to a merged cell.".format(cell)
+                )
+            values.setdefault(cell.sheet, {})[coordinate] = cell.value
+        output_file_name: str = ".".join([file_name, "xlsm"])
+        logger.info("Saving {}".format(output_file_name))
+        blank_template.write(Path(self.output_path) / output_file_name, values)
+        return output_file_name
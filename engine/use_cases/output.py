@@ -5,13 +5,12 @@ Use cases related to writing data to an output repository.
 import logging
 import warnings
 from pathlib import Path
-from typing import List
-
-from openpyxl import load_workbook
+from typing import Dict, List, Tuple
 
 from engine.repository.datamap import InMemorySingleDatamapRepository
 from engine.use_cases.parsing import ParseDatamapUseCase
 from engine.use_cases.typing import MASTER_DATA_FOR_FILE, ColData
+from engine.utils.extraction import master_reader
 
 warnings.filterwarnings("ignore", ".*Conditional Formatting*.")
 warnings.filterwarnings("ignore", ".*Sparkline Group*.")
@@ -36,7 +35,7 @@ class WriteMasterToTemplates:
         self.output_repo = output_repo
         self._datamap = datamap
         self._master_path = master
-        self._master_sheet = load_workbook(master).active
+        self._master = master_reader(master)
         self._blank_template = blank_template
         self._col_a_vals: List[str]
 
@@ -44,12 +43,11 @@ class WriteMasterToTemplates:
         parsed_dm_data = self._parse_dm_uc.execute(obj=True)
         self._dml_line_tup = [(x.key, x.sheet, x.cellref) for x in parsed_dm_data]
         self._col_a_vals = []
-        for cell in next(self._master_sheet.columns):
+        for key in self._master.keys:
             try:
-                self._col_a_vals.append(cell.value.strip())
+                self._col_a_vals.append(key.strip())
             except AttributeError:
                 self._col_a_vals.append("EMPTY")
-        self._col_a_vals = self._col_a_vals[1:]
         _pass = zip([x[0] for x in self._dml_line_tup], self._col_a_vals)
         return all([x[0] == x[1] for x in _pass])
 
@@ -79,11 +77,28 @@ class WriteMasterToTemplates:
                 raise RuntimeError(
                     "Not continuing. Ensure all keys from datamap are in the master."
                 )
-        cola = [x.value for x in list(self._master_sheet.columns)[0]][1:]
-        for col in list(self._master_sheet.columns)[1:]:
-            tups = []
+        # resolve each key in column A to its sheet and cellref once, rather
+        # than searching the datamap for every key in every column
+        dm_lookup: Dict[str, Tuple[str, str]] = {}
+        for key, sheet, cellref in self._dml_line_tup:
+            dm_lookup.setdefault(key, (sheet, cellref))
+        rows: List[Tuple[int, str, str, str]] = []
+        for i, key in enumerate(self._master.keys):
+            if key is None:
+                logger.warning(
+                    f"Found values in cells beyond end of expected end row. "
+                    "For most reliable results, use a clean master file."
+                )
+                break
+            key = key.strip()
+            try:
+                sheet, cellref = dm_lookup[key]
+            except KeyError:
+                continue
+            rows.append((i, key, sheet, cellref))
+        for header, column in zip(self._master.file_names, self._master.columns):
             try:
-                file_name = col[0].value.split(".")[0]
+                file_name = header.split(".")[0]
             except AttributeError:
                 logger.warning(
                     "Found values in cells beyond end of expected end column. "
@@ -91,29 +106,17 @@ class WriteMasterToTemplates:
                 )
                 break
             logger.info(f"Extracting data for {file_name} from {self._master_path}")
-            for i, key in enumerate(cola, start=1):
-                if key is not None:
-                    key = key.strip()
-                else:
-                    # TODO - create a log register so this does not have to be repeated for every
-                    #   column of data in the master ().
-                    logger.warning(
-                        f"Found values in cells beyond end of expected end row. "
-                        "For most reliable results, use a clean master file."
+            master_data.append(
+                [
+                    ColData(
+                        key=key,
+                        sheet=sheet,
+                        cellref=cellref,
+                        value=column[i],
+                        file_name=file_name,
                     )
-                    break
-                try:
-                    sheet = [dml[1] for dml in self._dml_line_tup if dml[0] == key][0]
-                except IndexError:
-                    continue
-                cd = ColData(
-                    key=key,
-                    sheet=sheet,
-                    cellref=[dml[2] for dml in self._dml_line_tup if dml[0] == key][0],
-                    value=col[i].value,
-                    file_name=file_name,
-                )
-                tups.append(cd)
-            master_data.append(tups)
+                    for i, key, sheet, cellref in rows
+                ]
+            )
 
         self.output_repo.write(master_data, from_json=False)
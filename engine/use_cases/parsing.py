@@ -33,25 +33,38 @@ objects - will return a dict of the form:
         }
     }
 """
-import json
 import logging
+import multiprocessing
+import os
 import warnings
 from concurrent import futures
-from typing import Dict, List
+from functools import partial
+from pathlib import Path
+from typing import Any, Dict, List, NamedTuple, Optional, Set, Tuple, Union
 
+from engine.config import Config
+from engine.domain.master import Master, MasterMatrix
+from engine.domain.template import TYPE_CODES, Cell, CompactTemplate
 from engine.exceptions import (
     DatamapNotCSVException,
     NoApplicableSheetsInTemplateFiles,
     RemoveFileWithNoSheetRequiredByDatamap,
+    TemplateExtractionError,
 )
 from engine.reports.validation import ValidationReportCSV
+from engine.utils.cache import ExtractionCache
 from engine.utils.extraction import (
     ALL_IMPORT_DATA,
+    ExtractionFailure,
     check_datamap_sheets,
+    datamap_sheets,
+    datamap_targets,
+    expand_templates,
+    extraction_failure,
     remove_failing_files,
-    template_reader,
+    template_reader_compact,
 )
-from engine.utils.validation import validation_checker
+from engine.utils.validation import batch_validation_checker
 
 # pylint: disable=R0903,R0913;
 
@@ -68,12 +81,43 @@ logger = logging.getLogger(__name__)
 SKIP_MISSING_SHEETS = False
 
 
+class DatamapIndex(NamedTuple):
+    "Lookups over the lines of a datamap, built once by index_datamap()."
+
+    cellrefs: Dict[Tuple[str, str], str]
+    keys: Set[str]
+    sheets: Set[str]
+
+
+def index_datamap(datamap_data: List[Dict[str, str]]) -> DatamapIndex:
+    """Index datamap lines by (key, sheet), for constant time lookup of their cellref.
+
+    Where the datamap has the same key and sheet on more than one line, the
+    first of them is used.
+    """
+    cellrefs: Dict[Tuple[str, str], str] = {}
+    for dml in datamap_data:
+        cellrefs.setdefault((dml["key"], dml["sheet"]), dml["cellref"])
+    return DatamapIndex(
+        cellrefs,
+        {dml["key"] for dml in datamap_data},
+        {dml["sheet"] for dml in datamap_data},
+    )
+
+
 class ParsePopulatedTemplatesUseCase:
     def __init__(self, repo):
         self.repo = repo
 
-    def execute(self) -> str:
-        return self.repo.list_as_json()  # type: ignore
+    def execute(
+        self,
+        targets: Optional[Dict[str, Set[str]]] = None,
+        sheets: Optional[Set[str]] = None,
+        obj: bool = False,
+    ):
+        if not obj:
+            return self.repo.list_as_json(targets=targets, sheets=sheets)  # type: ignore
+        return self.repo.list_as_objs(targets=targets, sheets=sheets)  # type: ignore
 
 
 class ApplyDatamapToExtractionUseCaseWithValidation:
@@ -84,9 +128,14 @@ class ApplyDatamapToExtractionUseCaseWithValidation:
         self._template_repo = template_repo
         self._template_data_dict: ALL_IMPORT_DATA = {}
         self._datamap_data_dict: List[Dict[str, str]] = []
-        self.data_for_master: List[ALL_IMPORT_DATA] = []
-        self._datamap_data_json: str = ""
-        self._template_data_json: str = ""
+        self.master: Optional[Master] = None
+        self._datamap_index: Optional[DatamapIndex] = None
+
+    def _datamap_lookup(self) -> DatamapIndex:
+        "Return the index of the datamap, building it the first time it is needed."
+        if self._datamap_index is None:
+            self._datamap_index = index_datamap(self._datamap_data_dict)
+        return self._datamap_index
 
     def _get_value_of_cell_referred_by_key(
         self, filename: str, key: str, sheet: str
@@ -96,21 +145,28 @@ class ApplyDatamapToExtractionUseCaseWithValidation:
 
         Throws KeyError if the datamap refers to a sheet/cellref combo in the target file that does not exist.
         """
-        output = ""
-        if key not in [x["key"] for x in self._datamap_data_dict]:
+        cell = self._get_cell_referred_by_key(filename, key, sheet)
+        return "" if cell is None else cell["value"]
+
+    def _get_cell_referred_by_key(self, filename: str, key: str, sheet: str):
+        """As _get_value_of_cell_referred_by_key(), but returns the cell itself.
+
+        Returns None if there is no value in the cell.
+        """
+        output = None
+        index = self._datamap_lookup()
+        if key not in index.keys:
             raise KeyError('No key "{}" in datamap'.format(key))
-        if sheet not in [x["sheet"] for x in self._datamap_data_dict]:
+        if sheet not in index.sheets:
             raise KeyError('No sheet "{}" in datamap'.format(sheet))
-        _target_cellref = [
-            x["cellref"]
-            for x in self._datamap_data_dict
-            if x["key"] == key and x["sheet"] == sheet
-        ]
-        _cellref = _target_cellref[0]
         try:
-            output = self._template_data_dict[filename]["data"][sheet][_cellref][
-                "value"
-            ]
+            _cellref = index.cellrefs[(key, sheet)]
+        except KeyError:
+            raise IndexError(
+                'No line for key "{}" on sheet "{}" in datamap'.format(key, sheet)
+            )
+        try:
+            output = self._template_data_dict[filename]["data"][sheet][_cellref]
         except KeyError as e:
             if e.args[0] == sheet:
                 logger.critical(
@@ -130,10 +186,17 @@ class ApplyDatamapToExtractionUseCaseWithValidation:
         t_uc = ParsePopulatedTemplatesUseCase(self._template_repo)
         d_uc = ParseDatamapUseCase(self._datamap_repo)
         try:
-            self._datamap_data_json = d_uc.execute()
+            self._datamap_data_dict = [dml.to_dict() for dml in d_uc.execute(obj=True)]
         except DatamapNotCSVException:
             raise
-        self._template_data_json = t_uc.execute()
+        self._datamap_index = None
+        targets = None
+        if Config.TEMPLATE_TARGETED_EXTRACTION:
+            targets = datamap_targets(self._datamap_data_dict)
+        # sheets not in the datamap are not read at all
+        self._template_data_dict = t_uc.execute(
+            targets=targets, sheets=datamap_sheets(self._datamap_data_dict), obj=True
+        )
 
     def get_values(self):
         for _file_name in self._template_data_dict:
@@ -147,10 +210,8 @@ class ApplyDatamapToExtractionUseCaseWithValidation:
                 self._set_datamap_and_template_data()
             except DatamapNotCSVException:
                 raise
-        self._datamap_data_dict = json.loads(self._datamap_data_json)
-        self._template_data_dict = json.loads(self._template_data_json)
 
-        self.validation_checks = validation_checker(
+        self.validation_checks = batch_validation_checker(
             self._datamap_data_dict, self._template_data_dict
         )
 
@@ -183,26 +244,66 @@ class ApplyDatamapToExtractionUseCaseWithValidation:
 
         Raises KeyError if any of filename, key and sheet are not in the datamap.
         """
+        cell = self.query_cell(filename, key, sheet)
+        return "" if cell is None else cell["value"]
+
+    def query_cell(self, filename, key, sheet):
+        """As query_key(), but returns the cell holding the value, or None if it is empty."""
         if not bool(self._template_data_dict) and bool(self._datamap_data_dict):
             self._set_datamap_and_template_data()
         try:
-            return self._get_value_of_cell_referred_by_key(filename, key, sheet)
+            return self._get_cell_referred_by_key(filename, key, sheet)
         except KeyError:
             logger.critical(
                 "Unable to process datamapline due to problem with sheet/cellref referred to by datamap"
             )
             raise
 
+    @property
+    def data_for_master(self) -> List[Dict[str, List[Tuple[str, Any]]]]:
+        "The master as a list of {file name: [(key, value), ...]}, one per file."
+        if self.master is None:
+            return []
+        return self.master.to_data_for_master()
+
+    def master_matrix(self) -> MasterMatrix:
+        "Return the master built by execute(for_master=True) as a NumPy-backed MasterMatrix."
+        if self.master is None:
+            raise RuntimeError("No master built yet. Call execute(for_master=True).")
+        return MasterMatrix.from_master(self.master)
+
     def _format_data_for_master(self):
-        output = [{fname: []} for fname in self._template_data_dict]
-        f_data = self._template_data_dict
         dm_data = self._datamap_data_dict
-        for _file_name in f_data:
-            for _dml in dm_data:
-                val = self.query_key(_file_name, _dml["key"], _dml["sheet"])
-                _col_dict = [d for d in output if list(d.keys())[0] == _file_name][0]
-                _col_dict[_file_name].append((_dml["key"], val))
-        self.data_for_master = output
+        f_data = self._template_data_dict
+        master = Master(
+            keys=[_dml["key"] for _dml in dm_data],
+            file_names=list(f_data),
+            sheets=[_dml["sheet"] for _dml in dm_data],
+            cellrefs=[_dml["cellref"] for _dml in dm_data],
+            checksums=[f_data[_file_name]["checksum"] for _file_name in f_data],
+        )
+        cellrefs = self._datamap_lookup().cellrefs
+        _targets = [
+            (_dml["sheet"], cellrefs[(_dml["key"], _dml["sheet"])]) for _dml in dm_data
+        ]
+        for _values, _type_codes, _file_name in zip(
+            master.values, master.type_codes, f_data
+        ):
+            _data = f_data[_file_name]["data"]
+            for row, (_sheet, _cellref) in enumerate(_targets):
+                try:
+                    cell = _data[_sheet][_cellref]
+                except KeyError:
+                    # an empty cell or a missing sheet, which query_cell handles
+                    _dml = dm_data[row]
+                    cell = self.query_cell(_file_name, _dml["key"], _dml["sheet"])
+                if isinstance(cell, Cell):
+                    _values[row] = cell.value
+                    _type_codes[row] = cell.type_code
+                elif cell is not None:
+                    _values[row] = cell["value"]
+                    _type_codes[row] = TYPE_CODES[cell["data_type"]]
+        self.master = master
 
 
 class ApplyDatamapToExtractionUseCase:
@@ -213,9 +314,14 @@ class ApplyDatamapToExtractionUseCase:
         self._template_repo = template_repo
         self._template_data_dict: ALL_IMPORT_DATA = {}
         self._datamap_data_dict: List[Dict[str, str]] = []
-        self.data_for_master: List[ALL_IMPORT_DATA] = []
-        self._datamap_data_json: str = ""
-        self._template_data_json: str = ""
+        self.master: Optional[Master] = None
+        self._datamap_index: Optional[DatamapIndex] = None
+
+    def _datamap_lookup(self) -> DatamapIndex:
+        "Return the index of the datamap, building it the first time it is needed."
+        if self._datamap_index is None:
+            self._datamap_index = index_datamap(self._datamap_data_dict)
+        return self._datamap_index
 
     def _get_value_of_cell_referred_by_key(
         self, filename: str, key: str, sheet: str
@@ -225,21 +331,28 @@ class ApplyDatamapToExtractionUseCase:
 
         Throws KeyError if the datamap refers to a sheet/cellref combo in the target file that does not exist.
         """
-        output = ""
-        if key not in [x["key"] for x in self._datamap_data_dict]:
+        cell = self._get_cell_referred_by_key(filename, key, sheet)
+        return "" if cell is None else cell["value"]
+
+    def _get_cell_referred_by_key(self, filename: str, key: str, sheet: str):
+        """As _get_value_of_cell_referred_by_key(), but returns the cell itself.
+
+        Returns None if there is no value in the cell.
+        """
+        output = None
+        index = self._datamap_lookup()
+        if key not in index.keys:
             raise KeyError('No key "{}" in datamap'.format(key))
-        if sheet not in [x["sheet"] for x in self._datamap_data_dict]:
+        if sheet not in index.sheets:
             raise KeyError('No sheet "{}" in datamap'.format(sheet))
-        _target_cellref = [
-            x["cellref"]
-            for x in self._datamap_data_dict
-            if x["key"] == key and x["sheet"] == sheet
-        ]
-        _cellref = _target_cellref[0]
         try:
-            output = self._template_data_dict[filename]["data"][sheet][_cellref][
-                "value"
-            ]
+            _cellref = index.cellrefs[(key, sheet)]
+        except KeyError:
+            raise IndexError(
+                'No line for key "{}" on sheet "{}" in datamap'.format(key, sheet)
+            )
+        try:
+            output = self._template_data_dict[filename]["data"][sheet][_cellref]
         except KeyError as e:
             # Handle the case of the sheet being missing
             if e.args[0] == sheet:
@@ -265,10 +378,17 @@ class ApplyDatamapToExtractionUseCase:
         t_uc = ParsePopulatedTemplatesUseCase(self._template_repo)
         d_uc = ParseDatamapUseCase(self._datamap_repo)
         try:
-            self._datamap_data_json = d_uc.execute()
+            self._datamap_data_dict = [dml.to_dict() for dml in d_uc.execute(obj=True)]
         except DatamapNotCSVException:
             raise
-        self._template_data_json = t_uc.execute()
+        self._datamap_index = None
+        targets = None
+        if Config.TEMPLATE_TARGETED_EXTRACTION:
+            targets = datamap_targets(self._datamap_data_dict)
+        # sheets not in the datamap are not read at all
+        self._template_data_dict = t_uc.execute(
+            targets=targets, sheets=datamap_sheets(self._datamap_data_dict), obj=True
+        )
 
     def get_values(self):
         for _file_name in self._template_data_dict:
@@ -282,8 +402,6 @@ class ApplyDatamapToExtractionUseCase:
                 self._set_datamap_and_template_data()
             except DatamapNotCSVException:
                 raise
-        self._datamap_data_dict = json.loads(self._datamap_data_json)
-        self._template_data_dict = json.loads(self._template_data_json)
         logger.info("Checking template data.")
 
         checks = check_datamap_sheets(self._datamap_data_dict, self._template_data_dict)
@@ -314,26 +432,66 @@ class ApplyDatamapToExtractionUseCase:
 
         Raises KeyError if any of filename, key and sheet are not in the datamap.
         """
+        cell = self.query_cell(filename, key, sheet)
+        return "" if cell is None else cell["value"]
+
+    def query_cell(self, filename, key, sheet):
+        """As query_key(), but returns the cell holding the value, or None if it is empty."""
         if not bool(self._template_data_dict) and bool(self._datamap_data_dict):
             self._set_datamap_and_template_data()
         try:
-            return self._get_value_of_cell_referred_by_key(filename, key, sheet)
+            return self._get_cell_referred_by_key(filename, key, sheet)
         except KeyError:
             logger.critical(
                 "Unable to process datamapline due to problem with sheet/cellref referred to by datamap"
             )
             raise
 
+    @property
+    def data_for_master(self) -> List[Dict[str, List[Tuple[str, Any]]]]:
+        "The master as a list of {file name: [(key, value), ...]}, one per file."
+        if self.master is None:
+            return []
+        return self.master.to_data_for_master()
+
+    def master_matrix(self) -> MasterMatrix:
+        "Return the master built by execute(for_master=True) as a NumPy-backed MasterMatrix."
+        if self.master is None:
+            raise RuntimeError("No master built yet. Call execute(for_master=True).")
+        return MasterMatrix.from_master(self.master)
+
     def _format_data_for_master(self):
-        output = [{fname: []} for fname in self._template_data_dict]
-        f_data = self._template_data_dict
         dm_data = self._datamap_data_dict
-        for _file_name in f_data:
-            for _dml in dm_data:
-                val = self.query_key(_file_name, _dml["key"], _dml["sheet"])
-                _col_dict = [d for d in output if list(d.keys())[0] == _file_name][0]
-                _col_dict[_file_name].append((_dml["key"], val))
-        self.data_for_master = output
+        f_data = self._template_data_dict
+        master = Master(
+            keys=[_dml["key"] for _dml in dm_data],
+            file_names=list(f_data),
+            sheets=[_dml["sheet"] for _dml in dm_data],
+            cellrefs=[_dml["cellref"] for _dml in dm_data],
+            checksums=[f_data[_file_name]["checksum"] for _file_name in f_data],
+        )
+        cellrefs = self._datamap_lookup().cellrefs
+        _targets = [
+            (_dml["sheet"], cellrefs[(_dml["key"], _dml["sheet"])]) for _dml in dm_data
+        ]
+        for _values, _type_codes, _file_name in zip(
+            master.values, master.type_codes, f_data
+        ):
+            _data = f_data[_file_name]["data"]
+            for row, (_sheet, _cellref) in enumerate(_targets):
+                try:
+                    cell = _data[_sheet][_cellref]
+                except KeyError:
+                    # an empty cell or a missing sheet, which query_cell handles
+                    _dml = dm_data[row]
+                    cell = self.query_cell(_file_name, _dml["key"], _dml["sheet"])
+                if isinstance(cell, Cell):
+                    _values[row] = cell.value
+                    _type_codes[row] = cell.type_code
+                elif cell is not None:
+                    _values[row] = cell["value"]
+                    _type_codes[row] = TYPE_CODES[cell["data_type"]]
+        self.master = master
 
 
 # We have created a new CreateMasterUseCaseWithValidation class
@@ -381,7 +539,7 @@ class CreateMasterUseCaseWithValidation:
             logger.info(f"Validation report written to {pth}.")
         except DatamapNotCSVException:
             raise
-        output_repo = self.output_repository(uc.data_for_master, output_file_name)
+        output_repo = self.output_repository(uc.master, output_file_name)
         output_repo.save()
 
 
@@ -397,7 +555,7 @@ class CreateMasterUseCase:
             uc.execute(for_master=True)
         except DatamapNotCSVException:
             raise
-        output_repo = self.output_repository(uc.data_for_master, output_file_name)
+        output_repo = self.output_repository(uc.master, output_file_name)
         output_repo.save()
 
 
@@ -423,10 +581,144 @@ class ParseDatamapUseCase:
 #    return data
 
 
-def extract_from_multiple_xlsx_files(xlsx_files) -> ALL_IMPORT_DATA:
-    """Extract raw data from list of paths to excel files. Return as complex dictionary."""
-    data = {}
-    with futures.ProcessPoolExecutor() as pool:
-        for file in pool.map(template_reader, xlsx_files):
-            data.update(file)
+def _extract_chunk(reader, files) -> List[Union[CompactTemplate, ExtractionFailure]]:
+    """Extract each file in files with reader, in a pool worker.
+
+    A file that cannot be extracted is returned as an ExtractionFailure rather
+    than raising, so that it does not take the rest of the chunk with it.
+    """
+    results: List[Union[CompactTemplate, ExtractionFailure]] = []
+    for file in files:
+        try:
+            results.append(reader(file))
+        except Exception as e:
+            results.append(extraction_failure(file, e))
+    return results
+
+
+def extract_from_multiple_xlsx_files(
+    xlsx_files,
+    targets: Optional[Dict[str, Set[str]]] = None,
+    sheets: Optional[Set[str]] = None,
+    failures: Optional[List[ExtractionFailure]] = None,
+) -> ALL_IMPORT_DATA:
+    """Extract raw data from list of paths to excel files. Return as complex dictionary.
+
+    See extract_compact_from_multiple_xlsx_files() for the arguments.
+    """
+    return expand_templates(
+        extract_compact_from_multiple_xlsx_files(
+            xlsx_files, targets=targets, sheets=sheets, failures=failures
+        )
+    )
+
+
+def extract_compact_from_multiple_xlsx_files(
+    xlsx_files,
+    targets: Optional[Dict[str, Set[str]]] = None,
+    sheets: Optional[Set[str]] = None,
+    failures: Optional[List[ExtractionFailure]] = None,
+) -> Dict[str, CompactTemplate]:
+    """Extract raw data from list of paths to excel files, as a CompactTemplate per file name.
+
+    Workers send CompactTemplates back to this process, and they are only
+    expanded into cell dicts (see engine.utils.extraction.expand_template) if a
+    caller asks for them.
+
+    If targets is given, only the sheets and cellrefs it contains are extracted
+    from each file (see engine.utils.extraction.datamap_targets). If sheets is
+    given, only those sheets are read.
+
+    If Config.TEMPLATE_CACHE is set, files already extracted with the same
+    settings are loaded from the extraction cache (see engine.utils.cache).
+
+    Files are extracted in a process pool configured by Config.IMPORT_WORKERS,
+    Config.IMPORT_START_METHOD and Config.IMPORT_CHUNKSIZE, unless there are
+    no more than Config.IMPORT_SERIAL_THRESHOLD of them, in which case they are
+    extracted one after the other in this process.
+
+    A file that cannot be extracted (e.g. a corrupt xlsx file) is dealt with
+    according to Config.IMPORT_FAILURE_POLICY: "skip" leaves it out and carries
+    on; "fail" carries on with the remaining files but then raises
+    TemplateExtractionError; "abort" raises TemplateExtractionError straight
+    away. TemplateExtractionError is also raised if no file could be extracted.
+    If failures is given, an ExtractionFailure for each such file is appended
+    to it.
+    """
+    policy = Config.IMPORT_FAILURE_POLICY
+    if policy not in Config.IMPORT_FAILURE_POLICIES:
+        raise ValueError(
+            f"Unknown import failure policy {policy}. "
+            f"Use one of {Config.IMPORT_FAILURE_POLICIES}."
+        )
+    if failures is None:
+        failures = []
+    xlsx_files = list(xlsx_files)
+    data: Dict[str, CompactTemplate] = {}
+    cache = ExtractionCache() if Config.TEMPLATE_CACHE else None
+    # settings are passed explicitly rather than read from Config in the
+    # workers, which do not inherit changes to it under the "spawn" start method
+    reader = partial(
+        template_reader_compact,
+        targets=targets,
+        sheets=sheets,
+        cache=cache,
+        reader=Config.TEMPLATE_READER,
+        row_limit=Config.TEMPLATE_ROW_LIMIT,
+    )
+
+    def _collect(results) -> None:
+        for result in results:
+            if isinstance(result, ExtractionFailure):
+                logger.warning(
+                    f"{result.filename} skipped as it could not be extracted: "
+                    f"{result.error_type}: {result.msg}"
+                )
+                failures.append(result)
+                if policy == "abort":
+                    raise TemplateExtractionError(
+                        f"Stopped importing at {result.filename}, which could not be extracted.",
+                        failures,
+                    )
+            else:
+                data[Path(result.file_name).name] = result
+
+    workers = min(Config.IMPORT_WORKERS or os.cpu_count() or 1, len(xlsx_files))
+    if workers <= 1 or len(xlsx_files) <= Config.IMPORT_SERIAL_THRESHOLD:
+        for file in xlsx_files:
+            _collect(_extract_chunk(reader, [file]))
+    else:
+        mp_context = (
+            multiprocessing.get_context(Config.IMPORT_START_METHOD)
+            if Config.IMPORT_START_METHOD
+            else None
+        )
+        chunksize = max(int(Config.IMPORT_CHUNKSIZE), 1)
+        chunks = [
+            xlsx_files[i : i + chunksize] for i in range(0, len(xlsx_files), chunksize)
+        ]
+        with futures.ProcessPoolExecutor(
+            max_workers=workers, mp_context=mp_context
+        ) as pool:
+            pending = {pool.submit(_extract_chunk, reader, c): c for c in chunks}
+            try:
+                for future in futures.as_completed(pending):
+                    try:
+                        results = future.result()
+                    except Exception as e:
+                        # the worker itself died, e.g. BrokenProcessPool
+                        results = [extraction_failure(f, e) for f in pending[future]]
+                    _collect(results)
+            except TemplateExtractionError:
+                for future in pending:
+                    future.cancel()
+                raise
+    if failures and (policy == "fail" or not data):
+        raise TemplateExtractionError(
+            f"{len(failures)} of {len(xlsx_files)} files could not be extracted: "
+            + ", ".join(f.filename for f in failures),
+            failures,
+        )
+    if cache is not None:
+        cache.prune()
     return data
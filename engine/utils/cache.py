@@ -0,0 +1,141 @@
+"""
+A persistent cache of data extracted from populated templates.
+
+Entries are keyed on the checksum of the template file and on the settings
+it was extracted with (row limit, reader backend, sheets and targets), so a
+template that has not changed since the last import is loaded from the cache
+rather than being parsed again. Each entry is a json file in the cache
+directory, which by default is "extraction_cache" inside
+Config.DATAMAPS_LIBRARY_DATA_DIR.
+
+The cache is capped at a size in bytes; once it grows beyond that, the least
+recently used entries are removed by prune().
+"""
+import hashlib
+import json
+import logging
+import os
+from pathlib import Path
+from typing import Any, Dict, Optional, Set
+
+from engine.config import Config
+
+logging.basicConfig(
+    level=logging.INFO,
+    format="%(asctime)s: %(levelname)s - %(message)s",
+    datefmt="%d-%b-%y %H:%M:%S",
+)
+
+logger = logging.getLogger(__name__)
+
+# Bump this whenever the shape of the extracted data changes, so that entries
+# written by an older version of the engine are no longer used.
+CACHE_VERSION = 2
+
+
+class ExtractionCache:
+    """Extracted template data stored on disk, keyed by checksum and extraction settings."""
+
+    def __init__(
+        self, directory: Optional[Path] = None, max_bytes: Optional[int] = None
+    ) -> None:
+        if directory is None:
+            directory = Path(Config.DATAMAPS_LIBRARY_DATA_DIR) / "extraction_cache"
+        if max_bytes is None:
+            max_bytes = Config.TEMPLATE_CACHE_MAX_BYTES
+        self.directory = Path(directory)
+        self.max_bytes = int(max_bytes)
+
+    @staticmethod
+    def key(
+        checksum: str,
+        reader: str,
+        row_limit: int,
+        targets: Optional[Dict[str, Set[str]]] = None,
+        sheets: Optional[Set[str]] = None,
+    ) -> str:
+        """Return the cache key for a file with checksum extracted with these settings."""
+        settings = {
+            "version": CACHE_VERSION,
+            "checksum": checksum,
+            "reader": reader,
+            "row_limit": int(row_limit),
+            "targets": (
+                None
+                if targets is None
+                else {sheet: sorted(refs) for sheet, refs in targets.items()}
+            ),
+            "sheets": None if sheets is None else sorted(sheets),
+        }
+        return hashlib.sha256(
+            json.dumps(settings, sort_keys=True).encode("utf-8")
+        ).hexdigest()
+
+    def _path(self, key: str) -> Path:
+        return self.directory / f"{key}.json"
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        """Return the data stored under key, or None if there is no usable entry."""
+        path = self._path(key)
+        try:
+            with open(path, encoding="utf-8") as f:
+                data: Dict[str, Any] = json.load(f)
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError):
+            logger.warning(f"Ignoring unreadable extraction cache entry {path.name}.")
+            self._remove(path)
+            return None
+        try:
+            # mark as recently used so that prune() keeps it
+            os.utime(path)
+        except OSError:
+            pass
+        return data
+
+    def put(self, key: str, data: Dict[str, Any]) -> None:
+        """Store data under key.
+
+        The entry is written to a temporary file which then replaces the entry,
+        so concurrent readers and writers never see a partially written file.
+        """
+        self.directory.mkdir(parents=True, exist_ok=True)
+        path = self._path(key)
+        tmp_path = self.directory / f".{key}.{os.getpid()}.tmp"
+        try:
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(data, f)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            logger.warning(f"Unable to write extraction cache entry: {e}")
+            self._remove(tmp_path)
+
+    def prune(self) -> None:
+        """Remove least recently used entries until the cache is within max_bytes."""
+        try:
+            entries = [
+                (entry.stat(), entry) for entry in self.directory.glob("*.json")
+            ]
+        except OSError:
+            return
+        total = sum(stat.st_size for stat, _ in entries)
+        if total <= self.max_bytes:
+            return
+        for stat, entry in sorted(entries, key=lambda e: e[0].st_mtime):
+            if total <= self.max_bytes:
+                break
+            self._remove(entry)
+            total -= stat.st_size
+        logger.info(f"Pruned extraction cache to {total} bytes.")
+
+    def clear(self) -> None:
+        """Remove every entry from the cache."""
+        for entry in self.directory.glob("*.json"):
+            self._remove(entry)
+
+    @staticmethod
+    def _remove(path: Path) -> None:
+        try:
+            path.unlink()
+        except OSError:
+            pass
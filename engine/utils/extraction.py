@@ -3,6 +3,7 @@ import datetime
 import enum
 import fnmatch
 import hashlib
+import io
 import json
 import logging
 import os
@@ -15,12 +16,29 @@ from collections import OrderedDict, defaultdict
 from dataclasses import dataclass
 from itertools import groupby
 from pathlib import Path
-from typing import Any, Dict, Generator, List, NamedTuple, Tuple, Union
+from typing import (
+    IO,
+    Any,
+    Dict,
+    Generator,
+    List,
+    NamedTuple,
+    Optional,
+    Set,
+    Tuple,
+    Union,
+)
 from zipfile import BadZipFile
 
 from engine.config import Config
 from engine.domain.datamap import DatamapFile, DatamapLine, DatamapLineValueType
-from engine.domain.template import TemplateCell
+from engine.domain.template import (
+    TYPE_NAMES,
+    Cell,
+    CompactSheet,
+    CompactTemplate,
+    TemplateCell,
+)
 from engine.exceptions import (
     DatamapFileEncodingError,
     DatamapNotCSVException,
@@ -33,7 +51,13 @@ from engine.exceptions import (
     NoApplicableSheetsInTemplateFiles,
 )
 from engine.utils import ECHO_FUNC_GREEN, ECHO_FUNC_YELLOW
+from engine.utils.cache import ExtractionCache
+from engine.utils.xlsx_reader import XLSXReader
 from openpyxl import load_workbook
+from openpyxl.utils.cell import coordinate_to_tuple
+from openpyxl.utils.exceptions import CellCoordinatesException
+from openpyxl.chartsheet import Chartsheet
+from openpyxl.worksheet._read_only import ReadOnlyWorksheet
 from openpyxl.worksheet.cell_range import MultiCellRange
 from openpyxl.worksheet.worksheet import Worksheet
 
@@ -41,7 +65,6 @@ FILE_DATA = Dict[str, Union[str, Dict[str, Dict[str, str]]]]
 DAT_DATA = Dict[str, FILE_DATA]
 SHEET_DATA_IN_LST = List[Dict[str, str]]
 ALL_IMPORT_DATA = Dict[str, Dict[str, Dict[str, Dict[str, Dict[str, str]]]]]
-
 logging.basicConfig(
     level=logging.INFO,
     format="%(asctime)s: %(levelname)s - %(message)s",
@@ -170,6 +193,24 @@ class Check:
     msg: str = ""
 
 
+@dataclass
+class ExtractionFailure:
+    filename: str
+    path: str
+    error_type: str
+    msg: str = ""
+
+
+def extraction_failure(path, error: Exception) -> ExtractionFailure:
+    """Record that the template at path could not be extracted because of error."""
+    return ExtractionFailure(
+        filename=Path(path).name,
+        path=str(path),
+        error_type=type(error).__name__,
+        msg=str(error),
+    )
+
+
 def remove_failing_files(
     lst_of_checks: List[Check], template_data: ALL_IMPORT_DATA
 ) -> ALL_IMPORT_DATA:
@@ -200,12 +241,17 @@ def remove_failing_files(
     return template_data
 
 
+def datamap_sheets(datamap_data: List[Dict[str, str]]) -> Set[str]:
+    "Return the names of the sheets referred to in datamap data."
+    return set([x["sheet"] for x in datamap_data])
+
+
 def check_datamap_sheets(
     datamap_data: List[Dict[str, str]], template_data: ALL_IMPORT_DATA
 ) -> List[Check]:
     "Parse data struct for each of datamap and all template data for sheet compliance."
     checks = []
-    sheets_in_datamap: List[str] = list(set([x["sheet"] for x in datamap_data]))
+    sheets_in_datamap: List[str] = list(datamap_sheets(datamap_data))
     files_in_template_data = list(template_data.keys())
     sheets_in_template_data = {
         x: list(template_data[x]["data"].keys()) for x in files_in_template_data
@@ -470,16 +516,147 @@ def datamap_check(dm_file):
         )
 
 
-def template_reader(template_file) -> Dict[str, Dict[str, Dict[Any, Any]]]:
-    """Given a populated xlsx file, returns all data in a list of TemplateCell objects
+def datamap_targets(datamap_data: List[Dict[str, str]]) -> Dict[str, Set[str]]:
+    """Given datamap data, return the cellrefs it refers to, grouped by sheet name."""
+    targets: Dict[str, Set[str]] = defaultdict(set)
+    for line in datamap_data:
+        targets[line["sheet"]].add(line["cellref"])
+    return dict(targets)
 
-    This test uses a fully formatted template file.
-    ."""
-    logger.info(f"Starting import of {template_file}.")
-    inner_dict: Dict[str, Dict[Any, Any]] = {"data": {}}
-    f_path: Path = Path(template_file)
+
+def _cell_value_and_type(value: Any) -> Tuple[Any, DatamapLineValueType]:
+    """Return a cell value in the form stored in extracted data, with its type."""
     try:
-        workbook = load_workbook(template_file, data_only=True)
+        return value.rstrip().lstrip(), DatamapLineValueType.TEXT
+    except AttributeError:
+        if isinstance(value, (float, int)):
+            return value, DatamapLineValueType.NUMBER
+        elif isinstance(value, (datetime.date, datetime.datetime)):
+            return value.isoformat(), DatamapLineValueType.DATE
+    return str(value), DatamapLineValueType.TEXT
+
+
+def _target_coordinates(
+    sheet_title: str, cellrefs: Set[str], row_limit: int
+) -> Dict[str, Tuple[int, int]]:
+    """Return (row, column) for each valid cellref within row_limit."""
+    output = {}
+    for cellref in cellrefs:
+        try:
+            row, column = coordinate_to_tuple(cellref)
+        except (CellCoordinatesException, ValueError, TypeError):
+            logger.warning(
+                f"Cannot extract invalid cell reference {cellref} from {sheet_title}."
+            )
+            continue
+        if row <= row_limit + 1:
+            output[cellref] = (row, column)
+    return output
+
+
+def _sheet_cells(
+    sheet: Worksheet, row_limit: int, cellrefs: Optional[Set[str]] = None
+):
+    """Yield (cellref, value) for the cells of sheet that are to be extracted.
+
+    If cellrefs is given, only those cells are visited; otherwise every cell
+    in the rows within row_limit.
+    """
+    if cellrefs is None:
+        max_row = min(sheet.max_row, row_limit + 1)
+        for row in sheet.iter_rows(max_row=max_row):
+            for cell in row:
+                yield cell.coordinate, cell.value
+        return
+    for row, column in _target_coordinates(sheet.title, cellrefs, row_limit).values():
+        cell = sheet.cell(row=row, column=column)
+        yield cell.coordinate, cell.value
+
+
+def _streamed_sheet_cells(
+    sheet: ReadOnlyWorksheet, row_limit: int, cellrefs: Optional[Set[str]] = None
+):
+    """Yield (cellref, value) for the cells of a read-only sheet that are to be extracted.
+
+    Rows are parsed one at a time from the sheet xml. If cellrefs is given,
+    parsing stops after the last row containing one of them.
+    """
+    max_row = row_limit + 1
+    if cellrefs is not None:
+        coordinates = _target_coordinates(sheet.title, cellrefs, row_limit)
+        if not coordinates:
+            return
+        max_row = max(row for row, _ in coordinates.values())
+    # dimensions recorded in the file cannot be relied upon
+    sheet.reset_dimensions()
+    for row in sheet.iter_rows(max_row=max_row):
+        for cell in row:
+            if cell.value is None:
+                continue
+            if cellrefs is None or cell.coordinate in coordinates:
+                yield cell.coordinate, cell.value
+
+
+def _workbook_sheets(
+    workbook,
+    row_limit: int,
+    targets: Optional[Dict[str, Set[str]]] = None,
+    sheets: Optional[Set[str]] = None,
+):
+    """Yield (sheet name, cells) for each sheet in workbook to be extracted.
+
+    workbook is either an openpyxl Workbook or an XLSXReader; cells is an
+    iterator of (cellref, value). Sheets not in targets or sheets (where given)
+    are skipped; for the streaming and native readers that means their xml is
+    never parsed.
+    """
+    if isinstance(workbook, XLSXReader):
+        names = workbook.sheet_names
+    else:
+        names = workbook.sheetnames
+    for name in names:
+        if sheets is not None and name not in sheets:
+            continue
+        if targets is not None and name not in targets:
+            continue
+        if isinstance(workbook, XLSXReader):
+            if targets is None:
+                yield name, workbook.iter_cells(name, row_limit + 1)
+            else:
+                cellrefs = _target_coordinates(name, targets[name], row_limit)
+                yield name, workbook.iter_cells(name, row_limit + 1, set(cellrefs))
+            continue
+        sheet = workbook[name]
+        if isinstance(sheet, Chartsheet):
+            continue
+        sheet_cells = _streamed_sheet_cells if workbook.read_only else _sheet_cells
+        if targets is None:
+            yield name, sheet_cells(sheet, row_limit)
+        else:
+            yield name, sheet_cells(sheet, row_limit, targets[name])
+
+
+def _read_file(filepath: Path) -> Tuple[IO[bytes], str]:
+    """Read filepath from disk once, returning a seekable view of its bytes and their md5 checksum.
+
+    The checksum is taken over the same bytes the workbook is later parsed from,
+    so each template is only read from disk a single time.
+    """
+    with open(filepath, "rb") as f:
+        data = f.read()
+    # BytesIO shares the buffer of an immutable bytes object rather than copying it
+    return io.BytesIO(data), hashlib.md5(data).digest().hex()
+
+
+def _open_workbook(source: IO[bytes], reader: str, f_path: Path):
+    """Open source with the given template reader, logging why if it cannot be opened.
+
+    Raises RuntimeError if source is not a valid xlsx/xlsm file.
+    """
+    try:
+        if reader == "native":
+            return XLSXReader(source)
+        return load_workbook(source, read_only=reader == "streaming", data_only=True)
     except TypeError:
         msg = (
             "Unable to open {}. Potential corruption of file. Try resaving "
@@ -492,50 +669,223 @@ def template_reader(template_file) -> Dict[str, Dict[str, Dict[Any, Any]]]:
         raise
     except BadZipFile:
         logger.critical(
-            f"Cannot open {template_file} due to file not conforming to expected format. "
+            f"Cannot open {f_path} due to file not conforming to expected format. "
             f"Not continuing. Remove file from input directory and try again."
         )
         raise RuntimeError
-    checksum: str = _hash_single_file(f_path)
-    holding = []
-    for sheet in workbook.worksheets:
-        sheet_data: SHEET_DATA_IN_LST = []
-        sheet_dict: Dict[str, Dict[str, Dict[str, str]]] = {}
-        rowcnt = 0
-        for row in sheet.rows:
-            if rowcnt > int(Config.TEMPLATE_ROW_LIMIT):
-                break
-            for cell in row:
-                if cell.value is not None:
-                    try:
-                        val = cell.value.rstrip().lstrip()
-                        c_type = DatamapLineValueType.TEXT
-                    except AttributeError:
-                        if isinstance(cell.value, (float, int)):
-                            val = cell.value
-                            c_type = DatamapLineValueType.NUMBER
-                        elif isinstance(cell.value, (datetime.date, datetime.datetime)):
-                            val = cell.value.isoformat()
-                            c_type = DatamapLineValueType.DATE
-                    cellref = "{}{}".format(cell.column_letter, cell.row)
-                    if isinstance(template_file, Path):
-                        t_cell = TemplateCell(
-                            template_file.as_posix(), sheet.title, cellref, val, c_type
-                        ).to_dict()
-                    else:
-                        t_cell = TemplateCell(
-                            template_file, sheet.title, cellref, val, c_type
-                        ).to_dict()
-                    sheet_data.append(t_cell)
-            rowcnt += 1
-        sheet_dict.update({sheet.title: _extract_cellrefs(sheet_data)})
-        holding.append(sheet_dict)
-    for sd in holding:
-        inner_dict["data"].update(sd)
-        inner_dict.update({"checksum": checksum})  # type: ignore
-    shell_dict = {f_path.name: inner_dict}
+
+
+def template_reader_compact(
+    template_file,
+    targets: Optional[Dict[str, Set[str]]] = None,
+    reader: Optional[str] = None,
+    sheets: Optional[Set[str]] = None,
+    cache: Optional[ExtractionCache] = None,
+    row_limit: Optional[int] = None,
+) -> CompactTemplate:
+    """Given a populated xlsx file, returns its data as a CompactTemplate.
+
+    If targets is given (see datamap_targets()), only the cells it refers to
+    are extracted, and only from the sheets it names. If sheets is given (see
+    datamap_sheets()), any other sheet is skipped without being read.
+
+    reader is one of Config.TEMPLATE_READERS and defaults to Config.TEMPLATE_READER;
+    row_limit defaults to Config.TEMPLATE_ROW_LIMIT.
+    The "streaming" reader loads the workbook read-only and parses it a row at a
+    time; "dom" loads the whole workbook into memory first; "native" bypasses
+    openpyxl and streams values straight out of the sheet xml (see
+    engine.utils.xlsx_reader).
+
+    If cache is given (see engine.utils.cache), data already extracted from an
+    identical file with the same settings is returned from it without parsing
+    the file, and newly extracted data is stored in it.
+    """
+    logger.info(f"Starting import of {template_file}.")
+    f_path: Path = Path(template_file)
+    file_name = (
+        template_file.as_posix() if isinstance(template_file, Path) else template_file
+    )
+    reader = reader or Config.TEMPLATE_READER
+    if reader not in Config.TEMPLATE_READERS:
+        raise ValueError(
+            f"Unknown template reader {reader}. Use one of {Config.TEMPLATE_READERS}."
+        )
+    row_limit = int(row_limit or Config.TEMPLATE_ROW_LIMIT)
+    buffer, checksum = _read_file(f_path)
+    if cache is not None:
+        cache_key = cache.key(checksum, reader, row_limit, targets, sheets)
+        cached = cache.get(cache_key)
+        if cached is not None:
+            buffer.close()
+            logger.info(f"Loaded {f_path.name} from extraction cache.")
+            # the file name is that of this file, which may have been imported
+            # from somewhere else before
+            return CompactTemplate(
+                file_name,
+                checksum,
+                {sheet: CompactSheet(*cells) for sheet, cells in cached.items()},
+            )
+    compact_sheets: Dict[str, CompactSheet] = {}
+    with buffer:
+        workbook = _open_workbook(buffer, reader, f_path)
+        try:
+            for sheet_title, cells in _workbook_sheets(
+                workbook, row_limit, targets, sheets
+            ):
+                sheet_cells = []
+                for cellref, value in cells:
+                    if value is not None:
+                        val, c_type = _cell_value_and_type(value)
+                        sheet_cells.append((cellref, c_type.value, val))
+                # ordered by cellref, as _extract_cellrefs() orders cell dicts
+                sheet_cells.sort(key=lambda c: c[0])
+                compact_sheets[sheet_title] = CompactSheet(
+                    [c[0] for c in sheet_cells],
+                    [c[1] for c in sheet_cells],
+                    [c[2] for c in sheet_cells],
+                )
+        finally:
+            # releases the underlying zip file held open by a streaming reader
+            workbook.close()
+    if cache is not None:
+        cache.put(cache_key, compact_sheets)
     logger.info(f"Compiled data from {f_path.name}")
-    return shell_dict
+    return CompactTemplate(file_name, checksum, compact_sheets)
+
+
+def expand_template(template: CompactTemplate) -> Dict[str, Any]:
+    """Return the data in a CompactTemplate as a checksum and a dict of cell dicts per sheet.
+
+    This is the form each file takes in ALL_IMPORT_DATA.
+    """
+    data: Dict[str, Dict[str, Dict[str, Any]]] = {}
+    for sheet_name, sheet in template.sheets.items():
+        data[sheet_name] = {
+            cellref: {
+                "file_name": template.file_name,
+                "sheet_name": sheet_name,
+                "cellref": cellref,
+                "value": value,
+                "data_type": TYPE_NAMES[c_type],
+            }
+            for cellref, c_type, value in zip(sheet.cellrefs, sheet.types, sheet.values)
+        }
+    return {"data": data, "checksum": template.checksum}
+
+
+def template_cells(template: CompactTemplate) -> Dict[str, Any]:
+    """Return the data in a CompactTemplate as a checksum and a dict of Cells per sheet.
+
+    This is the shape expand_template() returns, with a Cell in place of each
+    cell dict.
+    """
+    file_name = template.file_name
+    data: Dict[str, Dict[str, Cell]] = {}
+    for sheet_name, sheet in template.sheets.items():
+        data[sheet_name] = {
+            cellref: Cell(file_name, sheet_name, cellref, value, c_type)
+            for cellref, c_type, value in zip(sheet.cellrefs, sheet.types, sheet.values)
+        }
+    return {"data": data, "checksum": template.checksum}
+
+
+def expand_templates(templates: Dict[str, CompactTemplate]) -> ALL_IMPORT_DATA:
+    "Return CompactTemplates, keyed by file name, as ALL_IMPORT_DATA."
+    return {name: expand_template(t) for name, t in templates.items()}  # type: ignore
+
+
+def templates_to_json(templates: Dict[str, CompactTemplate]) -> str:
+    """Return CompactTemplates, keyed by file name, as ALL_IMPORT_DATA in json.
+
+    Only one file at a time is expanded into cell dicts.
+    """
+    return (
+        "{"
+        + ", ".join(
+            f"{json.dumps(name)}: {json.dumps(expand_template(t))}"
+            for name, t in templates.items()
+        )
+        + "}"
+    )
+
+
+def template_reader(
+    template_file,
+    targets: Optional[Dict[str, Set[str]]] = None,
+    reader: Optional[str] = None,
+    sheets: Optional[Set[str]] = None,
+    cache: Optional[ExtractionCache] = None,
+    row_limit: Optional[int] = None,
+) -> Dict[str, Dict[str, Dict[Any, Any]]]:
+    """Given a populated xlsx file, returns all data in a list of TemplateCell objects
+
+    This test uses a fully formatted template file.
+
+    Takes the same arguments as template_reader_compact(), returning its result
+    expanded into a dict of TemplateCell dicts keyed by sheet and cellref.
+    ."""
+    template = template_reader_compact(
+        template_file,
+        targets=targets,
+        reader=reader,
+        sheets=sheets,
+        cache=cache,
+        row_limit=row_limit,
+    )
+    return {Path(template_file).name: expand_template(template)}
+
+
+class MasterColumns(NamedTuple):
+    """The contents of a master spreadsheet, held a column at a time.
+
+    header is the value of A1 and keys the rest of column A, as far as the
+    last row of the sheet. file_names is the rest of row 1 and columns[n] the
+    values below file_names[n], aligned with keys. Values are as openpyxl
+    reads them, so empty cells are None.
+    """
+
+    header: Any
+    keys: List[Any]
+    file_names: List[Any]
+    columns: List[List[Any]]
+
+
+def master_reader(
+    master: Union[Path, str, IO[bytes]], data_only: bool = False
+) -> MasterColumns:
+    """Read the active sheet of a master spreadsheet into a MasterColumns.
+
+    The workbook is loaded read-only and streamed a row at a time, each row
+    being split into the per-file columns as it is read, so the sheet is never
+    held in memory as cells. As with load_workbook(), formula cells are read
+    as their formulas unless data_only is True, in which case the value Excel
+    last calculated for them is read instead (None if the file was last saved
+    by openpyxl).
+    """
+    wb = load_workbook(master, read_only=True, data_only=data_only)
+    try:
+        sheet = wb.active
+        # dimensions recorded in the file cannot be relied upon
+        sheet.reset_dimensions()
+        rows = sheet.iter_rows(values_only=True)
+        first = next(rows, ())
+        header = first[0] if first else None
+        file_names = list(first[1:])
+        keys: List[Any] = []
+        columns: List[List[Any]] = [[] for _ in file_names]
+        for row in rows:
+            if len(row) > len(columns) + 1:
+                # a row wider than the header; give the extra columns a
+                # file name of None and blanks for the rows already read
+                for _ in range(len(row) - len(columns) - 1):
+                    file_names.append(None)
+                    columns.append([None] * len(keys))
+            keys.append(row[0] if row else None)
+            for col, column in enumerate(columns, start=1):
+                column.append(row[col] if col < len(row) else None)
+    finally:
+        wb.close()
+    return MasterColumns(header, keys, file_names, columns)
 
 
 def extract_zip_file_to_tmpdir(zfile,) -> Tuple[str, List[pathlib.Path]]:
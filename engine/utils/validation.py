@@ -1,7 +1,8 @@
 from dataclasses import dataclass
-from typing import Dict, List
+from typing import Dict, List, NamedTuple
 
 from engine.config import Config
+from engine.domain.template import TYPE_CODES, TYPE_NAMES, Cell
 
 
 @dataclass
@@ -20,7 +21,7 @@ class _ValidationState:
     def __init__(self, dm_line: Dict[str, str], sheet_data) -> None:
         self.validation_check = ValidationCheck(
             passes="",
-            filename=sheet_data[list(sheet_data.keys())[0]]["file_name"],
+            filename=next(iter(sheet_data.values()))["file_name"],
             key=dm_line["key"],
             value="",
             sheetname=dm_line["sheet"],
@@ -141,6 +142,9 @@ def validate_line(
     """
     Given a Datamap line and sheet data, validate input.
 
+    sheet_data maps each cellref to a cell dict (see TemplateCell.to_dict())
+    or an engine.domain.template.Cell.
+
     Returns a _ValidationState object containing a
     validation_check object containing results.
     """
@@ -158,13 +162,115 @@ def validation_checker(dm_data, tmp_data) -> List["ValidationCheck"]:
     for d in dm_data:
         sheet = d["sheet"]
         for f in files:
-            data = tmp_data[f]["data"]
-            sheets = data.keys()
-            for s in sheets:
-                if s == sheet:
-                    sdata = data[sheet]
-                    if not sdata:
-                        continue
-                    vout = validate_line(d, data[sheet])
-                    checks.append(vout.validation_check)
+            sdata = tmp_data[f]["data"].get(sheet)
+            if not sdata:
+                continue
+            vout = validate_line(d, sdata)
+            checks.append(vout.validation_check)
     return checks
+
+
+# type codes which no cell has: for a cell the datamap names that the sheet
+# lacks, for a datamap line with no acceptable type, and for an acceptable
+# type which is not a DatamapLineValueType
+_NO_CELL = 0
+_UNTYPED = -1
+_UNKNOWN_TYPE = -2
+
+
+class _SheetLines(NamedTuple):
+    """The datamap lines for one sheet, held in parallel lists.
+
+    wanted_codes holds the type code each line wants, or _UNTYPED.
+    """
+
+    positions: List[int]
+    keys: List[str]
+    cellrefs: List[str]
+    wanted: List[str]
+    wanted_codes: List[int]
+
+
+def _compile_datamap(dm_data) -> Dict[str, _SheetLines]:
+    """Group datamap lines by sheet, with what each line wants worked out once.
+
+    wanted is the type to report for each line. A cell passes where its type
+    code equals the line's wanted code.
+    """
+    acceptable = set(Config.ACCEPTABLE_VALIDATION_TYPES)
+    by_sheet: Dict[str, _SheetLines] = {}
+    for position, d in enumerate(dm_data):
+        data_type = d["data_type"]
+        lines = by_sheet.setdefault(d["sheet"], _SheetLines([], [], [], [], []))
+        lines.positions.append(position)
+        lines.keys.append(d["key"])
+        lines.cellrefs.append(d["cellref"])
+        lines.wanted.append(data_type if data_type != "" else "NA")
+        lines.wanted_codes.append(
+            TYPE_CODES.get(data_type, _UNKNOWN_TYPE)
+            if data_type in acceptable
+            else _UNTYPED
+        )
+    return by_sheet
+
+
+def _type_code(cell) -> int:
+    "Return the type code of cell, a Cell or a cell dict."
+    if isinstance(cell, Cell):
+        return cell.type_code
+    return TYPE_CODES[cell["data_type"]]
+
+
+def batch_validation_checker(dm_data, tmp_data) -> List[ValidationCheck]:
+    """Validate every file against the datamap a sheet at a time.
+
+    Returns the same ValidationChecks, in the same order, as
+    validation_checker(), which runs validate_line() for each datamap line
+    and file. Here the datamap is compiled once into a column of wanted type
+    codes for each sheet. For each file, the type codes of the cells on that
+    sheet are gathered into a column of their own, and the two columns are
+    compared to give the outcome of every line at once.
+    """
+    by_sheet = _compile_datamap(dm_data)
+    files = list(tmp_data.keys())
+    # grid[position][n] is the check of datamap line position in files[n]
+    grid: List[List] = [[None] * len(files) for _ in range(len(dm_data))]
+    for n, f in enumerate(files):
+        file_data = tmp_data[f]["data"]
+        for sheet, lines in by_sheet.items():
+            sdata = file_data.get(sheet)
+            if not sdata:
+                continue
+            filename = next(iter(sdata.values()))["file_name"]
+            cells = [sdata.get(cellref) for cellref in lines.cellrefs]
+            got_codes = [
+                _NO_CELL if cell is None else _type_code(cell) for cell in cells
+            ]
+            passes = [
+                "FAIL"
+                if got == _NO_CELL
+                else "UNTYPED"
+                if wanted == _UNTYPED
+                else "PASS"
+                if wanted == got
+                else "FAIL"
+                for wanted, got in zip(lines.wanted_codes, got_codes)
+            ]
+            for i, cell in enumerate(cells):
+                if cell is None:
+                    value = "NO VALUE RETURNED"
+                else:
+                    value = cell["value"]
+                    if value == "":
+                        value = "NO VALUE RETURNED"
+                grid[lines.positions[i]][n] = ValidationCheck(
+                    passes=passes[i],
+                    filename=filename,
+                    key=lines.keys[i],
+                    value=value,
+                    cellref=lines.cellrefs[i],
+                    sheetname=sheet,
+                    wanted=lines.wanted[i],
+                    got=TYPE_NAMES.get(got_codes[i], "EMPTY"),
+                )
+    return [check for row in grid for check in row if check is not None]
@@ -0,0 +1,331 @@
+"""
+A minimal xlsx/xlsm reader for extracting cell values.
+
+It reads the workbook package directly - resolving sheet names from
+workbook.xml, shared strings and date number formats from their own parts -
+and streams each sheet's xml with iterparse, so memory use stays flat no matter
+how large the sheet is. Only cell values are read: styles, formulae,
+data validations and the like are ignored, which is all template_reader needs.
+"""
+import datetime
+import posixpath
+import re
+import zipfile
+from typing import IO, Any, Dict, Iterator, List, Optional, Set, Tuple, Union
+from xml.etree.ElementTree import ParseError, iterparse
+
+SHEET_NAMESPACES = (
+    "http://schemas.openxmlformats.org/spreadsheetml/2006/main",
+    "http://purl.oclc.org/ooxml/spreadsheetml/main",
+)
+ROW_TAGS = {f"{{{ns}}}row" for ns in SHEET_NAMESPACES}
+SHEET_DATA_TAGS = {f"{{{ns}}}sheetData" for ns in SHEET_NAMESPACES}
+VALUE_TAGS = {f"{{{ns}}}v" for ns in SHEET_NAMESPACES}
+INLINE_STRING_TAGS = {f"{{{ns}}}is" for ns in SHEET_NAMESPACES}
+REL_NS = "http://schemas.openxmlformats.org/officeDocument/2006/relationships"
+WORKSHEET_REL_TYPES = (
+    REL_NS + "/worksheet",
+    "http://purl.oclc.org/ooxml/officeDocument/relationships/worksheet",
+)
+
+WINDOWS_EPOCH = datetime.datetime(1899, 12, 30)
+MAC_EPOCH = datetime.datetime(1904, 1, 1)
+SECS_PER_DAY = 86400
+
+# ids of the built-in number formats (see ECMA-376 18.8.30) that are dates
+BUILTIN_DATE_FORMATS = {14, 15, 16, 17, 18, 19, 20, 21, 22, 45, 46, 47}
+BUILTIN_TIMEDELTA_FORMATS = {46}
+
+# anything in quotes, or in square brackets other than elapsed time markers
+STRIP_RE = re.compile(r'".*?"|\[(?!hh?\]|mm?\]|ss?\])[^\]]*\]')
+DATE_RE = re.compile(r"(?<![_\\])[dmhysDMHYS]")
+TIMEDELTA_RE = re.compile(
+    r"\[hh?\](:mm(:ss(\.0*)?)?)?|\[mm?\](:ss(\.0*)?)?|\[ss?\](\.0*)?", re.I
+)
+
+CellValue = Union[
+    str, int, float, bool, datetime.datetime, datetime.time, datetime.timedelta
+]
+
+
+def _local(tag: str) -> str:
+    "Strip the namespace from an element tag."
+    return tag[tag.rfind("}") + 1 :]
+
+
+def _is_date_format(fmt: str) -> bool:
+    fmt = STRIP_RE.sub("", fmt.split(";")[0])
+    return DATE_RE.search(fmt) is not None
+
+
+def _is_timedelta_format(fmt: str) -> bool:
+    return TIMEDELTA_RE.search(fmt.split(";")[0]) is not None
+
+
+def _column_letter(idx: int) -> str:
+    "Convert a 1-based column index to its letter(s)."
+    letters = ""
+    while idx:
+        idx, rem = divmod(idx - 1, 26)
+        letters = chr(65 + rem) + letters
+    return letters
+
+
+def _cellref_row(cellref: str) -> int:
+    return int(cellref.lstrip("ABCDEFGHIJKLMNOPQRSTUVWXYZ$").replace("$", ""))
+
+
+def _cellref_column(cellref: str) -> int:
+    idx = 0
+    for char in cellref:
+        if char == "$":
+            continue
+        if not char.isalpha():
+            break
+        idx = idx * 26 + ord(char.upper()) - 64
+    return idx
+
+
+def _cast_number(value: str) -> Union[int, float]:
+    if "." in value or "E" in value or "e" in value:
+        return float(value)
+    return int(value)
+
+
+def _from_excel(
+    value: Union[int, float], epoch: datetime.datetime, timedelta: bool = False
+) -> Union[datetime.datetime, datetime.time, datetime.timedelta]:
+    "Convert an Excel serial date to a datetime, time or timedelta."
+    if timedelta:
+        td = datetime.timedelta(days=value)
+        if td.microseconds:
+            td = datetime.timedelta(
+                seconds=td.total_seconds() // 1, microseconds=round(td.microseconds, -3)
+            )
+        return td
+    day, fraction = divmod(value, 1)
+    diff = datetime.timedelta(milliseconds=round(fraction * SECS_PER_DAY * 1000))
+    if 0 <= value < 1 and diff.days == 0:
+        hours, rem = divmod(diff.seconds, 3600)
+        minutes, seconds = divmod(rem, 60)
+        return datetime.time(hours, minutes, seconds, diff.microseconds)
+    if 0 < value < 60 and epoch == WINDOWS_EPOCH:
+        # Excel believes 1900 was a leap year
+        day += 1
+    return epoch + datetime.timedelta(days=day) + diff
+
+
+def _text_content(element) -> str:
+    """Return the text of a shared or inline string, ignoring phonetic runs."""
+    snippets = []
+    for child in element:
+        tag = _local(child.tag)
+        if tag == "t":
+            snippets.append(child.text or "")
+        elif tag == "r":
+            for run_child in child:
+                if _local(run_child.tag) == "t":
+                    snippets.append(run_child.text or "")
+    return "".join(snippets)
+
+
+class XLSXReader:
+    """Reads cell values from an xlsx or xlsm file without loading it into memory.
+
+    source can be a path or a binary file-like object. Raises zipfile.BadZipFile
+    if the file is not a zip archive or does not contain a workbook.
+    """
+
+    def __init__(self, source: Union[str, IO[bytes]]) -> None:
+        self._archive = zipfile.ZipFile(source)
+        self._part_names = set(self._archive.namelist())
+        self._shared_strings: Optional[List[str]] = None
+        self._date_styles: Optional[Tuple[Set[int], Set[int]]] = None
+        try:
+            self._workbook_part = self._office_document()
+            self._workbook_rels = self._relationships(self._workbook_part)
+            self._sheet_parts, self.epoch = self._read_workbook()
+        except (KeyError, ParseError) as e:
+            self.close()
+            raise zipfile.BadZipFile(f"Not a valid Excel workbook: {e}")
+
+    def __enter__(self) -> "XLSXReader":
+        return self
+
+    def __exit__(self, mytype, value, traceback) -> None:  # type: ignore
+        self.close()
+
+    def close(self) -> None:
+        self._archive.close()
+
+    @property
+    def sheet_names(self) -> List[str]:
+        "Names of the worksheets in workbook order (chartsheets are excluded)."
+        return list(self._sheet_parts)
+
+    def _office_document(self) -> str:
+        for rel in self._relationships("").values():
+            if rel[1].endswith("/officeDocument"):
+                return rel[0]
+        return "xl/workbook.xml"
+
+    def _relationships(self, part: str) -> Dict[str, Tuple[str, str]]:
+        """Return {Id: (resolved target part, Type)} for the relationships of part."""
+        folder, name = posixpath.split(part)
+        rels_part = posixpath.join(folder, "_rels", f"{name}.rels")
+        output: Dict[str, Tuple[str, str]] = {}
+        if rels_part not in self._part_names:
+            return output
+        with self._archive.open(rels_part) as src:
+            for _, elem in iterparse(src):
+                if _local(elem.tag) == "Relationship":
+                    target = elem.get("Target", "")
+                    if target.startswith("/"):
+                        target = target[1:]
+                    else:
+                        target = posixpath.normpath(posixpath.join(folder, target))
+                    output[elem.get("Id", "")] = (target, elem.get("Type", ""))
+        return output
+
+    def _read_workbook(self) -> Tuple[Dict[str, str], datetime.datetime]:
+        sheet_parts: Dict[str, str] = {}
+        epoch = WINDOWS_EPOCH
+        with self._archive.open(self._workbook_part) as src:
+            for _, elem in iterparse(src):
+                tag = _local(elem.tag)
+                if tag == "workbookPr":
+                    if elem.get("date1904") in ("1", "true"):
+                        epoch = MAC_EPOCH
+                elif tag == "sheet":
+                    # r:id, whichever relationships namespace the file uses
+                    rel_id = next(
+                        (v for k, v in elem.attrib.items() if k.endswith("}id")), ""
+                    )
+                    rel = self._workbook_rels.get(rel_id)
+                    if rel is not None and rel[1] in WORKSHEET_REL_TYPES:
+                        sheet_parts[elem.get("name", "")] = rel[0]
+        return sheet_parts, epoch
+
+    def _part_of_type(self, rel_type: str) -> Optional[str]:
+        for target, typ in self._workbook_rels.values():
+            if typ.endswith(rel_type) and target in self._part_names:
+                return target
+        return None
+
+    def _read_shared_strings(self) -> List[str]:
+        strings: List[str] = []
+        part = self._part_of_type("/sharedStrings")
+        if part is None:
+            return strings
+        with self._archive.open(part) as src:
+            for _, elem in iterparse(src):
+                if _local(elem.tag) == "si":
+                    strings.append(_text_content(elem).replace("x005F_", ""))
+                    elem.clear()
+        return strings
+
+    def _read_date_styles(self) -> Tuple[Set[int], Set[int]]:
+        """Return the indexes of cell styles formatted as dates, and as timedeltas."""
+        custom: Dict[int, str] = {}
+        format_ids: List[int] = []
+        part = self._part_of_type("/styles")
+        if part is not None:
+            with self._archive.open(part) as src:
+                in_cell_xfs = False
+                for event, elem in iterparse(src, events=("start", "end")):
+                    tag = _local(elem.tag)
+                    if tag == "cellXfs":
+                        in_cell_xfs = event == "start"
+                    elif event == "end" and tag == "numFmt":
+                        custom[int(elem.get("numFmtId"))] = elem.get("formatCode", "")
+                    elif event == "end" and tag == "xf" and in_cell_xfs:
+                        format_ids.append(int(elem.get("numFmtId", 0)))
+        date_styles = set()
+        timedelta_styles = set()
+        for idx, fmt_id in enumerate(format_ids):
+            if fmt_id in custom:
+                if _is_date_format(custom[fmt_id]):
+                    date_styles.add(idx)
+                if _is_timedelta_format(custom[fmt_id]):
+                    timedelta_styles.add(idx)
+            else:
+                if fmt_id in BUILTIN_DATE_FORMATS:
+                    date_styles.add(idx)
+                if fmt_id in BUILTIN_TIMEDELTA_FORMATS:
+                    timedelta_styles.add(idx)
+        return date_styles, timedelta_styles
+
+    def _cell_value(self, elem, date_styles, timedelta_styles) -> Optional[CellValue]:
+        data_type = elem.get("t", "n")
+        text: Optional[str] = None
+        for child in elem:
+            if child.tag in VALUE_TAGS and data_type != "inlineStr":
+                text = child.text or None
+            elif child.tag in INLINE_STRING_TAGS and data_type == "inlineStr":
+                return _text_content(child)
+        if text is None:
+            return None
+        if data_type == "n":
+            number = _cast_number(text)
+            style_id = int(elem.get("s", 0) or 0)
+            if style_id in date_styles:
+                try:
+                    return _from_excel(
+                        number, self.epoch, timedelta=style_id in timedelta_styles
+                    )
+                except (OverflowError, ValueError):
+                    return "#VALUE!"
+            return number
+        if data_type == "s":
+            return self._shared_strings[int(text)]  # type: ignore
+        if data_type == "b":
+            return bool(int(text))
+        if data_type == "d":
+            return datetime.datetime.fromisoformat(text.rstrip("Z"))
+        # "str" and "e" cells hold their value as text
+        return text
+
+    def iter_cells(
+        self, sheet_name: str, max_row: int, cellrefs: Optional[Set[str]] = None
+    ) -> Iterator[Tuple[str, CellValue]]:
+        """Yield (cellref, value) for each cell with a value in sheet_name.
+
+        Rows after max_row are not parsed. If cellrefs is given, only those
+        cells are returned and parsing stops after the last row they are in.
+        """
+        if self._shared_strings is None:
+            self._shared_strings = self._read_shared_strings()
+        if self._date_styles is None:
+            self._date_styles = self._read_date_styles()
+        date_styles, timedelta_styles = self._date_styles
+        if cellrefs is not None:
+            if not cellrefs:
+                return
+            max_row = min(max_row, max(_cellref_row(c) for c in cellrefs))
+        row_counter = 0
+        with self._archive.open(self._sheet_parts[sheet_name]) as src:
+            for _, elem in iterparse(src):
+                if elem.tag in SHEET_DATA_TAGS:
+                    break
+                if elem.tag not in ROW_TAGS:
+                    continue
+                row_attr = elem.get("r")
+                row_counter = int(float(row_attr)) if row_attr else row_counter + 1
+                if row_counter > max_row:
+                    break
+                previous = None
+                for cell in elem:
+                    cellref = cell.get("r")
+                    if not cellref:
+                        column = _cellref_column(previous) + 1 if previous else 1
+                        cellref = f"{_column_letter(column)}{row_counter}"
+                    previous = cellref
+                    # cells that only carry a style have no children
+                    if not len(cell):
+                        continue
+                    if cellrefs is not None and cellref not in cellrefs:
+                        continue
+                    value = self._cell_value(cell, date_styles, timedelta_styles)
+                    if value is not None:
+                        yield cellref, value
+                elem.clear()
@@ -0,0 +1,195 @@
+"""
+Rough timings for the slow paths of the engine, run against the test fixtures.
+
+    python scripts/benchmark.py readers [--repeat N]
+    python scripts/benchmark.py master [--files N] [--keys N]
+    python scripts/benchmark.py save [--files N] [--keys N]
+    python scripts/benchmark.py writeback [--files N]
+
+Run from the root of the repository.
+"""
+import argparse
+import logging
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from engine.config import Config  # noqa: E402
+from engine.domain.datamap import DatamapLineValueType  # noqa: E402
+from engine.domain.master import Master  # noqa: E402
+from engine.repository.master import MasterOutputRepository  # noqa: E402
+from engine.repository.templates import MultipleTemplatesWriteRepo  # noqa: E402
+from engine.repository.xml_templates import XMLTemplatesWriteRepo  # noqa: E402
+from engine.use_cases.typing import ColData  # noqa: E402
+from engine.domain.template import Cell  # noqa: E402
+from engine.use_cases.parsing import ApplyDatamapToExtractionUseCase  # noqa: E402
+from engine.utils.extraction import template_reader  # noqa: E402
+from openpyxl import load_workbook  # noqa: E402
+from openpyxl.cell.cell import MergedCell  # noqa: E402
+
+RESOURCES = Path(__file__).resolve().parents[1] / "tests" / "resources"
+
+
+def _best_of(repeat, func, *args, **kwargs):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func(*args, **kwargs)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def bench_readers(args):
+    """Time each template reader backend over every template in the fixtures."""
+    files = sorted(RESOURCES.glob("*.xls[xm]")) + sorted(
+        (RESOURCES / "org_templates").glob("dft1_tmp.xlsm")
+    )
+    totals = {reader: 0.0 for reader in Config.TEMPLATE_READERS}
+    print(f"{'file':<58}" + "".join(f"{r:>11}" for r in Config.TEMPLATE_READERS))
+    for f in files:
+        row = f"{f.name:<58}"
+        for reader in Config.TEMPLATE_READERS:
+            t = _best_of(args.repeat, template_reader, f, reader=reader)
+            totals[reader] += t
+            row += f"{t:>11.4f}"
+        print(row)
+    print(f"{'TOTAL':<58}" + "".join(f"{totals[r]:>11.4f}" for r in totals))
+
+
+def _synthetic_master_input(files, keys, sheets=10):
+    """Return a datamap of keys lines and extracted data for files templates.
+
+    Every template holds the same Cells, which keeps memory down without
+    changing the work done to look them up.
+    """
+    datamap = [
+        {
+            "key": f"Key {i}",
+            "sheet": f"Sheet {i % sheets}",
+            "cellref": f"B{i // sheets + 1}",
+            "data_type": "NUMBER",
+            "filename": "datamap.csv",
+        }
+        for i in range(keys)
+    ]
+    data = {f"Sheet {s}": {} for s in range(sheets)}
+    for i, dml in enumerate(datamap):
+        data[dml["sheet"]][dml["cellref"]] = Cell(
+            "template.xlsm",
+            dml["sheet"],
+            dml["cellref"],
+            float(i),
+            DatamapLineValueType.NUMBER.value,
+        )
+    template_data = {
+        f"template_{n}.xlsm": {"checksum": "", "data": data} for n in range(files)
+    }
+    return datamap, template_data
+
+
+def bench_master(args):
+    """Time assembling a master from extracted data (files x keys)."""
+    datamap, template_data = _synthetic_master_input(args.files, args.keys)
+    uc = ApplyDatamapToExtractionUseCase(None, None)
+    uc._datamap_data_dict = datamap
+    uc._template_data_dict = template_data
+    t = _best_of(args.repeat, uc._format_data_for_master)
+    print(f"{args.files} files x {args.keys} keys: {t:.3f}s")
+
+
+def bench_save(args):
+    """Time writing a master (files x keys) with each writer and compression level."""
+    master = Master(
+        [f"Key {i}" for i in range(args.keys)],
+        [f"template_{n}.xlsm" for n in range(args.files)],
+    )
+    for col in range(args.files):
+        master.values[col] = [
+            float(i) if i % 2 else f"Value {i}" for i in range(args.keys)
+        ]
+    with tempfile.TemporaryDirectory() as tmpdir:
+        Config.PLATFORM_DOCS_DIR = Path(tmpdir)
+        (Path(tmpdir) / "output").mkdir()
+        Config.config_parser.read_string(Config.base_config)
+        for writer in Config.MASTER_WRITERS:
+            for level in (None, 1):
+                Config.MASTER_WRITER = writer
+                Config.MASTER_COMPRESSION_LEVEL = level
+                t = _best_of(
+                    args.repeat, MasterOutputRepository(master, "master.xlsx").save
+                )
+                size = (Path(tmpdir) / "output" / "master.xlsx").stat().st_size
+                print(
+                    f"{writer:<10} compression={str(level):<5} {t:>8.3f}s {size:>12} bytes"
+                )
+
+
+def _synthetic_write_back_data(blank_template, files, per_sheet=50):
+    """Return ColData for files output files, writing to per_sheet cells of each sheet."""
+    wb = load_workbook(blank_template)
+    targets = []
+    for ws in wb.worksheets:
+        cells = (
+            c
+            for row in ws.iter_rows(min_row=5, max_row=400, max_col=8)
+            for c in row
+            if not isinstance(c, MergedCell)
+        )
+        targets.extend(
+            (ws.title, c.coordinate) for _, c in zip(range(per_sheet), cells)
+        )
+    return [
+        [
+            ColData(f"Key {i}", sheet, cellref, f"Value {n} {i}", f"output_{n}")
+            for i, (sheet, cellref) in enumerate(targets)
+        ]
+        for n in range(files)
+    ]
+
+
+def bench_writeback(args):
+    """Time writing master columns to templates with each approach."""
+    blank = RESOURCES / "blank_template_password_removed.xlsm"
+    data = _synthetic_write_back_data(blank, args.files)
+    with tempfile.TemporaryDirectory() as tmpdir:
+        Config.PLATFORM_DOCS_DIR = Path(tmpdir)
+        (Path(tmpdir) / "output").mkdir()
+        repo = MultipleTemplatesWriteRepo(blank)
+        print(f"{args.files} files, {len(data[0])} cells each, from {blank.name}")
+        Config.EXPORT_SERIAL_THRESHOLD = len(data)
+        print(f"{'serial':<20} {_best_of(args.repeat, repo.write, data):>8.3f}s")
+        Config.EXPORT_SERIAL_THRESHOLD = 0
+        print(f"{'process pool':<20} {_best_of(args.repeat, repo.write, data):>8.3f}s")
+        Config.EXPORT_SERIAL_THRESHOLD = len(data)
+        xml_repo = XMLTemplatesWriteRepo(blank)
+        print(f"{'xml patch':<20} {_best_of(args.repeat, xml_repo.write, data):>8.3f}s")
+
+
+def main():
+    logging.disable(logging.CRITICAL)
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--repeat", type=int, default=3)
+    sub = parser.add_subparsers(dest="benchmark", required=True)
+    sub.add_parser("readers", help=bench_readers.__doc__).set_defaults(
+        func=bench_readers
+    )
+    master = sub.add_parser("master", help=bench_master.__doc__)
+    master.add_argument("--files", type=int, default=1000)
+    master.add_argument("--keys", type=int, default=5000)
+    master.set_defaults(func=bench_master)
+    save = sub.add_parser("save", help=bench_save.__doc__)
+    save.add_argument("--files", type=int, default=100)
+    save.add_argument("--keys", type=int, default=2000)
+    save.set_defaults(func=bench_save)
+    writeback = sub.add_parser("writeback", help=bench_writeback.__doc__)
+    writeback.add_argument("--files", type=int, default=10)
+    writeback.set_defaults(func=bench_writeback)
+    args = parser.parse_args()
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
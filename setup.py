@@ -20,6 +20,7 @@ setuptools.setup(
         "appdirs>=1.4.4",
         "wheel>=0.41.2"
     ],
+    extras_require={"numpy": ["numpy>=1.21"]},
     classifiers=[
         "Programming Language :: Python :: 3",
         "Environment :: Console",
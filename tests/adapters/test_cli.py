@@ -1,8 +1,17 @@
+import shutil
+
 import pytest
 
 from engine.adapters.cli import import_and_create_master, write_master_to_templates
 from engine.config import Config
 
+ECHO_FUNCS = (
+    "click_echo_green",
+    "click_echo_red",
+    "click_echo_yellow",
+    "click_echo_white",
+)
+
 
 @pytest.mark.skip("Do not run this in the suite - it does not use test config")
 def test_create_master_in_memory():
@@ -14,3 +23,22 @@ def test_create_master_in_memory():
 def test_populate_blanks_from_master(mock_config, blank_template, datamap, master):
     Config.initialise()
     write_master_to_templates(blank_template, datamap, master)
+
+
+def test_skipped_files_are_reported(
+    mock_config, monkeypatch, tmp_path, template, datamap_match_test_template
+):
+    mock_config.initialise()
+    monkeypatch.setattr(Config, "IMPORT_FAILURE_POLICY", "fail")
+    shutil.copy(template, tmp_path)
+    shutil.copy(datamap_match_test_template, tmp_path / "datamap.csv")
+    (tmp_path / "corrupt.xlsx").write_bytes(b"not a zip file")
+    echoed = {name: [] for name in ECHO_FUNCS}
+    echo_funcs = {name: echoed[name].append for name in ECHO_FUNCS}
+    import_and_create_master(
+        echo_funcs, datamap="datamap.csv", inputdir=tmp_path, onfailure="skip"
+    )
+    assert len(echoed["click_echo_red"]) == 1
+    assert echoed["click_echo_red"][0].startswith(
+        "corrupt.xlsx could not be imported"
+    )
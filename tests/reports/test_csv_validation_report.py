@@ -11,6 +11,11 @@ from engine.use_cases.parsing import (
     CreateMasterUseCase,
     CreateMasterUseCaseWithValidation,
 )
+from engine.utils.extraction import (
+    expand_template,
+    template_cells,
+    template_reader_compact,
+)
 from engine.utils.validation import (
     ValidationCheck,
     _Typed,
@@ -20,6 +25,7 @@ from engine.utils.validation import (
     _ValidationState,
     _ValueGiven,
     _ValueWanted,
+    batch_validation_checker,
     validate_line,
     validation_checker,
 )
@@ -78,6 +84,85 @@ def test_compare_datamap_data_with_template_data():
     assert checks[1].passes == "FAIL"
 
 
+def test_validation_checker_with_cells(datamap_match_test_template, template):
+    dm_repo = InMemorySingleDatamapRepository(datamap_match_test_template)
+    dm_data = [x.to_dict() for x in dm_repo.list_as_objs()]
+    compact = template_reader_compact(template)
+    with_dicts = validation_checker(dm_data, {"t.xlsx": expand_template(compact)})
+    with_cells = validation_checker(dm_data, {"t.xlsx": template_cells(compact)})
+    assert with_dicts
+    assert with_cells == with_dicts
+
+
+def test_batch_validation_checker_matches_validation_checker(
+    datamap_match_test_template, template
+):
+    dm_repo = InMemorySingleDatamapRepository(datamap_match_test_template)
+    dm_data = [x.to_dict() for x in dm_repo.list_as_objs()]
+    compact = template_reader_compact(template)
+    for tmp_data in (
+        {"t.xlsx": expand_template(compact), "u.xlsx": template_cells(compact)},
+        {"t.xlsx": template_cells(compact)},
+    ):
+        checks = batch_validation_checker(dm_data, tmp_data)
+        assert checks
+        assert checks == validation_checker(dm_data, tmp_data)
+
+
+def test_batch_validation_checker_outcomes():
+    def _line(key, sheet, cellref, data_type):
+        return {"key": key, "sheet": sheet, "cellref": cellref, "data_type": data_type}
+
+    def _cell(file_name, value, data_type):
+        return {"file_name": file_name, "value": value, "data_type": data_type}
+
+    dm_data = [
+        _line("Pass", "Summary", "A1", "TEXT"),
+        _line("Fail", "Summary", "A2", "DATE"),
+        _line("No type", "Summary", "A3", ""),
+        _line("Bad type", "Summary", "A4", "BOBBINS"),
+        _line("Missing cell", "Summary", "A5", "NUMBER"),
+        _line("Missing untyped cell", "Summary", "A6", ""),
+        _line("Empty value", "Summary", "A7", "TEXT"),
+        _line("Other sheet", "Finance", "B1", "NUMBER"),
+    ]
+    tmp_data = {
+        "a.xlsx": {
+            "data": {
+                "Summary": {
+                    "A1": _cell("a.xlsx", "Text", "TEXT"),
+                    "A2": _cell("a.xlsx", 2, "NUMBER"),
+                    "A3": _cell("a.xlsx", 3, "NUMBER"),
+                    "A4": _cell("a.xlsx", "", "TEXT"),
+                    "A7": _cell("a.xlsx", "", "TEXT"),
+                },
+                "Finance": {"B1": _cell("a.xlsx", 1.5, "NUMBER")},
+            }
+        },
+        "b.xlsx": {"data": {"Summary": {"A1": _cell("b.xlsx", 10, "NUMBER")}}},
+    }
+    checks = batch_validation_checker(dm_data, tmp_data)
+    assert checks == validation_checker(dm_data, tmp_data)
+    assert [(c.filename, c.key, c.passes, c.wanted, c.got) for c in checks] == [
+        ("a.xlsx", "Pass", "PASS", "TEXT", "TEXT"),
+        ("b.xlsx", "Pass", "FAIL", "TEXT", "NUMBER"),
+        ("a.xlsx", "Fail", "FAIL", "DATE", "NUMBER"),
+        ("b.xlsx", "Fail", "FAIL", "DATE", "EMPTY"),
+        ("a.xlsx", "No type", "UNTYPED", "NA", "NUMBER"),
+        ("b.xlsx", "No type", "FAIL", "NA", "EMPTY"),
+        ("a.xlsx", "Bad type", "UNTYPED", "BOBBINS", "TEXT"),
+        ("b.xlsx", "Bad type", "FAIL", "BOBBINS", "EMPTY"),
+        ("a.xlsx", "Missing cell", "FAIL", "NUMBER", "EMPTY"),
+        ("b.xlsx", "Missing cell", "FAIL", "NUMBER", "EMPTY"),
+        ("a.xlsx", "Missing untyped cell", "FAIL", "NA", "EMPTY"),
+        ("b.xlsx", "Missing untyped cell", "FAIL", "NA", "EMPTY"),
+        ("a.xlsx", "Empty value", "PASS", "TEXT", "TEXT"),
+        ("b.xlsx", "Empty value", "FAIL", "TEXT", "EMPTY"),
+        ("a.xlsx", "Other sheet", "PASS", "NUMBER", "NUMBER"),
+    ]
+    assert checks[12].value == "NO VALUE RETURNED"
+
+
 def test_create_master_spreadsheet_with_validation(
     mock_config, datamap_match_test_template, template
 ):
@@ -0,0 +1,44 @@
+from pathlib import Path
+
+import pytest
+from openpyxl import load_workbook
+
+from engine.config import Config
+from engine.domain.master import Master
+from engine.repository.master import MasterOutputRepository
+
+
+@pytest.fixture
+def master():
+    m = Master(keys=["Key 1", "Key 2", "Key 3"], file_names=["a.xlsx", "b.xlsm"])
+    m.values[0] = ["text", 1.5, ""]
+    m.values[1] = ["more text", 2, "2019-10-20T00:00:00"]
+    return m
+
+
+def _read_master(config):
+    wb = load_workbook(Path(config.PLATFORM_DOCS_DIR) / "output" / "master.xlsx")
+    return [list(row) for row in wb["Master"].iter_rows(values_only=True)]
+
+
+@pytest.mark.parametrize("compression_level", [None, 1, 9])
+def test_master_writers_write_the_same_master(
+    mock_config, monkeypatch, master, compression_level
+):
+    mock_config.initialise()
+    monkeypatch.setattr(Config, "MASTER_COMPRESSION_LEVEL", compression_level)
+    written = {}
+    for writer in Config.MASTER_WRITERS:
+        monkeypatch.setattr(Config, "MASTER_WRITER", writer)
+        MasterOutputRepository(master, "master.xlsx").save()
+        written[writer] = _read_master(mock_config)
+    assert written["streaming"] == written["standard"]
+    assert written["streaming"][0] == ["file name", "a", "b"]
+    assert written["streaming"][2] == ["Key 2", 1.5, 2]
+
+
+def test_master_writer_rejects_unknown_writer(mock_config, monkeypatch, master):
+    mock_config.initialise()
+    monkeypatch.setattr(Config, "MASTER_WRITER", "bobbins")
+    with pytest.raises(ValueError):
+        MasterOutputRepository(master, "master.xlsx").save()
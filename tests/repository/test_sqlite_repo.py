@@ -0,0 +1,280 @@
+import datetime
+import shutil
+import sqlite3
+from concurrent import futures
+from pathlib import Path
+
+import pytest
+
+from engine.config import Config
+from engine.domain.datamap import DatamapLineValueType
+from engine.domain.master import Master
+from engine.repository.datamap import InMemorySingleDatamapRepository
+from engine.repository.master import MasterOutputRepository
+from engine.repository.sqlite import (
+    SQLiteOutputRepository,
+    SQLiteQueryRepository,
+    connect,
+    convert_masters_to_sqlite,
+    insert_file,
+)
+from engine.repository.templates import InMemoryPopulatedTemplatesRepository
+from engine.use_cases.parsing import CreateMasterUseCase
+
+
+@pytest.fixture
+def master():
+    m = Master(
+        keys=["Key 1", "Key 2"],
+        file_names=["a.xlsx", "b.xlsm"],
+        sheets=["Summary", "Finances"],
+        cellrefs=["B2", "C3"],
+        checksums=["aaa", "bbb"],
+    )
+    m.values = [["text", 1.5], ["more text", ""]]
+    m.type_codes = [
+        [DatamapLineValueType.TEXT.value, DatamapLineValueType.NUMBER.value],
+        [DatamapLineValueType.TEXT.value, 0],
+    ]
+    return m
+
+
+def _db_rows(config, query):
+    conn = sqlite3.connect(str(Path(config.PLATFORM_DOCS_DIR) / "output" / "master.db"))
+    try:
+        return conn.execute(query).fetchall()
+    finally:
+        conn.close()
+
+
+def test_sqlite_output_repository(mock_config, master):
+    mock_config.initialise()
+    SQLiteOutputRepository(master, "master.xlsx").save()
+    assert _db_rows(
+        mock_config,
+        "SELECT f.file_name, v.key, v.sheet, v.cellref, v.value, v.type "
+        "FROM cell_values v JOIN files f ON f.id = v.file_id ORDER BY f.file_name, v.key",
+    ) == [
+        ("a", "Key 1", "Summary", "B2", "text", "TEXT"),
+        ("a", "Key 2", "Finances", "C3", 1.5, "NUMBER"),
+        ("b", "Key 1", "Summary", "B2", "more text", "TEXT"),
+    ]
+    assert _db_rows(mock_config, "PRAGMA journal_mode") == [("wal",)]
+
+
+def test_sqlite_output_repository_replaces_reimported_file(mock_config, master):
+    mock_config.initialise()
+    SQLiteOutputRepository(master, "master.xlsx").save()
+    SQLiteOutputRepository(master, "master.xlsx").save()
+    assert _db_rows(mock_config, "SELECT COUNT(*) FROM files") == [(2,)]
+    assert _db_rows(mock_config, "SELECT COUNT(*) FROM cell_values") == [(3,)]
+
+
+def test_sqlite_output_repository_replaces_changed_file(mock_config, master):
+    mock_config.initialise()
+    SQLiteOutputRepository(master, "master.xlsx").save()
+    master.checksums = ["ccc", "bbb"]
+    master.values[0] = ["changed", 2.5]
+    SQLiteOutputRepository(master, "master.xlsx").save()
+    assert _db_rows(
+        mock_config, "SELECT file_name, checksum FROM files ORDER BY file_name"
+    ) == [("a", "ccc"), ("b", "bbb")]
+    assert _db_rows(
+        mock_config,
+        "SELECT f.file_name, v.key, v.value FROM cell_values v "
+        "JOIN files f ON f.id = v.file_id ORDER BY f.file_name, v.key",
+    ) == [
+        ("a", "Key 1", "changed"),
+        ("a", "Key 2", 2.5),
+        ("b", "Key 1", "more text"),
+    ]
+
+
+def test_create_master_use_case_into_sqlite(
+    mock_config, monkeypatch, datamap_match_test_template, template
+):
+    mock_config.initialise()
+    monkeypatch.setattr(Config, "SQLITE_BATCH_SIZE", 1)
+    shutil.copy2(template, (Path(mock_config.PLATFORM_DOCS_DIR) / "input"))
+    tmpl_repo = InMemoryPopulatedTemplatesRepository(
+        mock_config.PLATFORM_DOCS_DIR / "input"
+    )
+    dm_repo = InMemorySingleDatamapRepository(datamap_match_test_template)
+    uc = CreateMasterUseCase(dm_repo, tmpl_repo, SQLiteOutputRepository)
+    uc.execute("master.xlsx")
+    assert _db_rows(
+        mock_config, "SELECT value, type FROM cell_values WHERE key = 'Big Float'"
+    ) == [(7.2, "NUMBER")]
+
+
+def test_convert_masters_to_sqlite(mock_config, master, tmp_path, caplog):
+    mock_config.initialise()
+    master.values = [["text", 1.5], ["more text", datetime.date(2020, 1, 1)]]
+    MasterOutputRepository(master, "master.xlsx").save()
+    master_file = Path(mock_config.PLATFORM_DOCS_DIR) / "output" / "master.xlsx"
+    db = tmp_path / "masters.db"
+    assert convert_masters_to_sqlite([master_file], db) == [master_file]
+    conn = sqlite3.connect(str(db))
+    try:
+        assert conn.execute(
+            "SELECT f.file_name, v.key, v.sheet, v.value, v.type "
+            "FROM cell_values v JOIN files f ON f.id = v.file_id "
+            "ORDER BY f.file_name, v.key"
+        ).fetchall() == [
+            ("a", "Key 1", None, "text", "TEXT"),
+            ("a", "Key 2", None, 1.5, "NUMBER"),
+            ("b", "Key 1", None, "more text", "TEXT"),
+            ("b", "Key 2", None, "2020-01-01T00:00:00", "DATE"),
+        ]
+        assert conn.execute("SELECT path FROM sources").fetchall() == [
+            (str(master_file),)
+        ]
+    finally:
+        conn.close()
+    assert convert_masters_to_sqlite([master_file], db) == []
+    assert "already loaded" in caplog.text
+
+
+def test_convert_masters_to_sqlite_in_parallel(
+    mock_config, master, tmp_path, monkeypatch
+):
+    mock_config.initialise()
+    monkeypatch.setattr(Config, "IMPORT_WORKERS", 2)
+    monkeypatch.setattr(Config, "IMPORT_SERIAL_THRESHOLD", 0)
+    in_flight = []
+    wait = futures.wait
+    monkeypatch.setattr(
+        futures,
+        "wait",
+        lambda fs, **kwargs: in_flight.append(len(fs)) or wait(fs, **kwargs),
+    )
+    masters = []
+    for n in range(6):
+        master.values[0][0] = f"text {n}"
+        MasterOutputRepository(master, f"master_{n}.xlsx").save()
+        masters.append(
+            Path(mock_config.PLATFORM_DOCS_DIR) / "output" / f"master_{n}.xlsx"
+        )
+    db = tmp_path / "masters.db"
+    assert sorted(convert_masters_to_sqlite(masters, db)) == masters
+    # no more than two masters per worker are waiting on the pool
+    assert in_flight and max(in_flight) == 4
+    conn = sqlite3.connect(str(db))
+    try:
+        assert conn.execute("SELECT COUNT(*) FROM sources").fetchall() == [(6,)]
+        assert sorted(
+            conn.execute("SELECT value FROM cell_values WHERE key = 'Key 1'")
+        ) == [("more text",)] * 6 + [(f"text {n}",) for n in range(6)]
+    finally:
+        conn.close()
+
+
+def test_master_and_template_imports_share_file_names(mock_config, master):
+    mock_config.initialise()
+    MasterOutputRepository(master, "master.xlsx").save()
+    output = Path(mock_config.PLATFORM_DOCS_DIR) / "output"
+    SQLiteOutputRepository(master, "master.xlsx").save()
+    convert_masters_to_sqlite([output / "master.xlsx"], output / "master.db")
+    with SQLiteQueryRepository(output / "master.db") as repo:
+        assert repo.file_names() == ["a", "b"]
+        assert [name for name, _ in repo.values_for_key("Key 1")] == ["a", "b"]
+
+
+@pytest.mark.parametrize("serial_threshold", [0, 1000])
+def test_convert_masters_to_sqlite_skips_unreadable_master(
+    mock_config, master, tmp_path, monkeypatch, serial_threshold
+):
+    mock_config.initialise()
+    monkeypatch.setattr(Config, "IMPORT_WORKERS", 2)
+    monkeypatch.setattr(Config, "IMPORT_SERIAL_THRESHOLD", serial_threshold)
+    MasterOutputRepository(master, "master.xlsx").save()
+    good = Path(mock_config.PLATFORM_DOCS_DIR) / "output" / "master.xlsx"
+    corrupt = tmp_path / "corrupt.xlsx"
+    corrupt.write_bytes(b"not a zip file")
+    missing = tmp_path / "missing.xlsx"
+    failures = []
+    db = tmp_path / "masters.db"
+    assert convert_masters_to_sqlite([corrupt, good, missing], db, failures) == [
+        good
+    ]
+    assert sorted((f.filename, f.error_type) for f in failures) == [
+        ("corrupt.xlsx", "BadZipFile"),
+        ("missing.xlsx", "FileNotFoundError"),
+    ]
+    with SQLiteQueryRepository(db) as repo:
+        assert repo.file_names() == ["a", "b"]
+
+
+@pytest.fixture
+def query_repo(mock_config, master):
+    mock_config.initialise()
+    SQLiteOutputRepository(master, "master.xlsx").save()
+    repo = SQLiteQueryRepository(
+        Path(mock_config.PLATFORM_DOCS_DIR) / "output" / "master.db"
+    )
+    yield repo
+    repo.close()
+
+
+def test_query_values_for_key(query_repo):
+    assert query_repo.file_names() == ["a", "b"]
+    assert query_repo.values_for_key("Key 1") == [
+        ("a", "text"),
+        ("b", "more text"),
+    ]
+    assert query_repo.values_for_key("Key 2") == [("a", 1.5)]
+    assert query_repo.values_for_key("Key 1", sheet="Finances") == []
+    assert query_repo.values_for_key("Missing") == []
+
+
+def test_query_keys_for_file(query_repo):
+    assert query_repo.keys_for_file("a.xlsx") == {"Key 1": "text", "Key 2": 1.5}
+    assert query_repo.keys_for_file("a") == {"Key 1": "text", "Key 2": 1.5}
+    with pytest.raises(KeyError):
+        query_repo.keys_for_file("c.xlsx")
+
+
+def test_query_keys_matching(query_repo):
+    assert query_repo.keys_matching("Key *") == ["Key 1", "Key 2"]
+    assert query_repo.keys_matching("*2") == ["Key 2"]
+    assert query_repo.keys_matching("key*") == []
+
+
+def test_query_uses_latest_copy_of_each_file(tmp_path):
+    db = tmp_path / "copies.db"
+    conn = connect(db)
+    with conn:
+        for source_id, rows in enumerate(
+            [
+                [
+                    ("Key 1", None, None, "old", "TEXT"),
+                    ("Old key", None, None, 1, "NUMBER"),
+                ],
+                [("Key 1", None, None, "new", "TEXT")],
+            ],
+            start=1,
+        ):
+            conn.execute(
+                "INSERT INTO sources (id, path, checksum, loaded) VALUES (?, ?, ?, ?)",
+                (source_id, f"master_{source_id}.xlsx", str(source_id), "now"),
+            )
+            insert_file(conn, "a.xlsm", str(source_id), rows, source_id=source_id)
+        insert_file(conn, "b.xlsm", "b", [("Key 1", None, None, "b", "TEXT")])
+    conn.close()
+    with SQLiteQueryRepository(db) as repo:
+        assert repo.file_names() == ["a", "b"]
+        assert repo.values_for_key("Key 1") == [("a", "new"), ("b", "b")]
+        assert repo.keys_for_file("a") == {"Key 1": "new"}
+        assert repo.keys_matching("*") == ["Key 1"]
+
+
+def test_query_key_lookup_uses_index(query_repo):
+    plan = query_repo.conn.execute(
+        "EXPLAIN QUERY PLAN SELECT value FROM cell_values WHERE key = ?", ("Key 1",)
+    ).fetchall()
+    assert any("cell_values_key" in row[-1] for row in plan)
+
+
+def test_query_missing_database(tmp_path):
+    with pytest.raises(FileNotFoundError):
+        SQLiteQueryRepository(tmp_path / "missing.db")
@@ -0,0 +1,214 @@
+import datetime
+import zipfile
+from pathlib import Path
+
+import pytest
+from openpyxl import load_workbook
+from openpyxl.utils.datetime import CALENDAR_MAC_1904
+
+from engine.repository.templates import MultipleTemplatesWriteRepo
+from engine.repository.xml_templates import SheetIndex, XMLTemplatesWriteRepo
+from engine.use_cases.output import WriteMasterToTemplates
+from engine.use_cases.typing import ColData
+
+SHEET = (
+    b'<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main">'
+    b"<sheetData>"
+    b'<row r="2"><c r="B2" s="3" t="s"><v>0</v></c><c r="D2"><v>1</v></c></row>'
+    b'<row r="4" ht="20"/>'
+    b"</sheetData>"
+    b'<mergeCells count="1"><mergeCell ref="F1:G2"/></mergeCells>'
+    b"</worksheet>"
+)
+
+
+def test_sheet_index_patches_cells():
+    index = SheetIndex(SHEET)
+    xml = index.patch(
+        {
+            ("B2", 2, 2): "new & improved",
+            ("C2", 2, 3): 1.5,
+            ("A4", 4, 1): True,
+            ("A3", 3, 1): None,
+            ("A5", 5, 1): "=SUM(B2:D2)",
+        }
+    )
+    assert xml == (
+        b'<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main">'
+        b"<sheetData>"
+        b'<row r="2"><c r="B2" s="3" t="inlineStr"><is><t xml:space="preserve">'
+        b"new &amp; improved</t></is></c>"
+        b'<c r="C2"><v>1.5</v></c><c r="D2"><v>1</v></c></row>'
+        b'<row r="3"><c r="A3"/></row>'
+        b'<row r="4" ht="20"><c r="A4" t="b"><v>1</v></c></row>'
+        b'<row r="5"><c r="A5"><f>SUM(B2:D2)</f></c></row>'
+        b"</sheetData>"
+        b'<mergeCells count="1"><mergeCell ref="F1:G2"/></mergeCells>'
+        b"</worksheet>"
+    )
+    assert index.is_merged(2, 7)
+    assert not index.is_merged(1, 6)
+
+
+def test_sheet_index_patches_empty_sheet():
+    index = SheetIndex(b"<worksheet><sheetData/></worksheet>")
+    assert index.patch({("B1", 1, 2): 2, ("A1", 1, 1): 1}) == (
+        b'<worksheet><sheetData><row r="1"><c r="A1"><v>1</v></c>'
+        b'<c r="B1"><v>2</v></c></row></sheetData></worksheet>'
+    )
+
+
+def test_sheet_index_extends_dimension_and_spans():
+    index = SheetIndex(
+        b"<worksheet><dimension ref=\"B2:D4\"/><sheetData>"
+        b'<row r="2" spans="2:4"><c r="B2"><v>1</v></c></row>'
+        b'<row r="4" spans="2:4"/>'
+        b"</sheetData></worksheet>"
+    )
+    assert index.patch({("C3", 3, 3): 1}) == index.xml.replace(
+        b"</row><row", b'</row><row r="3"><c r="C3"><v>1</v></c></row><row'
+    )
+    assert index.patch({("A2", 2, 1): 1, ("ZZ900", 900, 702): 2}) == (
+        b'<worksheet><dimension ref="A2:ZZ900"/><sheetData>'
+        b'<row r="2" spans="1:4"><c r="A2"><v>1</v></c><c r="B2"><v>1</v></c></row>'
+        b'<row r="4" spans="2:4"/>'
+        b'<row r="900"><c r="ZZ900"><v>2</v></c></row>'
+        b"</sheetData></worksheet>"
+    )
+    assert b'<dimension ref="B2:F4"/>' in index.patch({("F4", 4, 6): 1})
+    assert b'<row r="4" spans="2:6">' in index.patch({("F4", 4, 6): 1})
+
+
+def _cell_values(path):
+    wb = load_workbook(path)
+    return {
+        (ws.title, cell.coordinate): (cell.value, cell.number_format)
+        for ws in wb.worksheets
+        for row in ws.iter_rows()
+        for cell in row
+        if cell.value is not None
+    }
+
+
+def test_xml_writer_matches_openpyxl_writer(
+    mock_config, datamap, master, blank_template, tmp_path
+):
+    mock_config.initialise()
+    uc = WriteMasterToTemplates(
+        MultipleTemplatesWriteRepo(blank_template), datamap, master, blank_template
+    )
+    uc.execute()
+    xml_repo = XMLTemplatesWriteRepo(blank_template)
+    xml_repo.output_path = tmp_path
+    WriteMasterToTemplates(xml_repo, datamap, master, blank_template).execute()
+    output = Path(mock_config.PLATFORM_DOCS_DIR) / "output"
+    for name in ("Chutney Bridge.xlsm", "Ramsbottom Knot Gorge Cleanout.xlsm"):
+        assert _cell_values(tmp_path / name) == _cell_values(output / name)
+    wb = load_workbook(tmp_path / "Chutney Bridge.xlsm")
+    assert wb["Introduction"]["C17"].value == datetime.datetime(2012, 1, 1)
+    assert wb["Another Sheet"]["F17"].value == 20.303
+
+
+def test_xml_writer_copies_other_parts(mock_config, tmp_path):
+    mock_config.initialise()
+    blank = Path.cwd() / "tests" / "resources" / "blank_template_password_removed.xlsm"
+    repo = XMLTemplatesWriteRepo(blank)
+    repo.output_path = tmp_path
+    repo.write([[ColData("Key", "Introduction", "C10", "written", "out")]])
+    with zipfile.ZipFile(blank) as z_blank, zipfile.ZipFile(tmp_path / "out.xlsm") as z:
+        assert z.namelist() == z_blank.namelist()
+        changed = [
+            name for name in z.namelist() if z.read(name) != z_blank.read(name)
+        ]
+    assert changed == ["xl/worksheets/sheet1.xml", "xl/workbook.xml"]
+    wb = load_workbook(tmp_path / "out.xlsm", keep_vba=True)
+    assert wb["Introduction"]["C10"].value == "written"
+    assert wb.vba_archive is not None
+
+
+def test_xml_writer_drops_calc_chain(mock_config, blank_template, tmp_path):
+    mock_config.initialise()
+    blank = tmp_path / "blank.xlsm"
+    with zipfile.ZipFile(blank_template) as src, zipfile.ZipFile(blank, "w") as dst:
+        for name in src.namelist():
+            data = src.read(name)
+            if name == "xl/_rels/workbook.xml.rels":
+                data = data.replace(
+                    b"</Relationships>",
+                    b'<Relationship Id="rId9" Type="http://schemas.openxmlformats.org'
+                    b'/officeDocument/2006/relationships/calcChain" '
+                    b'Target="calcChain.xml"/></Relationships>',
+                )
+            elif name == "[Content_Types].xml":
+                data = data.replace(
+                    b"</Types>",
+                    b'<Override PartName="/xl/calcChain.xml" ContentType="application'
+                    b'/vnd.openxmlformats-officedocument.spreadsheetml.calcChain+xml"/>'
+                    b"</Types>",
+                )
+            dst.writestr(name, data)
+        dst.writestr("xl/calcChain.xml", b'<calcChain><c r="B9" i="1"/></calcChain>')
+    repo = XMLTemplatesWriteRepo(blank)
+    repo.output_path = tmp_path
+    repo.write([[ColData("Key", "Introduction", "B9", 1, "out")]])
+    with zipfile.ZipFile(tmp_path / "out.xlsm") as z:
+        assert "xl/calcChain.xml" not in z.namelist()
+        assert b"calcChain" not in z.read("xl/_rels/workbook.xml.rels")
+        assert b"calcChain" not in z.read("[Content_Types].xml")
+        assert b'fullCalcOnLoad="1"' in z.read("xl/workbook.xml")
+    assert load_workbook(tmp_path / "out.xlsm")["Introduction"]["B9"].value == 1
+
+
+def test_xml_writer_skips_bad_cells(mock_config, blank_template, tmp_path, caplog):
+    mock_config.initialise()
+    repo = XMLTemplatesWriteRepo(blank_template)
+    repo.output_path = tmp_path
+    repo.write(
+        [
+            [
+                ColData("No sheet", "Missing", "B9", 1, "out"),
+                ColData("No cellref", "Introduction", "", 1, "out"),
+                ColData("Fine", "Introduction", "b9", "lower case", "out"),
+            ]
+        ]
+    )
+    assert "missing a 'sheet' value" in caplog.text
+    assert "No cellref in datamap for key: No cellref" in caplog.text
+    assert load_workbook(tmp_path / "out.xlsm")["Introduction"]["B9"].value == (
+        "lower case"
+    )
+
+
+def test_xml_writer_refuses_merged_cells(mock_config, tmp_path):
+    mock_config.initialise()
+    blank = Path.cwd() / "tests" / "resources" / "blank_template_password_removed.xlsm"
+    repo = XMLTemplatesWriteRepo(blank)
+    repo.output_path = tmp_path
+    with pytest.raises(AttributeError):
+        repo.write([[ColData("Key", "Contents", "C8", "merged", "out")]])
+
+
+def test_xml_writer_extends_used_range(mock_config, blank_template, tmp_path):
+    mock_config.initialise()
+    repo = XMLTemplatesWriteRepo(blank_template)
+    repo.output_path = tmp_path
+    repo.write([[ColData("Key", "Introduction", "ZZ900", "far away", "out")]])
+    wb = load_workbook(tmp_path / "out.xlsm", read_only=True)
+    assert wb["Introduction"]["ZZ900"].value == "far away"
+    rows = list(wb["Introduction"].iter_rows(min_row=900, values_only=True))
+    assert rows[0][-1] == "far away"
+
+
+def test_xml_writer_uses_1904_date_system(mock_config, blank_template, tmp_path):
+    mock_config.initialise()
+    wb = load_workbook(blank_template, keep_vba=True)
+    wb.epoch = CALENDAR_MAC_1904
+    blank = tmp_path / "blank_1904.xlsm"
+    wb.save(blank)
+    repo = XMLTemplatesWriteRepo(blank)
+    repo.output_path = tmp_path
+    date = datetime.datetime(2020, 3, 1)
+    repo.write([[ColData("Key", "Introduction", "C17", date, "out")]])
+    wb = load_workbook(tmp_path / "out.xlsm")
+    assert wb.epoch == CALENDAR_MAC_1904
+    assert wb["Introduction"]["C17"].value == date
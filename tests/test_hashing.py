@@ -1,10 +1,13 @@
 import hashlib
 
+import pytest
+
 from engine.use_cases.parsing import extract_from_multiple_xlsx_files
 from engine.utils.extraction import (
     _hash_single_file,
     _hash_target_files,
     get_xlsx_files,
+    template_reader,
 )
 
 
@@ -32,3 +35,11 @@ def test_group_data_by_source_file(resources):
     digest_of_test_file = hashlib.md5(open(test_file, "rb").read()).digest().hex()
     dataset = extract_from_multiple_xlsx_files(excel_files)
     assert dataset["test_template.xlsx"]["checksum"] == digest_of_test_file
+
+
+@pytest.mark.parametrize("reader", ["streaming", "dom", "native"])
+def test_template_reader_checksum_matches_file_on_disk(resources, reader):
+    test_file = resources / "test_template.xlsx"
+    digest_of_test_file = hashlib.md5(open(test_file, "rb").read()).digest().hex()
+    dataset = template_reader(test_file, reader=reader)
+    assert dataset["test_template.xlsx"]["checksum"] == digest_of_test_file
@@ -0,0 +1,63 @@
+import pytest
+
+from engine.domain.datamap import DatamapLineValueType
+from engine.domain.master import Master, MasterMatrix
+
+
+@pytest.fixture
+def master():
+    m = Master(
+        keys=["Key 1", "Key 2", "Key 1"],
+        file_names=["file1.xlsx", "file2.xlsx"],
+        sheets=["Summary", "Summary", "Finances"],
+        cellrefs=["B2", "B3", "C1"],
+    )
+    m.values[0] = ["a", 1, ""]
+    m.values[1] = ["b", 2, "c"]
+    return m
+
+
+def test_master_is_preallocated():
+    m = Master(keys=["Key 1", "Key 2"], file_names=["file1.xlsx"])
+    assert m.shape == (2, 1)
+    assert m.values == [["", ""]]
+    assert m.type_codes == [[0, 0]]
+
+
+def test_master_lookups(master):
+    assert master.value("Key 2", "file2.xlsx") == 2
+    # the first line of a key repeated in the datamap
+    assert master.value("Key 1", "file2.xlsx") == "b"
+    assert master.column("file1.xlsx") == ["a", 1, ""]
+    assert list(master.rows()) == [
+        ("Key 1", ["a", "b"]),
+        ("Key 2", [1, 2]),
+        ("Key 1", ["", "c"]),
+    ]
+    with pytest.raises(KeyError):
+        master.value("Key 3", "file1.xlsx")
+
+
+def test_master_to_and_from_data_for_master(master):
+    data = master.to_data_for_master()
+    assert data[0] == {"file1.xlsx": [("Key 1", "a"), ("Key 2", 1), ("Key 1", "")]}
+    rebuilt = Master.from_data_for_master(data)
+    assert rebuilt.keys == master.keys
+    assert rebuilt.file_names == master.file_names
+    assert rebuilt.values == master.values
+
+
+def test_master_matrix_from_master(master):
+    np = pytest.importorskip("numpy")
+    master.type_codes[0] = [DatamapLineValueType.TEXT.value, 1, 0]
+    master.type_codes[1] = [DatamapLineValueType.TEXT.value, 1, 2]
+    matrix = MasterMatrix.from_master(master)
+    assert matrix.shape == (3, 2)
+    assert matrix.value("Key 2", "file2.xlsx") == 2
+    assert list(matrix.column("file1.xlsx")) == ["a", 1, ""]
+    assert matrix.number_row("Key 2").dtype == np.float64
+    assert list(matrix.number_row("Key 2")) == [1.0, 2.0]
+    assert np.isnan(matrix.numbers[0]).all()
+    rebuilt = matrix.to_master()
+    assert rebuilt.values == master.values
+    assert rebuilt.type_codes == master.type_codes
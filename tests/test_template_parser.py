@@ -1,16 +1,29 @@
+import json
 import os
+import shutil
 from pathlib import Path
 
 import pytest
 
+from engine.config import Config
 from engine.domain.datamap import DatamapLineValueType
-from engine.domain.template import TemplateCell
-from engine.use_cases.parsing import extract_from_multiple_xlsx_files
+from engine.domain.template import Cell, TemplateCell
+from engine.exceptions import TemplateExtractionError
+from engine.use_cases.parsing import (
+    extract_compact_from_multiple_xlsx_files,
+    extract_from_multiple_xlsx_files,
+)
 from engine.utils.extraction import (
     _extract_cellrefs,
     _extract_sheets,
+    datamap_targets,
+    expand_template,
+    expand_templates,
     get_xlsx_files,
     template_reader,
+    template_cells,
+    template_reader_compact,
+    templates_to_json,
 )
 
 
@@ -82,3 +95,137 @@ def test_extract_data_from_multiple_files_into_correct_structure(resources):
     assert (
         dataset[test_filename]["data"]["Summary"]["B3"]["value"] == "This is a string"
     )
+
+
+@pytest.mark.parametrize(
+    "workers,start_method,chunksize,serial_threshold",
+    [(None, None, 1, 3), (2, "spawn", 2, 0), (None, None, 1, 1000)],
+)
+def test_extract_from_multiple_files_pool_settings(
+    resources, monkeypatch, workers, start_method, chunksize, serial_threshold
+):
+    xlsx_files = get_xlsx_files(resources)
+    expected = {f.name: template_reader(f) for f in xlsx_files}
+    monkeypatch.setattr(Config, "IMPORT_WORKERS", workers)
+    monkeypatch.setattr(Config, "IMPORT_START_METHOD", start_method)
+    monkeypatch.setattr(Config, "IMPORT_CHUNKSIZE", chunksize)
+    monkeypatch.setattr(Config, "IMPORT_SERIAL_THRESHOLD", serial_threshold)
+    dataset = extract_from_multiple_xlsx_files(xlsx_files)
+    assert dataset == {name: data[name] for name, data in expected.items()}
+
+
+@pytest.fixture
+def templates_with_corrupt_file(resources, tmp_path):
+    for name in ["test_template.xlsx", "test_template2.xlsx"]:
+        shutil.copy(resources / name, tmp_path / name)
+    (tmp_path / "corrupt.xlsx").write_bytes(b"not a zip file")
+    return get_xlsx_files(tmp_path)
+
+
+@pytest.mark.parametrize("serial_threshold", [0, 1000])
+def test_extract_from_multiple_files_skips_failing_file(
+    templates_with_corrupt_file, monkeypatch, serial_threshold
+):
+    monkeypatch.setattr(Config, "IMPORT_FAILURE_POLICY", "skip")
+    monkeypatch.setattr(Config, "IMPORT_SERIAL_THRESHOLD", serial_threshold)
+    failures = []
+    dataset = extract_from_multiple_xlsx_files(
+        templates_with_corrupt_file, failures=failures
+    )
+    assert set(dataset) == {"test_template.xlsx", "test_template2.xlsx"}
+    assert [(f.filename, f.error_type) for f in failures] == [
+        ("corrupt.xlsx", "RuntimeError")
+    ]
+
+
+@pytest.mark.parametrize("policy", ["fail", "abort"])
+@pytest.mark.parametrize("serial_threshold", [0, 1000])
+def test_extract_from_multiple_files_failure_policy(
+    templates_with_corrupt_file, monkeypatch, policy, serial_threshold
+):
+    monkeypatch.setattr(Config, "IMPORT_FAILURE_POLICY", policy)
+    monkeypatch.setattr(Config, "IMPORT_SERIAL_THRESHOLD", serial_threshold)
+    with pytest.raises(TemplateExtractionError) as excinfo:
+        extract_from_multiple_xlsx_files(templates_with_corrupt_file)
+    assert [f.filename for f in excinfo.value.failures] == ["corrupt.xlsx"]
+    assert "corrupt.xlsx" in str(excinfo.value)
+    assert "ExtractionFailure(" not in str(excinfo.value)
+
+
+def test_extract_from_multiple_files_fails_with_nothing_extracted(tmp_path):
+    (tmp_path / "corrupt.xlsx").write_bytes(b"not a zip file")
+    with pytest.raises(TemplateExtractionError):
+        extract_from_multiple_xlsx_files(get_xlsx_files(tmp_path))
+
+
+def test_compact_template_expands_to_template_reader_data(template):
+    compact = template_reader_compact(template)
+    assert compact.file_name == template.as_posix()
+    summary = compact.sheets["Summary"]
+    assert len(summary.cellrefs) == len(summary.types) == len(summary.values)
+    assert {"test_template.xlsx": expand_template(compact)} == template_reader(
+        template
+    )
+
+
+def test_cell_reads_like_a_template_cell_dict():
+    cell = Cell("test.xlsx", "Summary", "B3", 10, DatamapLineValueType.NUMBER.value)
+    t_cell = TemplateCell(
+        "test.xlsx", "Summary", "B3", 10, DatamapLineValueType.NUMBER
+    ).to_dict()
+    assert cell.to_dict() == t_cell
+    for field in t_cell:
+        assert cell[field] == t_cell[field]
+    with pytest.raises(KeyError):
+        cell["key"]
+
+
+def test_template_cells_match_expanded_template(template):
+    compact = template_reader_compact(template)
+    cells = template_cells(compact)
+    expanded = expand_template(compact)
+    assert cells["checksum"] == expanded["checksum"]
+    assert {
+        sheet: {ref: cell.to_dict() for ref, cell in data.items()}
+        for sheet, data in cells["data"].items()
+    } == expanded["data"]
+
+
+def test_compact_templates_to_json(resources):
+    compact = extract_compact_from_multiple_xlsx_files(get_xlsx_files(resources))
+    assert json.loads(templates_to_json(compact)) == json.loads(
+        json.dumps(expand_templates(compact))
+    )
+
+
+def test_template_reader_only_extracts_targets(template):
+    dataset = template_reader(template, targets={"Summary": {"B3", "Z400"}})
+    data = dataset["test_template.xlsx"]["data"]
+    assert list(data.keys()) == ["Summary"]
+    assert list(data["Summary"].keys()) == ["B3"]
+    assert data["Summary"]["B3"]["value"] == "This is a string"
+    assert dataset["test_template.xlsx"]["checksum"]
+
+
+def test_datamap_targets_groups_cellrefs_by_sheet(dm_data):
+    assert datamap_targets(dm_data) == {"Summary": {"B2", "B3", "F17"}}
+
+
+@pytest.mark.parametrize("reader", ["streaming", "dom", "native"])
+def test_template_readers_produce_same_data(template, reader):
+    dataset = template_reader(template, reader=reader)
+    assert dataset == template_reader(template, reader="dom")
+    assert dataset["test_template.xlsx"]["data"]["Another Sheet"]["F17"]["value"] == 7.2
+
+
+def test_template_reader_rejects_unknown_reader(template):
+    with pytest.raises(ValueError):
+        template_reader(template, reader="bobbins")
+
+
+@pytest.mark.parametrize("reader", ["streaming", "dom", "native"])
+def test_template_reader_skips_sheets_not_asked_for(template, reader):
+    dataset = template_reader(template, reader=reader, sheets={"Summary", "Missing"})
+    data = dataset["test_template.xlsx"]["data"]
+    assert list(data.keys()) == ["Summary"]
+    assert data["Summary"]["B3"]["value"] == "This is a string"
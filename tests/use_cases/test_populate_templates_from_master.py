@@ -4,13 +4,18 @@ templates with data from a single master file.
 """
 
 import datetime
+import io
+import zipfile
 from typing import List
 
 import pytest
+import engine.repository.templates
 from engine.adapters.cli import write_master_to_templates
+from engine.config import Config
 from engine.exceptions import MissingSheetFieldError
 from engine.repository.templates import MultipleTemplatesWriteRepo
 from engine.use_cases.output import WriteMasterToTemplates
+from engine.use_cases.typing import ColData
 from engine.utils.extraction import (ValidationReportItem,
                                      data_validation_report)
 from openpyxl import load_workbook
@@ -173,3 +178,124 @@ def test_export_continues_with_missing_sheet_in_datamap(
                                 blank_template)
     with pytest.raises(MissingSheetFieldError):
         uc.execute()
+
+
+class _CollectingRepo:
+    def __init__(self):
+        self.data = None
+
+    def write(self, data, from_json=False):
+        self.data = data
+
+
+def test_master_columns_resolved_against_datamap(mock_config, datamap, master,
+                                                 blank_template):
+    mock_config.initialise()
+    output_repo = _CollectingRepo()
+    uc = WriteMasterToTemplates(output_repo, datamap, master, blank_template)
+    uc.execute()
+    chutney = [d for d in output_repo.data if d[0].file_name == "Chutney Bridge"][0]
+    by_key = {cd.key: cd for cd in chutney}
+    date_cell = by_key["Reporting period (GMPP - Snapshot Date)"]
+    assert date_cell.value == datetime.datetime(2012, 1, 1, 0, 0)
+    assert (date_cell.sheet, date_cell.cellref) == ("Introduction", "C17")
+    assert all(len(d) == len(chutney) for d in output_repo.data)
+
+
+def test_each_file_saved_before_next_opened(mock_config, datamap, master,
+                                            blank_template, monkeypatch):
+    mock_config.initialise()
+    events = []
+    load = engine.repository.templates.load_workbook
+    monkeypatch.setattr(engine.repository.templates, "load_workbook",
+                        lambda *args, **kwargs: events.append("load") or load(
+                            *args, **kwargs))
+    save = MultipleTemplatesWriteRepo._save_workbook
+    monkeypatch.setattr(MultipleTemplatesWriteRepo, "_save_workbook",
+                        lambda self, wb_t: events.append("save") or save(
+                            self, wb_t))
+    output_repo = MultipleTemplatesWriteRepo(blank_template)
+    WriteMasterToTemplates(output_repo, datamap, master, blank_template).execute()
+    assert events == ["load", "save", "load", "save"]
+
+
+def test_each_file_written_from_a_fresh_blank(mock_config, blank_template,
+                                              tmp_path):
+    mock_config.initialise()
+    output = mock_config.PLATFORM_DOCS_DIR / "output"
+    second = [ColData("Key", "Summary", "B3", "two", "two")]
+    MultipleTemplatesWriteRepo(blank_template).write([
+        [ColData("Key", "Summary", "Z99", datetime.datetime(2020, 1, 1), "one")],
+        second,
+    ])
+    alone = MultipleTemplatesWriteRepo(blank_template)
+    alone.output_path = tmp_path
+    alone.write([second])
+    wb = load_workbook(output / "two.xlsm")
+    assert wb["Summary"]["B3"].value == "two"
+    assert wb["Summary"]["Z99"].value is None
+    with zipfile.ZipFile(output / "two.xlsm") as z, \
+            zipfile.ZipFile(tmp_path / "two.xlsm") as z_alone:
+        assert z.read("xl/styles.xml") == z_alone.read("xl/styles.xml")
+
+
+def test_blank_template_with_image(mock_config, blank_template, tmp_path):
+    PILImage = pytest.importorskip("PIL.Image")
+    from openpyxl.drawing.image import Image
+    mock_config.initialise()
+    png = io.BytesIO()
+    PILImage.new("RGB", (4, 4), "red").save(png, format="png")
+    wb = load_workbook(blank_template, keep_vba=True)
+    wb["Summary"].add_image(Image(png), "H2")
+    blank = tmp_path / "blank_with_image.xlsm"
+    wb.save(blank)
+    MultipleTemplatesWriteRepo(blank).write(
+        [[ColData("Key", "Summary", "B3", n, f"file {n}")] for n in range(3)])
+    for n in range(3):
+        wb = load_workbook(
+            mock_config.PLATFORM_DOCS_DIR / "output" / f"file {n}.xlsm")
+        assert wb["Summary"]["B3"].value == n
+        assert len(wb["Summary"]._images) == 1
+
+
+def test_output_gateway_in_process_pool(mock_config, datamap,
+                                        master_with_rogue_cell_vals_beyond_col_and_row_range,
+                                        blank_template, monkeypatch):
+    mock_config.initialise()
+    monkeypatch.setattr(Config, "EXPORT_WORKERS", 2)
+    monkeypatch.setattr(Config, "EXPORT_SERIAL_THRESHOLD", 0)
+    output_repo = MultipleTemplatesWriteRepo(blank_template)
+    uc = WriteMasterToTemplates(
+        output_repo,
+        datamap,
+        master_with_rogue_cell_vals_beyond_col_and_row_range,
+        blank_template,
+    )
+    uc.execute()
+    for n in (4, 26):
+        result_file = (mock_config.PLATFORM_DOCS_DIR / "output" /
+                       f"Ramsbottom Knot Gorge Cleanout {n}.xlsm")
+        wb = load_workbook(result_file)
+        assert wb["Introduction"]["C9"].value == "VA Department"
+
+
+def test_failed_files_reported_from_process_pool(mock_config, blank_template,
+                                                 monkeypatch):
+    mock_config.initialise()
+    monkeypatch.setattr(Config, "EXPORT_WORKERS", 2)
+    monkeypatch.setattr(Config, "EXPORT_SERIAL_THRESHOLD", 0)
+    output_repo = MultipleTemplatesWriteRepo(blank_template)
+    data = [
+        [ColData("Key", "Summary", "B3", "fine", "good")],
+        [ColData("Key", "Summary", "B3:B4", "a range", "bad")],
+    ]
+    with pytest.raises(RuntimeError, match="bad.xlsm"):
+        output_repo.write(data)
+    assert (mock_config.PLATFORM_DOCS_DIR / "output" / "good.xlsm").exists()
+
+
+def test_columns_for_one_file_share_a_chunk():
+    data = [[ColData("Key", "Summary", "B3", n, name)]
+            for n, name in enumerate(["a", "b", "a", "c", "a"])]
+    chunks = MultipleTemplatesWriteRepo._chunks(data, 2)
+    assert [[d[0].value for d in chunk] for chunk in chunks] == [[0, 2, 3, 4], [1]]
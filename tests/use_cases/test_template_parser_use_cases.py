@@ -1,9 +1,13 @@
 import json
 import shutil
+import zipfile
 from pathlib import Path
 
 import pytest
-from engine.exceptions import NestedZipError
+import engine.repository.templates as templates
+from engine.domain.datamap import DatamapLineValueType
+from engine.domain.template import Cell
+from engine.exceptions import NestedZipError, TemplateExtractionError
 from engine.repository.datamap import InMemorySingleDatamapRepository
 from engine.repository.master import MasterOutputRepository
 from engine.repository.templates import (
@@ -15,6 +19,7 @@ from engine.use_cases.parsing import (
     ApplyDatamapToExtractionUseCase,
     CreateMasterUseCase,
     ParsePopulatedTemplatesUseCase,
+    index_datamap,
 )
 from engine.utils.extraction import _check_file_in_datafile
 from openpyxl import load_workbook
@@ -30,6 +35,26 @@ def test_template_parser_use_case(resources):
     )
 
 
+def test_template_parser_use_case_as_objects(resources):
+    repo = InMemoryPopulatedTemplatesRepository(resources)
+    parse_populated_templates_use_case = ParsePopulatedTemplatesUseCase(repo)
+    result = parse_populated_templates_use_case.execute(obj=True)
+    cell = result["test_template.xlsx"]["data"]["Summary"]["B3"]
+    assert isinstance(cell, Cell)
+    assert cell.value == "This is a string"
+    as_json = json.loads(parse_populated_templates_use_case.execute())
+    assert {
+        fname: {
+            "checksum": data["checksum"],
+            "data": {
+                sheet: {ref: c.to_dict() for ref, c in cells.items()}
+                for sheet, cells in data["data"].items()
+            },
+        }
+        for fname, data in result.items()
+    } == as_json
+
+
 def test_query_data_from_data_file(
     mock_config, dat_file, spreadsheet_same_data_as_dat_file
 ):
@@ -145,6 +170,21 @@ def test_in_memory_datamap_application_to_extracted_data_raises_exception(
         uc.query_key("test_template.xlsx", "Funny Date", "Another Sheet ")
 
 
+def test_index_datamap_uses_first_line_for_key_and_sheet():
+    index = index_datamap(
+        [
+            {"key": "Key 1", "sheet": "Summary", "cellref": "B2"},
+            {"key": "Key 2", "sheet": "Summary", "cellref": "B3"},
+            {"key": "Key 1", "sheet": "Summary", "cellref": "B4"},
+            {"key": "Key 1", "sheet": "Another Sheet", "cellref": "C1"},
+        ]
+    )
+    assert index.cellrefs[("Key 1", "Summary")] == "B2"
+    assert index.cellrefs[("Key 1", "Another Sheet")] == "C1"
+    assert index.keys == {"Key 1", "Key 2"}
+    assert index.sheets == {"Summary", "Another Sheet"}
+
+
 def test_in_memory_datamap_generator(
     mock_config, datamap_match_test_template, template
 ):
@@ -188,6 +228,41 @@ def test_create_master_spreadsheet(mock_config, datamap_match_test_template, tem
     assert ws["B3"].value == "This is a string"
 
 
+def test_apply_datamap_builds_master(mock_config, datamap_match_test_template, template):
+    mock_config.initialise()
+    shutil.copy2(template, (Path(mock_config.PLATFORM_DOCS_DIR) / "input"))
+    tmpl_repo = InMemoryPopulatedTemplatesRepository(
+        mock_config.PLATFORM_DOCS_DIR / "input"
+    )
+    dm_repo = InMemorySingleDatamapRepository(datamap_match_test_template)
+    uc = ApplyDatamapToExtractionUseCase(dm_repo, tmpl_repo)
+    uc.execute(for_master=True)
+    master = uc.master
+    assert master.file_names == ["test_template.xlsx"]
+    assert master.value("String Key", "test_template.xlsx") == "This is a string"
+    row = master.key_index("Big Float")
+    assert master.values[0][row] == 7.2
+    assert master.type_codes[0][row] == DatamapLineValueType.NUMBER.value
+    assert uc.data_for_master == master.to_data_for_master()
+
+
+def test_apply_datamap_master_matrix(mock_config, datamap_match_test_template, template):
+    pytest.importorskip("numpy")
+    mock_config.initialise()
+    shutil.copy2(template, (Path(mock_config.PLATFORM_DOCS_DIR) / "input"))
+    tmpl_repo = InMemoryPopulatedTemplatesRepository(
+        mock_config.PLATFORM_DOCS_DIR / "input"
+    )
+    dm_repo = InMemorySingleDatamapRepository(datamap_match_test_template)
+    uc = ApplyDatamapToExtractionUseCase(dm_repo, tmpl_repo)
+    uc.execute(for_master=True)
+    matrix = uc.master_matrix()
+    assert matrix.number_row("Big Float")[0] == 7.2
+    MasterOutputRepository(matrix, "master.xlsx").save()
+    wb = load_workbook(Path(mock_config.PLATFORM_DOCS_DIR) / "output" / "master.xlsx")
+    assert wb.active["B3"].value == "This is a string"
+
+
 def ensure_data_and_populate_file(config, dat_file, spreadsheet_file) -> None:
     "Ensure the data in a single file is mirrored in a dat file, in correct location for testing"
     shutil.copy2(dat_file, config.DATAMAPS_LIBRARY_DATA_DIR)
@@ -302,3 +377,44 @@ def test_in_extract_files_from_zipfile_with_deep_structure_raises_exception(
     uc = ApplyDatamapToExtractionUseCase(dm_repo, tmpl_repo)
     with pytest.raises(NestedZipError):
         uc.execute()
+
+
+def test_targeted_extraction_only_holds_datamap_cells(
+    mock_config, monkeypatch, datamap_match_test_template, template
+):
+    mock_config.initialise()
+    monkeypatch.setattr(mock_config, "TEMPLATE_TARGETED_EXTRACTION", True)
+    shutil.copy2(template, (Path(mock_config.PLATFORM_DOCS_DIR) / "input"))
+    tmpl_repo = InMemoryPopulatedTemplatesRepository(
+        mock_config.PLATFORM_DOCS_DIR / "input"
+    )
+    dm_repo = InMemorySingleDatamapRepository(datamap_match_test_template)
+    uc = ApplyDatamapToExtractionUseCase(dm_repo, tmpl_repo)
+    uc.execute()
+    assert uc.query_key("test_template.xlsx", "String Key", "Summary") == (
+        "This is a string"
+    )
+    assert uc.query_key("test_template.xlsx", "Big Float", "Another Sheet") == 7.2
+    summary = uc._template_data_dict["test_template.xlsx"]["data"]["Summary"]
+    assert set(summary.keys()) == {"B2", "B3"}
+
+
+def test_zip_temporary_directory_removed_when_extraction_fails(
+    tmp_path, monkeypatch
+):
+    archive = tmp_path / "returns.zip"
+    with zipfile.ZipFile(archive, "w") as z:
+        z.writestr("corrupt.xlsx", b"not a zip file")
+    directories = []
+    extract_zip = templates.extract_zip_file_to_tmpdir
+
+    def _extract_zip(path):
+        d, files = extract_zip(path)
+        directories.append(d)
+        return d, files
+
+    monkeypatch.setattr(templates, "extract_zip_file_to_tmpdir", _extract_zip)
+    with pytest.raises(TemplateExtractionError):
+        InMemoryPopulatedTemplatesZip(archive).list_as_objs()
+    assert directories
+    assert not Path(directories[0]).exists()
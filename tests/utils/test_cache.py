@@ -0,0 +1,71 @@
+import os
+import shutil
+
+import pytest
+
+import engine.utils.extraction
+from engine.utils.cache import ExtractionCache
+from engine.utils.extraction import template_reader
+
+
+@pytest.fixture
+def cache(tmp_path):
+    return ExtractionCache(tmp_path / "cache", max_bytes=1024 * 1024)
+
+
+def test_cache_key_depends_on_extraction_settings():
+    key = ExtractionCache.key("abc", "streaming", 500)
+    assert key == ExtractionCache.key("abc", "streaming", 500)
+    assert key != ExtractionCache.key("abd", "streaming", 500)
+    assert key != ExtractionCache.key("abc", "native", 500)
+    assert key != ExtractionCache.key("abc", "streaming", 50)
+    assert key != ExtractionCache.key("abc", "streaming", 500, sheets={"Summary"})
+    assert ExtractionCache.key(
+        "abc", "streaming", 500, targets={"Summary": {"A1", "B2"}}
+    ) == ExtractionCache.key("abc", "streaming", 500, targets={"Summary": {"B2", "A1"}})
+
+
+def test_cache_get_and_put(cache):
+    assert cache.get("missing") is None
+    cache.put("key", {"Summary": {"A1": {"value": 1}}})
+    assert cache.get("key") == {"Summary": {"A1": {"value": 1}}}
+
+
+def test_cache_ignores_corrupt_entry(cache):
+    cache.put("key", {})
+    (cache.directory / "key.json").write_text("{not json")
+    assert cache.get("key") is None
+    assert not (cache.directory / "key.json").exists()
+
+
+def test_cache_prune_removes_least_recently_used(tmp_path):
+    cache = ExtractionCache(tmp_path, max_bytes=250)
+    for n, key in enumerate(["old", "used", "new"]):
+        cache.put(key, {"padding": "x" * 100})
+        os.utime(tmp_path / f"{key}.json", (n, n))
+    cache.get("old")
+    cache.prune()
+    assert cache.get("used") is None
+    assert cache.get("old") is not None
+    assert cache.get("new") is not None
+
+
+def test_template_reader_uses_cache(resources, cache, monkeypatch):
+    template = resources / "test_template.xlsx"
+    extracted = template_reader(template, cache=cache)
+
+    def _open_workbook(*args):
+        raise AssertionError("cached template should not be parsed")
+
+    monkeypatch.setattr(engine.utils.extraction, "_open_workbook", _open_workbook)
+    assert template_reader(template, cache=cache) == extracted
+    with pytest.raises(AssertionError):
+        template_reader(template, cache=cache, sheets={"Summary"})
+
+
+def test_template_reader_cache_hit_uses_current_file_name(resources, cache, tmp_path):
+    template_reader(resources / "test_template.xlsx", cache=cache)
+    copied = tmp_path / "test_template.xlsx"
+    shutil.copy(resources / "test_template.xlsx", copied)
+    data = template_reader(copied, cache=cache)["test_template.xlsx"]["data"]
+    assert data["Summary"]["B3"]["file_name"] == copied.as_posix()
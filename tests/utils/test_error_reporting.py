@@ -1,7 +1,7 @@
 # test_error_reporting.py
 
 
-from engine.utils.extraction import CheckType, check_datamap_sheets
+from engine.utils.extraction import CheckType, check_datamap_sheets, datamap_sheets
 
 """"
 Tests in here to test ensure that files are checked for integrity before importing
@@ -40,3 +40,10 @@ def test_template_checked_for_correct_sheets_which_passes(
         assert f.error_type == CheckType.UNDEFINED
         assert f.msg == f"File {f.filename} checked: OK."
         assert f.proceed is True
+
+
+def test_sheets_named_in_datamap(datamap_lst_with_sheets_same_as_template_dict):
+    assert datamap_sheets(datamap_lst_with_sheets_same_as_template_dict) == {
+        "To DO",
+        "Rich Tea",
+    }
@@ -0,0 +1,71 @@
+import zipfile
+
+from openpyxl import Workbook, load_workbook
+
+from engine.utils.extraction import master_reader
+
+
+def test_master_reader_reads_columns(master):
+    data = master_reader(master)
+    assert data.header == "file name"
+    assert data.file_names == [
+        "Chutney Bridge.xlsm",
+        "Ramsbottom Knot Gorge Cleanout.xlsm",
+    ]
+    assert len(data.keys) == 18
+    assert data.columns[0][data.keys.index("Big Float")] == 20.303
+
+
+def test_master_reader_matches_full_load(
+    master_with_rogue_cell_vals_beyond_col_and_row_range,
+):
+    master = master_with_rogue_cell_vals_beyond_col_and_row_range
+    data = master_reader(master)
+    columns = list(load_workbook(master).active.iter_cols(values_only=True))
+    assert data.keys == list(columns[0][1:])
+    assert data.file_names == [column[0] for column in columns[1:]]
+    assert data.columns == [list(column[1:]) for column in columns[1:]]
+
+
+def _write_master(path, rows):
+    wb = Workbook()
+    for row in rows:
+        wb.active.append(row)
+    wb.save(path)
+    return path
+
+
+def test_master_reader_reads_formulas(tmp_path):
+    master = _write_master(
+        tmp_path / "master.xlsx",
+        [["file name", "A.xlsm"], ["Number", 2], ["Double", "=B2*2"]],
+    )
+    data = master_reader(master)
+    assert data.columns == [[2, "=B2*2"]]
+    assert data.columns == [
+        list(column[1:])
+        for column in load_workbook(master).active.iter_cols(
+            min_col=2, values_only=True
+        )
+    ]
+    # openpyxl stores no calculated value for the formula
+    assert master_reader(master, data_only=True).columns == [[2, None]]
+
+
+def test_master_reader_ignores_stale_dimensions(tmp_path):
+    master = _write_master(
+        tmp_path / "master.xlsx",
+        [["file name", "A.xlsm", "B.xlsm"], ["Key 1", 1, 2], ["Key 2", 3, 4]],
+    )
+    stale = tmp_path / "stale.xlsx"
+    with zipfile.ZipFile(master) as src, zipfile.ZipFile(stale, "w") as dst:
+        for name in src.namelist():
+            data = src.read(name)
+            if name == "xl/worksheets/sheet1.xml":
+                assert b'<dimension ref="A1:C3" />' in data
+                data = data.replace(b'ref="A1:C3"', b'ref="A1:B2"')
+            dst.writestr(name, data)
+    data = master_reader(stale)
+    assert data.keys == ["Key 1", "Key 2"]
+    assert data.file_names == ["A.xlsm", "B.xlsm"]
+    assert data.columns == [[1, 3], [2, 4]]
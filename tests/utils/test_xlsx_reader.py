@@ -0,0 +1,53 @@
+import datetime
+
+import pytest
+
+from engine.utils.extraction import template_reader
+from engine.utils.xlsx_reader import XLSXReader, _column_letter, _from_excel
+
+
+def test_sheet_names_in_workbook_order(template):
+    with XLSXReader(template) as wb:
+        assert wb.sheet_names == ["Summary", "Another Sheet"]
+
+
+def test_iter_cells_resolves_strings_numbers_and_dates(template):
+    with XLSXReader(template) as wb:
+        summary = dict(wb.iter_cells("Summary", 501))
+        another = dict(wb.iter_cells("Another Sheet", 501))
+    assert summary["B3"] == "This is a string"
+    assert summary["B2"] == datetime.datetime(2019, 10, 20)
+    assert another["F17"] == 7.2
+
+
+def test_iter_cells_only_returns_requested_cellrefs(template):
+    with XLSXReader(template) as wb:
+        cells = list(wb.iter_cells("Another Sheet", 501, {"F17", "ZZ1000"}))
+    assert cells == [("F17", 7.2)]
+
+
+def test_iter_cells_stops_at_max_row(template):
+    with XLSXReader(template) as wb:
+        cells = dict(wb.iter_cells("Another Sheet", 17))
+    assert "F17" in cells
+    assert "H39" not in cells
+
+
+@pytest.mark.parametrize(
+    "idx,letters", [(1, "A"), (26, "Z"), (27, "AA"), (702, "ZZ"), (703, "AAA")]
+)
+def test_column_letter(idx, letters):
+    assert _column_letter(idx) == letters
+
+
+def test_excel_serial_dates():
+    epoch = datetime.datetime(1899, 12, 30)
+    assert _from_excel(43758, epoch) == datetime.datetime(2019, 10, 20)
+    assert _from_excel(0.5, epoch) == datetime.time(12, 0)
+
+
+def test_native_reader_raises_on_file_that_is_not_xlsx(tmp_path):
+    bad = tmp_path / "bad.xlsx"
+    bad.write_text("not a spreadsheet")
+    with pytest.raises(RuntimeError):
+        template_reader(bad, reader="native")